@@ -1,19 +1,131 @@
 # Testing
+import contextvars
 import ctypes
 import os
+import threading
 from ctypes import *
 from collections import namedtuple
 
 # Try preloading the OS related DLL, x86 or x64.
 # Alternatively copy the correct version into your script folder.
+#
+# The DLL is not loaded at import time. It is loaded by loadLibrary() on the
+# first real call into it, and every exported function below is bound on its
+# first use. Scripts that never talk to the NKT bus therefore pay nothing for
+# importing this module, and it can be imported on machines without the SDK.
 
 dllFolder = os.environ.get('NKTP_SDK_PATH',r'C:\NKTP_SDK')
-if (ctypes.sizeof(ctypes.c_voidp) == 4):
-        print('Loading x86 DLL from:', dllFolder + r'\NKTPDLL\x86\NKTPDLL.dll')
-        NKTPDLL = ctypes.cdll.LoadLibrary( dllFolder + r'\NKTPDLL\x86\NKTPDLL.dll' )
-else:
-        print('Loading x64 DLL from:', dllFolder + r'\NKTPDLL\x64\NKTPDLL.dll')
-        NKTPDLL = ctypes.cdll.LoadLibrary( dllFolder + r'\NKTPDLL\x64\NKTPDLL.dll')
+NKTPDLL = None
+
+def loadLibrary():
+        """
+        Load NKTPDLL.dll (x86 or x64) from dllFolder if not already loaded.
+
+        Returns
+        -------
+        ctypes.CDLL
+            The loaded library, cached in the module global NKTPDLL.
+        """
+        global NKTPDLL
+        if NKTPDLL is None:
+                if (ctypes.sizeof(ctypes.c_voidp) == 4):
+                        print('Loading x86 DLL from:', dllFolder + r'\NKTPDLL\x86\NKTPDLL.dll')
+                        NKTPDLL = ctypes.cdll.LoadLibrary( dllFolder + r'\NKTPDLL\x86\NKTPDLL.dll' )
+                else:
+                        print('Loading x64 DLL from:', dllFolder + r'\NKTPDLL\x64\NKTPDLL.dll')
+                        NKTPDLL = ctypes.cdll.LoadLibrary( dllFolder + r'\NKTPDLL\x64\NKTPDLL.dll')
+        return NKTPDLL
+
+class _LazyFunction(object):
+        """
+        Stand-in for a DLL export that binds itself on its first call.
+
+        The bound ctypes function replaces this stub in the module namespace,
+        so later calls from the wrappers below go straight to ctypes.
+        """
+        __slots__ = ('_prototype', '_name', '_func')
+
+        def __init__(self, prototype, name):
+                self._prototype = prototype
+                self._name = name
+                self._func = None
+
+        def __call__(self, *args):
+                if self._func is None:
+                        self._func = self._prototype((self._name, loadLibrary()))
+                        globals()['_' + self._name] = self._func
+                return self._func(*args)
+
+def _lazy(prototype, name):
+        return _LazyFunction(prototype, name)
+
+# Backend hook. By default every public function below talks to NKTPDLL.dll.
+# setBackend() reroutes them to any object exposing functions of the same name
+# and signature (for example a simulated bus), without touching callers that
+# use "import NKTP_DLL as nktp; nktp.registerReadU8(...)".
+#
+# Layers added with addLayer() wrap the functions of the active backend, e.g.
+# for instrumentation. Without layers the public functions are the plain
+# backend functions, so layers cost nothing while they are not installed.
+_backend = None
+_native = {}
+_layers = []
+
+# Public functions built on the others (batched reads and writes). They are
+# never replaced by a backend or wrapped by layers; the calls they make are.
+_composite = ('registerReadTyped', 'registerReadManyPorts', 'registerReadMany',
+              'registerWriteMany')
+
+def _rebind():
+        for name, func in _native.items():
+                if name in _composite:
+                        continue
+                override = getattr(_backend, name, None) if _backend is not None else None
+                func = override if override is not None else func
+                for layer in _layers:
+                        func = layer(name, func)
+                globals()[name] = func
+
+def setBackend(backend):
+        """
+        Route the public functions of this module to an alternative backend.
+
+        Parameters
+        ----------
+        backend : object or None
+            Module or instance providing any subset of this module's public
+            functions (registerReadU8, openPorts, deviceGetAllTypes, ...) with
+            the same signatures and return values. Functions it does not
+            provide keep using the DLL. None restores the DLL for everything.
+        """
+        global _backend
+        _backend = backend
+        _rebind()
+
+def getBackend():
+        """Return the backend set with setBackend(), or None for the DLL."""
+        return _backend
+
+def addLayer(layer):
+        """
+        Wrap the public functions of this module with a layer.
+
+        Parameters
+        ----------
+        layer : callable
+            layer(name, func) returns the function to call instead of func,
+            or func itself to leave that function alone. Layers added later
+            wrap the earlier ones; they survive setBackend().
+        """
+        if layer not in _layers:
+                _layers.append(layer)
+                _rebind()
+
+def removeLayer(layer):
+        """Remove a layer added with addLayer()."""
+        if layer in _layers:
+                _layers.remove(layer)
+                _rebind()
 
 def PortResultTypes(result):
         return {
@@ -226,7 +338,7 @@ class tParamSetStruct(ctypes.Structure):
 #
 # extern "C" NKTPDLL_EXPORT void getAllPorts(char *portnames, unsigned short *maxLen);
 # typedef void (__cdecl *GetAllPortsFuncPtr)(char *portnames, unsigned short *maxLen);
-_getAllPorts = CFUNCTYPE(None, POINTER(c_char), POINTER(c_ushort))(('getAllPorts', NKTPDLL))
+_getAllPorts = _lazy(CFUNCTYPE(None, POINTER(c_char), POINTER(c_ushort)), 'getAllPorts')
 def getAllPorts():
 	maxLen = c_ushort(255)
 	portnames = create_string_buffer(maxLen.value)
@@ -239,7 +351,7 @@ def getAllPorts():
 #
 # extern "C" NKTPDLL_EXPORT void getOpenPorts(char *portnames, unsigned short *maxLen);
 # typedef void (__cdecl *GetOpenPortsFuncPtr)(char *portnames, unsigned short *maxLen);
-_getOpenPorts = CFUNCTYPE(None, POINTER(c_char), POINTER(c_ushort))(('getOpenPorts', NKTPDLL))
+_getOpenPorts = _lazy(CFUNCTYPE(None, POINTER(c_char), POINTER(c_ushort)), 'getOpenPorts')
 def getOpenPorts():
 	maxLen = c_ushort(255)
 	portnames = create_string_buffer(maxLen.value)
@@ -262,7 +374,7 @@ pointToPointPortData = namedtuple('pointToPointPortData', 'hostAddress, hostPort
 #
 # extern "C" NKTPDLL_EXPORT P2PPortResultTypes pointToPointPortAdd(const char *portname, const char *hostAddress, const unsigned short hostPort, const char *clientAddress, const unsigned short clientPort, const unsigned char protocol, const unsigned char msTimeout);
 # typedef P2PPortResultTypes (__cdecl *PointToPointPortAddFuncPtr)(const char *portname, const char *hostAddress, const unsigned short hostPort, const char *clientAddress, const unsigned short clientPort, const unsigned char protocol, const unsigned char msTimeout);
-_pointToPointPortAdd = CFUNCTYPE(c_ubyte, c_char_p, c_char_p, c_ushort, c_char_p, c_ushort, c_ubyte, c_ubyte)(('pointToPointPortAdd', NKTPDLL))
+_pointToPointPortAdd = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_char_p, c_ushort, c_char_p, c_ushort, c_ubyte, c_ubyte), 'pointToPointPortAdd')
 def pointToPointPortAdd(portname, portdata):
 	return _pointToPointPortAdd(portname.encode('ascii'), portdata.hostAddress.encode('ascii'), portdata.hostPort, portdata.clientAddress.encode('ascii'), portdata.clientPort, portdata.protocol, portdata.msTimeout)
 	
@@ -282,7 +394,7 @@ def pointToPointPortAdd(portname, portdata):
 #
 # extern "C" NKTPDLL_EXPORT P2PPortResultTypes pointToPointPortGet(const char *portname, char *hostAddress, unsigned char *hostMaxLen, unsigned short *hostPort, char *clientAddress, unsigned char *clientMaxLen, unsigned short *clientPort, unsigned char *protocol, unsigned char *msTimeout);
 # typedef P2PPortResultTypes (__cdecl *PointToPointPortGetFuncPtr)(const char *portname, char *hostAddress, unsigned char *hostMaxLen, unsigned short *hostPort, char *clientAddress, unsigned char *clientMaxLen, unsigned short *clientPort, unsigned char *protocol, unsigned char *msTimeout);
-_pointToPointPortGet = CFUNCTYPE(c_ubyte, c_char_p, POINTER(c_char), POINTER(c_ubyte), POINTER(c_ushort), POINTER(c_char), POINTER(c_ubyte), POINTER(c_ushort), POINTER(c_ubyte), POINTER(c_ubyte))(('pointToPointPortGet', NKTPDLL))
+_pointToPointPortGet = _lazy(CFUNCTYPE(c_ubyte, c_char_p, POINTER(c_char), POINTER(c_ubyte), POINTER(c_ushort), POINTER(c_char), POINTER(c_ubyte), POINTER(c_ushort), POINTER(c_ubyte), POINTER(c_ubyte)), 'pointToPointPortGet')
 def pointToPointPortGet(portname): #, hostAddress, hostPort, clientAddress, clientPort, protocol, msTimeout):
 	_hostMaxLen = c_ubyte(255)
 	_hostAddress = create_string_buffer(_hostMaxLen.value)
@@ -301,7 +413,7 @@ def pointToPointPortGet(portname): #, hostAddress, hostPort, clientAddress, clie
 #
 # extern "C" NKTPDLL_EXPORT P2PPortResultTypes pointToPointPortDel(const char *portname);
 # typedef P2PPortResultTypes (__cdecl *PointToPointPortDelFuncPtr)(const char *portname);
-_pointToPointPortDel = CFUNCTYPE(c_ubyte, c_char_p)(('pointToPointPortDel', NKTPDLL))
+_pointToPointPortDel = _lazy(CFUNCTYPE(c_ubyte, c_char_p), 'pointToPointPortDel')
 def pointToPointPortDel(portname):
 	return _pointToPointPortDel(portname.encode('ascii'))
 	
@@ -318,7 +430,7 @@ def pointToPointPortDel(portname):
 #
 # extern "C" NKTPDLL_EXPORT PortResultTypes openPorts(const char *portnames, const char autoMode, const char liveMode);
 # typedef PortResultTypes (__cdecl *OpenPortsFuncPtr)(const char *portnames, const char autoMode, const char liveMode);
-_openPorts = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte)(('openPorts', NKTPDLL))
+_openPorts = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte), 'openPorts')
 def openPorts(portnames, autoMode, liveMode):
 	return _openPorts(portnames.encode('ascii'), autoMode, liveMode)
 
@@ -329,7 +441,7 @@ def openPorts(portnames, autoMode, liveMode):
 #
 # extern "C" NKTPDLL_EXPORT PortResultTypes closePorts(const char *portnames);
 # typedef PortResultTypes (__cdecl *ClosePortsFuncPtr)(const char *portnames);
-_closePorts = CFUNCTYPE(c_ubyte, c_char_p)(('closePorts', NKTPDLL))
+_closePorts = _lazy(CFUNCTYPE(c_ubyte, c_char_p), 'closePorts')
 def closePorts(portnames):
 	return _closePorts(portnames.encode('ascii'))
 
@@ -338,7 +450,7 @@ def closePorts(portnames):
 #                       \arg 1 the busscanning is set to legacy mode and fixes the masterId at address 66(0x42). Some older modules does not accept masterIds other than 66(ox42).
 # extern "C" NKTPDLL_EXPORT void setLegacyBusScanning(const char legacyScanning);
 # typedef void (__cdecl *SetLegacyBusScanningFuncPtr)(const char legacyScanning);
-_setLegacyBusScanning = CFUNCTYPE(None, c_ubyte)(('setLegacyBusScanning', NKTPDLL))
+_setLegacyBusScanning = _lazy(CFUNCTYPE(None, c_ubyte), 'setLegacyBusScanning')
 def setLegacyBusScanning(legacyScanning):
 	return _setLegacyBusScanning(legacyScanning)
 
@@ -346,7 +458,7 @@ def setLegacyBusScanning(legacyScanning):
 # \return An unsigned char, with legacyScanning status. 0 the busscanning is currently in normal mode. 1 the busscanning is currently in legacy mode.
 # extern "C" NKTPDLL_EXPORT unsigned char getLegacyBusScanning();
 # typedef unsigned char (__cdecl *GetLegacyBusScanningFuncPtr)();
-_getLegacyBusScanning = CFUNCTYPE(c_ubyte)(('getLegacyBusScanning', NKTPDLL))
+_getLegacyBusScanning = _lazy(CFUNCTYPE(c_ubyte), 'getLegacyBusScanning')
 def getLegacyBusScanning():
         return _getLegacyBusScanning()
 	
@@ -357,7 +469,7 @@ def getLegacyBusScanning():
 #
 # extern "C" NKTPDLL_EXPORT PortResultTypes getPortStatus(const char *portname, PortStatusTypes *portStatus);
 # typedef PortResultTypes (__cdecl *getPortStatusFuncPtr)(const char *portname, PortStatusTypes *portStatus);
-_getPortStatus = CFUNCTYPE(c_ubyte, c_char_p, POINTER(c_ubyte))(('getPortStatus', NKTPDLL))
+_getPortStatus = _lazy(CFUNCTYPE(c_ubyte, c_char_p, POINTER(c_ubyte)), 'getPortStatus')
 def getPortStatus(portname):
         portStatus = c_ubyte(0)
         result = _getPortStatus(portname.encode('ascii'), portStatus)
@@ -370,13 +482,45 @@ def getPortStatus(portname):
 #
 # extern "C" NKTPDLL_EXPORT PortResultTypes getPortErrorMsg(const char *portname, char *errorMessage, unsigned short *maxLen);
 # typedef PortResultTypes (__cdecl *getPortErrorMsgFuncPtr)(const char *portname, char *errorMessage, unsigned short *maxLen);
-_getPortErrorMsg = CFUNCTYPE(c_ubyte, c_char_p, POINTER(c_char), POINTER(c_ushort))(('getPortErrorMsg', NKTPDLL))
+_getPortErrorMsg = _lazy(CFUNCTYPE(c_ubyte, c_char_p, POINTER(c_char), POINTER(c_ushort)), 'getPortErrorMsg')
 def getPortErrorMsg(portname):
 	_maxLen = c_ushort(1000)
 	_errMsg = create_string_buffer(_maxLen.value)
 	result = _getPortErrorMsg(portname.encode('ascii'), _errMsg, _maxLen)
 	return result, _errMsg.value.decode('ascii')
 
+#*******************************************************************************************************
+# Hot path support for the register functions
+#*******************************************************************************************************
+# The register read/write wrappers below are called thousands of times during a wavelength sweep or a
+# telemetry poll. Instead of allocating fresh ctypes objects and re-encoding the portname on every call
+# they reuse per-thread ctypes buffers and a cache of encoded portnames.
+
+class _ThreadBuffers(threading.local):
+        """Preallocated ctypes objects, created once per thread on first use."""
+        def __init__(self):
+                self.readSize = c_ubyte(255)
+                self.readData = create_string_buffer(255)
+                self.u8 = c_ubyte(0)
+                self.s8 = c_byte(0)
+                self.u16 = c_ushort(0)
+                self.s16 = c_short(0)
+                self.u32 = c_ulong(0)
+                self.s32 = c_long(0)
+                self.u64 = c_ulonglong(0)
+                self.s64 = c_longlong(0)
+                self.f32 = c_float(0)
+                self.f64 = c_double(0)
+
+_buffers = _ThreadBuffers()
+
+# Encoded portnames; wrappers use "_portnames.get(portname) or _encodePortname(portname)"
+_portnames = {}
+
+def _encodePortname(portname):
+        encoded = _portnames[portname] = portname.encode('ascii')
+        return encoded
+
 #*******************************************************************************************************
 # Dedicated - Register read functions
 #*******************************************************************************************************
@@ -397,12 +541,14 @@ def getPortErrorMsg(portname):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerRead(const char *portname, const unsigned char devId, const unsigned char regId, void *readData, unsigned char *readSize, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadFuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, void *readData, unsigned char *readSize, const short index);
-_registerRead = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_char), POINTER(c_ubyte), c_short)(('registerRead', NKTPDLL))
+_registerRead = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_char), POINTER(c_ubyte), c_short), 'registerRead')
 def registerRead(portname, devId, regId, index):
-	_readSize = c_ubyte(255)
-	_readData = create_string_buffer(_readSize.value)
-	result = _registerRead(portname.encode('ascii'), devId, regId, _readData, _readSize, index)
-	if result != 0: _readSize = c_ubyte(0)
+	_readSize = _buffers.readSize
+	_readSize.value = 255
+	_readData = _buffers.readData
+	_readData[0] = b'\0'
+	result = _registerRead(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readData, _readSize, index)
+	if result != 0: return result, b''
 	return result, _readData.raw[:_readSize.value]
 
 # \brief Reads an unsigned char (8bit) register value and returns the result in value.
@@ -416,10 +562,11 @@ def registerRead(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadU8(const char *portname, const unsigned char devId, const unsigned char regId, unsigned char *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadU8FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, unsigned char *value, const short index);
-_registerReadU8 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ubyte), c_short)(('registerReadU8', NKTPDLL))
+_registerReadU8 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ubyte), c_short), 'registerReadU8')
 def registerReadU8(portname, devId, regId, index):
-	_readValue = c_ubyte(0)
-	result = _registerReadU8(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.u8
+	_readValue.value = 0
+	result = _registerReadU8(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
 
 # \brief Reads a signed char (8bit) register value and returns the result in value.
@@ -433,10 +580,11 @@ def registerReadU8(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadS8(const char *portname, const unsigned char devId, const unsigned char regId, signed char *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadS8FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, signed char *value, const short index);
-_registerReadS8 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_byte), c_short)(('registerReadS8', NKTPDLL))
+_registerReadS8 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_byte), c_short), 'registerReadS8')
 def registerReadS8(portname, devId, regId, index):
-	_readValue = c_byte(0)
-	result = _registerReadS8(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.s8
+	_readValue.value = 0
+	result = _registerReadS8(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
 
 # \brief Reads an unsigned short (16bit) register value and returns the result in value.
@@ -450,10 +598,11 @@ def registerReadS8(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadU16(const char *portname, const unsigned char devId, const unsigned char regId, unsigned short *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadU16FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, unsigned short *value, const short index);
-_registerReadU16 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ushort), c_short)(('registerReadU16', NKTPDLL))
+_registerReadU16 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ushort), c_short), 'registerReadU16')
 def registerReadU16(portname, devId, regId, index):
-	_readValue = c_ushort(0)
-	result = _registerReadU16(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.u16
+	_readValue.value = 0
+	result = _registerReadU16(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
 
 # \brief Reads a signed short (16bit) register value and returns the result in value.
@@ -467,10 +616,11 @@ def registerReadU16(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadS16(const char *portname, const unsigned char devId, const unsigned char regId, signed short *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadS16FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, signed short *value, const short index);
-_registerReadS16 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_short), c_short)(('registerReadS16', NKTPDLL))
+_registerReadS16 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_short), c_short), 'registerReadS16')
 def registerReadS16(portname, devId, regId, index):
-	_readValue = c_short(0)
-	result = _registerReadS16(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.s16
+	_readValue.value = 0
+	result = _registerReadS16(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
 
 # \brief Reads an unsigned long (32bit) register value and returns the result in value.
@@ -484,10 +634,11 @@ def registerReadS16(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadU32(const char *portname, const unsigned char devId, const unsigned char regId, unsigned long *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadU32FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, unsigned long *value, const short index);
-_registerReadU32 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ulong), c_short)(('registerReadU32', NKTPDLL))
+_registerReadU32 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ulong), c_short), 'registerReadU32')
 def registerReadU32(portname, devId, regId, index):
-	_readValue = c_ulong(0)
-	result = _registerReadU32(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.u32
+	_readValue.value = 0
+	result = _registerReadU32(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
 
 # \brief Reads a signed long (32bit) register value and returns the result in value.
@@ -501,10 +652,11 @@ def registerReadU32(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadS32(const char *portname, const unsigned char devId, const unsigned char regId, signed long *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadS32FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, signed long *value, const short index);
-_registerReadS32 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_long), c_short)(('registerReadS32', NKTPDLL))
+_registerReadS32 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_long), c_short), 'registerReadS32')
 def registerReadS32(portname, devId, regId, index):
-	_readValue = c_long(0)
-	result = _registerReadS32(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.s32
+	_readValue.value = 0
+	result = _registerReadS32(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
     
 # \brief Reads an unsigned long long (64bit) register value and returns the result in value.
@@ -518,10 +670,11 @@ def registerReadS32(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadU64(const char *portname, const unsigned char devId, const unsigned char regId, unsigned long long *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadU64FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, unsigned long long *value, const short index);
-_registerReadU64 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ulonglong), c_short)(('registerReadU64', NKTPDLL))
+_registerReadU64 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ulonglong), c_short), 'registerReadU64')
 def registerReadU64(portname, devId, regId, index):
-	_readValue = c_ulonglong(0)
-	result = _registerReadU64(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.u64
+	_readValue.value = 0
+	result = _registerReadU64(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
 
 # \brief Reads a signed long long (64bit) register value and returns the result in value.
@@ -535,10 +688,11 @@ def registerReadU64(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadS64(const char *portname, const unsigned char devId, const unsigned char regId, signed long long *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadS64FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, signed long long *value, const short index);
-_registerReadS64 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_longlong), c_short)(('registerReadS64', NKTPDLL))
+_registerReadS64 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_longlong), c_short), 'registerReadS64')
 def registerReadS64(portname, devId, regId, index):
-	_readValue = c_longlong(0)
-	result = _registerReadS64(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.s64
+	_readValue.value = 0
+	result = _registerReadS64(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
 
 # \brief Reads a float (32bit) register value and returns the result in value.
@@ -552,10 +706,11 @@ def registerReadS64(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadF32(const char *portname, const unsigned char devId, const unsigned char regId, float *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadF32FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, float *value, const short index);
-_registerReadF32 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_float), c_short)(('registerReadF32', NKTPDLL))
+_registerReadF32 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_float), c_short), 'registerReadF32')
 def registerReadF32(portname, devId, regId, index):
-	_readValue = c_float(0)
-	result = _registerReadF32(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.f32
+	_readValue.value = 0
+	result = _registerReadF32(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
 
 # \brief Reads a double (64bit) register value and returns the result in value.
@@ -569,10 +724,11 @@ def registerReadF32(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadF64(const char *portname, const unsigned char devId, const unsigned char regId, double *value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadF64FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, double *value, const short index);
-_registerReadF64 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_double), c_short)(('registerReadF64', NKTPDLL))
+_registerReadF64 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_double), c_short), 'registerReadF64')
 def registerReadF64(portname, devId, regId, index):
-	_readValue = c_double(0)
-	result = _registerReadF64(portname.encode('ascii'), devId, regId, _readValue, index)
+	_readValue = _buffers.f64
+	_readValue.value = 0
+	result = _registerReadF64(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readValue, index)
 	return result, _readValue.value
 
 # \brief Reads a Ascii string register value and returns the result in readStr area.
@@ -587,11 +743,13 @@ def registerReadF64(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerReadAscii(const char *portname, const unsigned char devId, const unsigned char regId, char *readStr, unsigned char *maxLen, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterReadAsciiFuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, char *readStr, unsigned char *maxLen, const short index);
-_registerReadAscii = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_char), POINTER(c_ubyte), c_short)(('registerReadAscii', NKTPDLL))
+_registerReadAscii = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_char), POINTER(c_ubyte), c_short), 'registerReadAscii')
 def registerReadAscii(portname, devId, regId, index):
-	_readSize = c_ubyte(255)
-	_readData = create_string_buffer(_readSize.value)
-	result = _registerReadAscii(portname.encode('ascii'), devId, regId, _readData, _readSize, index)
+	_readSize = _buffers.readSize
+	_readSize.value = 255
+	_readData = _buffers.readData
+	_readData[0] = b'\0'
+	result = _registerReadAscii(_portnames.get(portname) or _encodePortname(portname), devId, regId, _readData, _readSize, index)
 	return result, _readData.value
 
 
@@ -615,9 +773,9 @@ def registerReadAscii(portname, devId, regId, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWrite(const char *portname, const unsigned char devId, const unsigned char regId, const void *writeData, const unsigned char writeSize, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterWriteFuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const void *writeData, const unsigned char writeSize, const short index);
-_registerWrite = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_char), c_ubyte, c_short)(('registerWrite', NKTPDLL))
+_registerWrite = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_char), c_ubyte, c_short), 'registerWrite')
 def registerWrite(portname, devId, regId, writeData, writeSize, index):
-        return _registerWrite(portname.encode('ascii'), devId, regId, writeData, writeSize, index)
+        return _registerWrite(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeData, writeSize, index)
 
 # \brief Writes an unsigned char (8bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -630,9 +788,9 @@ def registerWrite(portname, devId, regId, writeData, writeSize, index):
 #
 # extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteU8(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned char value, const short index);
 # typedef RegisterResultTypes (__cdecl *RegisterWriteU8FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned char value, const short index);
-_registerWriteU8 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ubyte, c_short)(('registerWriteU8', NKTPDLL))
+_registerWriteU8 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ubyte, c_short), 'registerWriteU8')
 def registerWriteU8(portname, devId, regId, value, index):
-	return _registerWriteU8(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteU8(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes a signed char (8bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -646,9 +804,9 @@ def registerWriteU8(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteS8(const char *portname, const unsigned char devId, const unsigned char regId, const signed char value, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteS8FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const signed char value, const short index);
-_registerWriteS8 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_byte, c_short)(('registerWriteS8', NKTPDLL))
+_registerWriteS8 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_byte, c_short), 'registerWriteS8')
 def registerWriteS8(portname, devId, regId, value, index):
-	return _registerWriteS8(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteS8(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes an unsigned short (16bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -661,9 +819,9 @@ def registerWriteS8(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteU16(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned short value, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteU16FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned short value, const short index);
-_registerWriteU16 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ushort, c_short)(('registerWriteU16', NKTPDLL))
+_registerWriteU16 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ushort, c_short), 'registerWriteU16')
 def registerWriteU16(portname, devId, regId, value, index):
-	return _registerWriteU16(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteU16(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes a signed short (16bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -676,9 +834,9 @@ def registerWriteU16(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteS16(const char *portname, const unsigned char devId, const unsigned char regId, const signed short value, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteS16FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const signed short value, const short index);
-_registerWriteS16 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_short, c_short)(('registerWriteS16', NKTPDLL))
+_registerWriteS16 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_short, c_short), 'registerWriteS16')
 def registerWriteS16(portname, devId, regId, value, index):
-	return _registerWriteS16(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteS16(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes an unsigned long (32bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -691,9 +849,9 @@ def registerWriteS16(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteU32(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned long value, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteU32FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned long value, const short index);
-_registerWriteU32 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ulong, c_short)(('registerWriteU32', NKTPDLL))
+_registerWriteU32 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ulong, c_short), 'registerWriteU32')
 def registerWriteU32(portname, devId, regId, value, index):
-	return _registerWriteU32(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteU32(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes a signed long (32bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -706,9 +864,9 @@ def registerWriteU32(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteS32(const char *portname, const unsigned char devId, const unsigned char regId, const signed long value, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteS32FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const signed long value, const short index);
-_registerWriteS32 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_long, c_short)(('registerWriteS32', NKTPDLL))
+_registerWriteS32 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_long, c_short), 'registerWriteS32')
 def registerWriteS32(portname, devId, regId, value, index):
-	return _registerWriteS32(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteS32(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes an unsigned long long (64bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -721,9 +879,9 @@ def registerWriteS32(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteU64(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned long long value, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteU64FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned long long value, const short index);
-_registerWriteU64 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ulonglong, c_short)(('registerWriteU64', NKTPDLL))
+_registerWriteU64 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ulonglong, c_short), 'registerWriteU64')
 def registerWriteU64(portname, devId, regId, value, index):
-	return _registerWriteU64(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteU64(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes a signed long long (64bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -736,9 +894,9 @@ def registerWriteU64(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteS64(const char *portname, const unsigned char devId, const unsigned char regId, const signed long long value, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteS64FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const signed long long value, const short index);
-_registerWriteS64 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_longlong, c_short)(('registerWriteS64', NKTPDLL))
+_registerWriteS64 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_longlong, c_short), 'registerWriteS64')
 def registerWriteS64(portname, devId, regId, value, index):
-	return _registerWriteS64(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteS64(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes a float (32bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -751,9 +909,9 @@ def registerWriteS64(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteF32(const char *portname, const unsigned char devId, const unsigned char regId, const float value, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteF32FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const float value, const short index);
-_registerWriteF32 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_float, c_short)(('registerWriteF32', NKTPDLL))
+_registerWriteF32 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_float, c_short), 'registerWriteF32')
 def registerWriteF32(portname, devId, regId, value, index):
-	return _registerWriteF32(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteF32(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes a double (64bit) register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -766,9 +924,9 @@ def registerWriteF32(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteF64(const char *portname, const unsigned char devId, const unsigned char regId, const double value, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteF64FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const double value, const short index);
-_registerWriteF64 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_double, c_short)(('registerWriteF64', NKTPDLL))
+_registerWriteF64 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_double, c_short), 'registerWriteF64')
 def registerWriteF64(portname, devId, regId, value, index):
-	return _registerWriteF64(portname.encode('ascii'), devId, regId, value, index)
+	return _registerWriteF64(_portnames.get(portname) or _encodePortname(portname), devId, regId, value, index)
 
 # \brief Writes a string register value.
 # \param portname Zero terminated string giving the portname (case sensitive).
@@ -783,10 +941,10 @@ def registerWriteF64(portname, devId, regId, value, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteAscii(const char *portname, const unsigned char devId, const unsigned char regId, const char* writeStr, const char writeEOL, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteAsciiFuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const char* writeStr, const char writeEOL, const short index);
-_registerWriteAscii = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_char_p, c_ubyte, c_short)(('registerWriteAscii', NKTPDLL))
+_registerWriteAscii = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_char_p, c_ubyte, c_short), 'registerWriteAscii')
 def registerWriteAscii(portname, devId, regId, strValue, wrEOL, index):
-        _asciiValue = create_string_buffer(strValue.encode('ascii'))
-        return _registerWriteAscii(portname.encode('ascii'), devId, regId, _asciiValue, wrEOL, index)
+        _asciiValue = strValue.encode('ascii')
+        return _registerWriteAscii(_portnames.get(portname) or _encodePortname(portname), devId, regId, _asciiValue, wrEOL, index)
 
 
 #*******************************************************************************************************
@@ -811,11 +969,13 @@ def registerWriteAscii(portname, devId, regId, strValue, wrEOL, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteRead(const char *portname, const unsigned char devId, const unsigned char regId, const void *writeData, const unsigned char writeSize, void *readData, unsigned char *readSize, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadFuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const void *writeData, const unsigned char writeSize, void *readData, unsigned char *readSize, const short index);
-_registerWriteRead = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_char), c_ubyte, POINTER(c_char), POINTER(c_ubyte), c_short)(('registerWriteRead', NKTPDLL))
+_registerWriteRead = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_char), c_ubyte, POINTER(c_char), POINTER(c_ubyte), c_short), 'registerWriteRead')
 def registerWriteRead(portname, devId, regId, writeData, writeSize, index):
-        _readSize = c_ubyte(255)
-        _readData = create_string_buffer(_readSize.value)
-        result = _registerWriteRead(portname.encode('ascii'), devId, regId, writeData, writeSize, _readData, _readSize, index)
+        _readSize = _buffers.readSize
+        _readSize.value = 255
+        _readData = _buffers.readData
+        _readData[0] = b'\0'
+        result = _registerWriteRead(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeData, writeSize, _readData, _readSize, index)
         return result, _readData.raw[:_readSize.value]
 
 # \brief Writes and Reads an unsigned char (8bit) register value.
@@ -830,10 +990,11 @@ def registerWriteRead(portname, devId, regId, writeData, writeSize, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadU8(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned char writeValue, unsigned char *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadU8FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned char writeValue, unsigned char *readValue, const short index);
-_registerWriteReadU8 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ubyte, POINTER(c_ubyte), c_short)(('registerWriteReadU8', NKTPDLL))
+_registerWriteReadU8 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ubyte, POINTER(c_ubyte), c_short), 'registerWriteReadU8')
 def registerWriteReadU8(portname, devId, regId, writeValue, index):
-        _readValue = c_ubyte(0)
-        result = _registerWriteReadU8(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.u8
+        _readValue.value = 0
+        result = _registerWriteReadU8(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads a signed char (8bit) register value.
@@ -848,10 +1009,11 @@ def registerWriteReadU8(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadS8(const char *portname, const unsigned char devId, const unsigned char regId, const signed char writeValue, signed char *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadS8FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const signed char writeValue, signed char *readValue, const short index);
-_registerWriteReadS8 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_byte, POINTER(c_byte), c_short)(('registerWriteReadS8', NKTPDLL))
+_registerWriteReadS8 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_byte, POINTER(c_byte), c_short), 'registerWriteReadS8')
 def registerWriteReadS8(portname, devId, regId, writeValue, index):
-        _readValue = c_byte(0)
-        result = _registerWriteReadS8(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.s8
+        _readValue.value = 0
+        result = _registerWriteReadS8(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads an unsigned short (16bit) register value.
@@ -866,10 +1028,11 @@ def registerWriteReadS8(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadU16(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned short writeValue, unsigned short *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadU16FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned short writeValue, unsigned short *readValue, const short index);
-_registerWriteReadU16 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ushort, POINTER(c_ushort), c_short)(('registerWriteReadU16', NKTPDLL))
+_registerWriteReadU16 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ushort, POINTER(c_ushort), c_short), 'registerWriteReadU16')
 def registerWriteReadU16(portname, devId, regId, writeValue, index):
-        _readValue = c_ushort(0)
-        result = _registerWriteReadU16(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.u16
+        _readValue.value = 0
+        result = _registerWriteReadU16(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads a signed short (16bit) register value.
@@ -884,10 +1047,11 @@ def registerWriteReadU16(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadS16(const char *portname, const unsigned char devId, const unsigned char regId, const signed short writeValue, signed short *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadS16FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const signed short writeValue, signed short *readValue, const short index);
-_registerWriteReadS16 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_short, POINTER(c_short), c_short)(('registerWriteReadS16', NKTPDLL))
+_registerWriteReadS16 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_short, POINTER(c_short), c_short), 'registerWriteReadS16')
 def registerWriteReadS16(portname, devId, regId, writeValue, index):
-        _readValue = c_short(0)
-        result = _registerWriteReadS16(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.s16
+        _readValue.value = 0
+        result = _registerWriteReadS16(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads an unsigned long (32bit) register value.
@@ -902,10 +1066,11 @@ def registerWriteReadS16(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadU32(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned long writeValue, unsigned long *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadU32FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned long writeValue, unsigned long *readValue, const short index);
-_registerWriteReadU32 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ulong, POINTER(c_ulong), c_short)(('registerWriteReadU32', NKTPDLL))
+_registerWriteReadU32 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ulong, POINTER(c_ulong), c_short), 'registerWriteReadU32')
 def registerWriteReadU32(portname, devId, regId, writeValue, index):
-        _readValue = c_ulong(0)
-        result = _registerWriteReadU32(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.u32
+        _readValue.value = 0
+        result = _registerWriteReadU32(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads a signed long (32bit) register value.
@@ -920,10 +1085,11 @@ def registerWriteReadU32(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadS32(const char *portname, const unsigned char devId, const unsigned char regId, const signed long writeValue, signed long *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadS32FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const signed long writeValue, signed long *readValue, const short index);
-_registerWriteReadS32 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_long, POINTER(c_long), c_short)(('registerWriteReadS32', NKTPDLL))
+_registerWriteReadS32 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_long, POINTER(c_long), c_short), 'registerWriteReadS32')
 def registerWriteReadS32(portname, devId, regId, writeValue, index):
-        _readValue = c_long(0)
-        result = _registerWriteReadS32(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.s32
+        _readValue.value = 0
+        result = _registerWriteReadS32(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads an unsigned long long (64bit) register value.
@@ -938,10 +1104,11 @@ def registerWriteReadS32(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadU64(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned long long writeValue, unsigned long long *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadU64FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const unsigned long long writeValue, unsigned long long *readValue, const short index);
-_registerWriteReadU64 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ulonglong, POINTER(c_ulonglong), c_short)(('registerWriteReadU64', NKTPDLL))
+_registerWriteReadU64 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ulonglong, POINTER(c_ulonglong), c_short), 'registerWriteReadU64')
 def registerWriteReadU64(portname, devId, regId, writeValue, index):
-        _readValue = c_ulonglong(0)
-        result = _registerWriteReadU64(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.u64
+        _readValue.value = 0
+        result = _registerWriteReadU64(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads a signed long long (64bit) register value.
@@ -956,10 +1123,11 @@ def registerWriteReadU64(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadS64(const char *portname, const unsigned char devId, const unsigned char regId, const signed long long writeValue, signed long long *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadS64FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const signed long long writeValue, signed long long *readValue, const short index);
-_registerWriteReadS64 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_longlong, POINTER(c_longlong), c_short)(('registerWriteReadS64', NKTPDLL))
+_registerWriteReadS64 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_longlong, POINTER(c_longlong), c_short), 'registerWriteReadS64')
 def registerWriteReadS64(portname, devId, regId, writeValue, index):
-        _readValue = c_longlong(0)
-        result = _registerWriteReadS64(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.s64
+        _readValue.value = 0
+        result = _registerWriteReadS64(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads a float (32bit) register value.
@@ -974,10 +1142,11 @@ def registerWriteReadS64(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadF32(const char *portname, const unsigned char devId, const unsigned char regId, const float writeValue, float *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadF32FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const float writeValue, float *readValue, const short index);
-_registerWriteReadF32 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_float, POINTER(c_float), c_short)(('registerWriteReadF32', NKTPDLL))
+_registerWriteReadF32 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_float, POINTER(c_float), c_short), 'registerWriteReadF32')
 def registerWriteReadF32(portname, devId, regId, writeValue, index):
-        _readValue = c_float(0)
-        result = _registerWriteReadF32(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.f32
+        _readValue.value = 0
+        result = _registerWriteReadF32(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads a double (64bit) register value.
@@ -992,10 +1161,11 @@ def registerWriteReadF32(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadF64(const char *portname, const unsigned char devId, const unsigned char regId, const double writeValue, double *readValue, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadF64FuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const double writeValue, double *readValue, const short index);
-_registerWriteReadF64 = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_double, POINTER(c_double), c_short)(('registerWriteReadF64', NKTPDLL))
+_registerWriteReadF64 = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_double, POINTER(c_double), c_short), 'registerWriteReadF64')
 def registerWriteReadF64(portname, devId, regId, writeValue, index):
-        _readValue = c_double(0)
-        result = _registerWriteReadF64(portname.encode('ascii'), devId, regId, writeValue, _readValue, index)
+        _readValue = _buffers.f64
+        _readValue.value = 0
+        result = _registerWriteReadF64(_portnames.get(portname) or _encodePortname(portname), devId, regId, writeValue, _readValue, index)
         return result, _readValue.value
 
 # \brief Writes and Reads a string register value.
@@ -1013,14 +1183,114 @@ def registerWriteReadF64(portname, devId, regId, writeValue, index):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerWriteReadAscii(const char *portname, const unsigned char devId, const unsigned char regId, const char* writeStr, const char writeEOL, char *readStr, unsigned char *maxLen, const short index);
 #typedef RegisterResultTypes (__cdecl *RegisterWriteReadAsciiFuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const char* writeStr, const char writeEOL, char *readStr, unsigned char *maxLen, const short index);
-_registerWriteReadAscii = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte), c_short)(('registerWriteReadAscii', NKTPDLL))
+_registerWriteReadAscii = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte), c_short), 'registerWriteReadAscii')
 def registerWriteReadAscii(portname, devId, regId, strValue, wrEOL, index):
-        _asciiValue = create_string_buffer(strValue.encode('ascii'))
-        _readSize = c_ubyte(255)
-        _readData = create_string_buffer(_readSize.value)
-        result = _registerWriteReadAscii(portname.encode('ascii'), devId, regId, _asciiValue, wrEOL, _readData, _readSize, index)
+        _asciiValue = strValue.encode('ascii')
+        _readSize = _buffers.readSize
+        _readSize.value = 255
+        _readData = _buffers.readData
+        _readData[0] = b'\0'
+        result = _registerWriteReadAscii(_portnames.get(portname) or _encodePortname(portname), devId, regId, _asciiValue, wrEOL, _readData, _readSize, index)
         return result, _readData.value
 
+#*******************************************************************************************************
+#* Batched - Register read and write functions
+#*******************************************************************************************************/
+# Batched - Register read and write functions. Not exported by the DLL, built on the dedicated functions above.
+# A port is a serial bus that carries one transaction at a time, so the registers of one port are read (or written)
+# one after the other, in order, with the Python overhead of a batch paid once. Different ports run in parallel on
+# a small thread pool (ctypes releases the GIL during the call). Each port runs in a copy of the caller's context
+# (contextvars), so layers such as nkt_locking see the calls of a batch as made by the caller.
+
+# Typed read function per ::RegisterDataTypes value, or per type name ('U8', 'S16', ...).
+# The names are resolved at call time so that a backend set with setBackend() is honoured.
+_readFunctionNames = {
+        1: 'registerRead', 2: 'registerReadU8', 3: 'registerReadS8', 4: 'registerReadU16',
+        5: 'registerReadS16', 6: 'registerReadU32', 7: 'registerReadS32', 8: 'registerReadF32',
+        9: 'registerReadU64', 10: 'registerReadS64', 11: 'registerReadF64', 12: 'registerReadAscii',
+        }
+for _dataType, _name in list(_readFunctionNames.items()):
+        _readFunctionNames[_name[len('registerRead'):] or 'Array'] = _name
+del _dataType, _name
+
+_readPool = None
+
+def _getReadPool():
+        global _readPool
+        if _readPool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _readPool = ThreadPoolExecutor(max_workers=32, thread_name_prefix='nktp-read')
+        return _readPool
+
+# \brief Reads a register with the registerReadXX function matching dataType.
+# \param portname Zero terminated string giving the portname (case sensitive).
+# \param devId The device id (module address).
+# \param regId The register id (register address).
+# \param dataType A ::RegisterDataTypes value or a type name such as 'U16'. 'Array' reads raw bytes with ::registerRead.
+# \param index Value index. Typically -1.
+# \return (result, value) as returned by the matching registerReadXX function.
+def registerReadTyped(portname, devId, regId, dataType, index):
+        return globals()[_readFunctionNames[dataType]](portname, devId, regId, index)
+
+# \brief Reads several registers on several ports: the ports in parallel, the registers of a port in order.
+# \param requests List of (portname, devId, registers) tuples, where registers is a list of (regId, dataType) or
+#                 (regId, dataType, index) tuples. dataType is a ::RegisterDataTypes value or a type name such as 'U16'.
+# \return A list with one entry per request, each a list of (result, value) tuples in the order of its registers,
+#         exactly as returned by the matching registerReadXX function.
+def registerReadManyPorts(requests):
+        ports = {}      # {portname: [(request number, func, devId, regId, index)]}
+        for number, (portname, devId, registers) in enumerate(requests):
+                calls = ports.setdefault(portname, [])
+                for register in registers:
+                        func = globals()[_readFunctionNames[register[1]]]
+                        index = register[2] if len(register) > 2 else -1
+                        calls.append((number, func, devId, register[0], index))
+        output = [[] for request in requests]
+        for portname, readings in _runPorts(ports, _readPort):
+                for call, reading in zip(ports[portname], readings):
+                        output[call[0]].append(reading)
+        return output
+
+def _readPort(portname, calls):
+        return [func(portname, devId, regId, index) for number, func, devId, regId, index in calls]
+
+def _writePort(portname, calls):
+        return [func(portname, *args) for func, args in calls]
+
+def _runPorts(ports, runPort):
+        """Run runPort(portname, calls) for every port, ports in parallel; return [(portname, results)]."""
+        if len(ports) > 1:
+                pool = _getReadPool()
+                futures = [(portname, pool.submit(contextvars.copy_context().run, runPort, portname, calls))
+                           for portname, calls in ports.items()]
+                return [(portname, future.result()) for portname, future in futures]
+        return [(portname, runPort(portname, calls)) for portname, calls in ports.items()]
+
+# \brief Reads several registers of one device, one after the other.
+# \param portname Zero terminated string giving the portname (case sensitive).
+# \param devId The device id (module address).
+# \param registers List of (regId, dataType) or (regId, dataType, index) tuples, see ::registerReadManyPorts.
+# \return A list of (result, value) tuples in the order of registers.
+def registerReadMany(portname, devId, registers):
+        return registerReadManyPorts([(portname, devId, registers)])[0]
+
+# \brief Writes several registers of one device, one after the other.
+# \param portname Zero terminated string giving the portname (case sensitive).
+# \param devId The device id (module address).
+# \param writes List of (regId, dataType, value) or (regId, dataType, value, index) tuples. dataType is a type name
+#               such as 'U16'; 'Array' writes the bytes in value with ::registerWrite.
+# \return A list of ::RegisterResultTypes values in the order of writes.
+# \note The writes go to the bus one after the other, in the order of writes.
+def registerWriteMany(portname, devId, writes):
+        calls = []
+        for write in writes:
+                index = write[3] if len(write) > 3 else -1
+                if write[1] == 'Array':
+                        calls.append((globals()['registerWrite'], (devId, write[0], write[2], len(write[2]), index)))
+                else:
+                        calls.append((globals()['registerWrite' + write[1]], (devId, write[0], write[2], index)))
+        return _writePort(portname, calls)
+
 #*******************************************************************************************************
 #* Dedicated - Device functions
 #*******************************************************************************************************/
@@ -1038,7 +1308,7 @@ def registerWriteReadAscii(portname, devId, regId, strValue, wrEOL, index):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetType(const char *portname, const unsigned char devId, unsigned char *devType);
 #typedef DeviceResultTypes (__cdecl *DeviceGetTypeFuncPtr)(const char *portname, const unsigned char devId, unsigned char *devType);
-_deviceGetType = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte))(('deviceGetType', NKTPDLL))
+_deviceGetType = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte)), 'deviceGetType')
 def deviceGetType(portname, devId):
 	_readValue = c_ubyte(0)
 	result = _deviceGetType(portname.encode('ascii'), devId, _readValue)
@@ -1055,7 +1325,7 @@ def deviceGetType(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetPartNumberStr(const char *portname, const unsigned char devId, char *partnumber, unsigned char *maxLen);
 #typedef DeviceResultTypes (__cdecl *DeviceGetPartNumberStrFuncPtr)(const char *portname, const unsigned char devId, char *partnumber, unsigned char *maxLen);
-_deviceGetPartNumberStr = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte))(('deviceGetPartNumberStr', NKTPDLL))
+_deviceGetPartNumberStr = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte)), 'deviceGetPartNumberStr')
 def deviceGetPartNumberStr(portname, devId):
 	_readSize = c_ubyte(255)
 	_readStr = create_string_buffer(_readSize.value)
@@ -1072,7 +1342,7 @@ def deviceGetPartNumberStr(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetPCBVersion(const char *portname, const unsigned char devId, unsigned char *PCBVersion);
 #typedef DeviceResultTypes (__cdecl *DeviceGetPCBVersionFuncPtr)(const char *portname, const unsigned char devId, unsigned char *PCBVersion);
-_deviceGetPCBVersion = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte))(('deviceGetPCBVersion', NKTPDLL))
+_deviceGetPCBVersion = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte)), 'deviceGetPCBVersion')
 def deviceGetPCBVersion(portname, devId):
 	_readValue = c_ubyte(0)
 	result = _deviceGetPCBVersion(portname.encode('ascii'), devId, _readValue)
@@ -1088,7 +1358,7 @@ def deviceGetPCBVersion(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetStatusBits(const char *portname, const unsigned char devId, unsigned long *statusBits);
 #typedef DeviceResultTypes (__cdecl *DeviceGetStatusBitsFuncPtr)(const char *portname, const unsigned char devId, unsigned long *statusBits);
-_deviceGetStatusBits = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ushort))(('deviceGetStatusBits', NKTPDLL))
+_deviceGetStatusBits = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ushort)), 'deviceGetStatusBits')
 def deviceGetStatusBits(portname, devId):
 	_readValue = c_ulong(0)
 	result = _deviceGetStatusBits(portname.encode('ascii'), devId, _readValue)
@@ -1104,7 +1374,7 @@ def deviceGetStatusBits(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetErrorCode(const char *portname, const unsigned char devId, unsigned short *errorCode);
 #typedef DeviceResultTypes (__cdecl *DeviceGetErrorCodeFuncPtr)(const char *portname, const unsigned char devId, unsigned short *errorCode);
-_deviceGetErrorCode = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ushort))(('deviceGetErrorCode', NKTPDLL))
+_deviceGetErrorCode = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ushort)), 'deviceGetErrorCode')
 def deviceGetErrorCode(portname, devId):
 	_readValue = c_ushort(0)
 	result = _deviceGetErrorCode(portname.encode('ascii'), devId, _readValue)
@@ -1120,7 +1390,7 @@ def deviceGetErrorCode(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetBootloaderVersion(const char *portname, const unsigned char devId, unsigned short *version);
 #typedef DeviceResultTypes (__cdecl *DeviceGetBootloaderVersionFuncPtr)(const char *portname, const unsigned char devId, unsigned short *version);
-_deviceGetBootloaderVersion = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ushort))(('deviceGetBootloaderVersion', NKTPDLL))
+_deviceGetBootloaderVersion = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ushort)), 'deviceGetBootloaderVersion')
 def deviceGetBootloaderVersion(portname, devId):
 	_readValue = c_ushort(0)
 	result = _deviceGetBootloaderVersion(portname.encode('ascii'), devId, _readValue)
@@ -1137,7 +1407,7 @@ def deviceGetBootloaderVersion(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetBootloaderVersionStr(const char *portname, const unsigned char devId, char *versionStr, unsigned char *maxLen);
 #typedef DeviceResultTypes (__cdecl *DeviceGetBootloaderVersionStrFuncPtr)(const char *portname, const unsigned char devId, char *versionStr, unsigned char *maxLen);
-_deviceGetBootloaderVersionStr = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte))(('deviceGetBootloaderVersionStr', NKTPDLL))
+_deviceGetBootloaderVersionStr = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte)), 'deviceGetBootloaderVersionStr')
 def deviceGetBootloaderVersionStr(portname, devId):
 	_readSize = c_ubyte(255)
 	_readStr = create_string_buffer(_readSize.value)
@@ -1154,7 +1424,7 @@ def deviceGetBootloaderVersionStr(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetFirmwareVersion(const char *portname, const unsigned char devId, unsigned short *version);
 #typedef DeviceResultTypes (__cdecl *DeviceGetFirmwareVersionFuncPtr)(const char *portname, const unsigned char devId, unsigned short *version);
-_deviceGetFirmwareVersion = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ushort))(('deviceGetFirmwareVersion', NKTPDLL))
+_deviceGetFirmwareVersion = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ushort)), 'deviceGetFirmwareVersion')
 def deviceGetFirmwareVersion(portname, devId):
 	_readValue = c_ushort(0)
 	result = _deviceGetFirmwareVersion(portname.encode('ascii'), devId, _readValue)
@@ -1171,7 +1441,7 @@ def deviceGetFirmwareVersion(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetFirmwareVersionStr(const char *portname, const unsigned char devId, char *versionStr, unsigned char *maxLen);
 #typedef DeviceResultTypes (__cdecl *DeviceGetFirmwareVersionStrFuncPtr)(const char *portname, const unsigned char devId, char *versionStr, unsigned char *maxLen);
-_deviceGetFirmwareVersionStr = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte))(('deviceGetFirmwareVersionStr', NKTPDLL))
+_deviceGetFirmwareVersionStr = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte)), 'deviceGetFirmwareVersionStr')
 def deviceGetFirmwareVersionStr(portname, devId):
 	_readSize = c_ubyte(255)
 	_readStr = create_string_buffer(_readSize.value)
@@ -1189,7 +1459,7 @@ def deviceGetFirmwareVersionStr(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetModuleSerialNumberStr(const char *portname, const unsigned char devId, char *serialNumber, unsigned char *maxLen);
 #typedef DeviceResultTypes (__cdecl *DeviceGetModuleSerialNumberStrFuncPtr)(const char *portname, const unsigned char devId, char *serialNumber, unsigned char *maxLen);
-_deviceGetModuleSerialNumberStr = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte))(('deviceGetModuleSerialNumberStr', NKTPDLL))
+_deviceGetModuleSerialNumberStr = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte)), 'deviceGetModuleSerialNumberStr')
 def deviceGetModuleSerialNumberStr(portname, devId):
 	_readSize = c_ubyte(255)
 	_readStr = create_string_buffer(_readSize.value)
@@ -1207,7 +1477,7 @@ def deviceGetModuleSerialNumberStr(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetPCBSerialNumberStr(const char *portname, const unsigned char devId, char *serialNumber, unsigned char *maxLen);
 #typedef DeviceResultTypes (__cdecl *DeviceGetPCBSerialNumberStrFuncPtr)(const char *portname, const unsigned char devId, char *serialNumber, unsigned char *maxLen);
-_deviceGetPCBSerialNumberStr = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte))(('deviceGetPCBSerialNumberStr', NKTPDLL))
+_deviceGetPCBSerialNumberStr = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte)), 'deviceGetPCBSerialNumberStr')
 def deviceGetPCBSerialNumberStr(portname, devId):
 	_readSize = c_ubyte(255)
 	_readStr = create_string_buffer(_readSize.value)
@@ -1232,7 +1502,7 @@ def deviceGetPCBSerialNumberStr(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceCreate(const char *portname, const unsigned char devId, const char waitReady);
 #typedef DeviceResultTypes (__cdecl *DeviceCreateFuncPtr)(const char *portname, const unsigned char devId, const char waitReady);
-_deviceCreate = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte)(('deviceCreate', NKTPDLL))
+_deviceCreate = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte), 'deviceCreate')
 def deviceCreate(portname, devId, waitReady):
 	return _deviceCreate(portname.encode('ascii'), devId, waitReady)
 
@@ -1246,7 +1516,7 @@ def deviceCreate(portname, devId, waitReady):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceExists(const char *portname, const unsigned char devId, unsigned char *exists);
 #typedef DeviceResultTypes (__cdecl *DeviceExistsFuncPtr)(const char *portname, const unsigned char devId, unsigned char *exists);
-_deviceExists = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte))(('deviceExists', NKTPDLL))
+_deviceExists = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte)), 'deviceExists')
 def deviceExists(portname, devId):
         _exists = c_ubyte(0)
         result = _deviceExists(portname.encode('ascii'), devId, _exists)
@@ -1259,7 +1529,7 @@ def deviceExists(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceRemove(const char *portname, const unsigned char devId);
 #typedef DeviceResultTypes (__cdecl *DeviceRemoveFuncPtr)(const char *portname, const unsigned char devId);
-_deviceRemove = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte)(('deviceRemove', NKTPDLL))
+_deviceRemove = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte), 'deviceRemove')
 def deviceRemove(portname, devId):
 	return _deviceRemove(portname.encode('ascii'), devId)
 
@@ -1269,7 +1539,7 @@ def deviceRemove(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceRemoveAll(const char *portname);
 #typedef DeviceResultTypes (__cdecl *DeviceRemoveAllFuncPtr)(const char *portname);
-_deviceRemoveAll = CFUNCTYPE(c_ubyte, c_char_p)(('deviceRemoveAll', NKTPDLL))
+_deviceRemoveAll = _lazy(CFUNCTYPE(c_ubyte, c_char_p), 'deviceRemoveAll')
 def deviceRemoveAll(portname):
 	return _deviceRemoveAll(portname.encode('ascii'))
 
@@ -1284,7 +1554,7 @@ def deviceRemoveAll(portname):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetAllTypes(const char *portname, unsigned char *types, unsigned char *maxTypes);
 #typedef DeviceResultTypes (__cdecl *DeviceGetAllTypesFuncPtr)(const char *portname, unsigned char *types, unsigned char *maxTypes);
-_deviceGetAllTypes = CFUNCTYPE(c_ubyte, c_char_p, POINTER(c_char), POINTER(c_ubyte))(('deviceGetAllTypes', NKTPDLL))
+_deviceGetAllTypes = _lazy(CFUNCTYPE(c_ubyte, c_char_p, POINTER(c_char), POINTER(c_ubyte)), 'deviceGetAllTypes')
 def deviceGetAllTypes(portname):
 	_maxTypes = c_ubyte(255)
 	_types = create_string_buffer(_maxTypes.value)
@@ -1301,7 +1571,7 @@ def deviceGetAllTypes(portname):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetMode(const char *portname, const unsigned char devId, unsigned char *devMode);
 #typedef DeviceResultTypes (__cdecl *DeviceGetModeFuncPtr)(const char *portname, const unsigned char devId, unsigned char *devMode);
-_deviceGetMode = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte))(('deviceGetMode', NKTPDLL))
+_deviceGetMode = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte)), 'deviceGetMode')
 def deviceGetMode(portname, devId):
         _devMode = c_ubyte(0)
         result = _deviceGetMode(portname.encode('ascii'), devId, _devMode)
@@ -1318,7 +1588,7 @@ def deviceGetMode(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceGetLive(const char *portname, const unsigned char devId, unsigned char *liveMode);
 #typedef DeviceResultTypes (__cdecl *DeviceGetLiveFuncPtr)(const char *portname, const unsigned char devId, unsigned char *liveMode);
-_deviceGetLive = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte))(('deviceGetLive', NKTPDLL))
+_deviceGetLive = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_ubyte)), 'deviceGetLive')
 def deviceGetLive(portname, devId):
         _liveMode = c_ubyte(0)
         result = _deviceGetLive(portname.encode('ascii'), devId, _liveMode)
@@ -1335,7 +1605,7 @@ def deviceGetLive(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT DeviceResultTypes deviceSetLive(const char *portname, const unsigned char devId, const unsigned char liveMode);
 #typedef DeviceResultTypes (__cdecl *DeviceSetLiveFuncPtr)(const char *portname, const unsigned char devId, const unsigned char liveMode);
-_deviceSetLive = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte)(('deviceSetLive', NKTPDLL))
+_deviceSetLive = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte), 'deviceSetLive')
 def deviceSetLive(portname, devId, liveMode):
         return _deviceSetLive(portname.encode('ascii'), devId, liveMode)
 
@@ -1355,7 +1625,7 @@ def deviceSetLive(portname, devId, liveMode):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerCreate(const char *portname, const unsigned char devId, const unsigned char regId, const RegisterPriorityTypes priority, const RegisterDataTypes dataType);
 #typedef RegisterResultTypes (__cdecl *RegisterCreateFuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, const RegisterPriorityTypes priority, const RegisterDataTypes dataType);
-_registerCreate = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ubyte, c_ubyte)(('registerCreate', NKTPDLL))
+_registerCreate = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, c_ubyte, c_ubyte), 'registerCreate')
 def registerCreate(portname, devId, regId, priority, dataType):
         return _registerCreate(portname.encode('ascii'), devId, regId, priority, dataType)
 
@@ -1370,7 +1640,7 @@ def registerCreate(portname, devId, regId, priority, dataType):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerExists(const char *portname, const unsigned char devId, const unsigned char regId, unsigned char *exists);
 #typedef RegisterResultTypes (__cdecl *RegisterExistsFuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId, unsigned char *exists);
-_registerExists = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ubyte))(('registerExists', NKTPDLL))
+_registerExists = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte, POINTER(c_ubyte)), 'registerExists')
 def registerExists(portname, devId, regId):
         _exists = c_ubyte(0)
         result = _registerExists(portname.encode('ascii'), devId, regId, _exists)
@@ -1384,7 +1654,7 @@ def registerExists(portname, devId, regId):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerRemove(const char *portname, const unsigned char devId, const unsigned char regId);
 #typedef RegisterResultTypes (__cdecl *RegisterRemoveFuncPtr)(const char *portname, const unsigned char devId, const unsigned char regId);
-_registerRemove = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte)(('registerRemove', NKTPDLL))
+_registerRemove = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, c_ubyte), 'registerRemove')
 def registerRemove(portname, devId, regId):
         return _registerRemove(portname.encode('ascii'), devId, regId)
 
@@ -1395,7 +1665,7 @@ def registerRemove(portname, devId, regId):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerRemoveAll(const char *portname, const unsigned char devId);
 #typedef RegisterResultTypes (__cdecl *RegisterRemoveAllFuncPtr)(const char *portname, const unsigned char devId);
-_registerRemoveAll = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte)(('registerRemoveAll', NKTPDLL))
+_registerRemoveAll = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte), 'registerRemoveAll')
 def registerRemoveAll(portname, devId):
         return _registerRemoveAll(portname.encode('ascii'), devId)
 
@@ -1409,7 +1679,7 @@ def registerRemoveAll(portname, devId):
 #
 #extern "C" NKTPDLL_EXPORT RegisterResultTypes registerGetAll(const char *portname, const unsigned char devId, unsigned char *regs, unsigned char *maxRegs);
 #typedef RegisterResultTypes (__cdecl *RegisterGetAllFuncPtr)(const char *portname, const unsigned char devId, unsigned char *regs, unsigned char *maxRegs);
-_registerGetAll = CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte))(('registerGetAll', NKTPDLL))
+_registerGetAll = _lazy(CFUNCTYPE(c_ubyte, c_char_p, c_ubyte, POINTER(c_char), POINTER(c_ubyte)), 'registerGetAll')
 def registerGetAll(portname, devId):
 	_maxRegs = c_ubyte(255)
 	_regs = create_string_buffer(_maxTypes.value)
@@ -1444,7 +1714,7 @@ portStatusCallbackFuncPtr = CFUNCTYPE(None, c_char_p, c_ubyte, c_ubyte, c_ubyte,
 #
 #extern "C" NKTPDLL_EXPORT void setCallbackPtrPortInfo(PortStatusCallbackFuncPtr callback);
 #typedef void (__cdecl *SetCallbackPtrPortInfoFuncPtr)(PortStatusCallbackFuncPtr callback);
-_setCallbackPtrPortInfo = CFUNCTYPE(None, c_void_p)(('setCallbackPtrPortInfo', NKTPDLL))
+_setCallbackPtrPortInfo = _lazy(CFUNCTYPE(None, c_void_p), 'setCallbackPtrPortInfo')
 def setCallbackPtrPortInfo(PortStatusCallback):
 	_setCallbackPtrPortInfo(PortStatusCallback)
 
@@ -1468,7 +1738,7 @@ deviceStatusCallbackFuncPtr = CFUNCTYPE(None, c_char_p, c_ubyte, c_ubyte, c_ubyt
 #
 #extern "C" NKTPDLL_EXPORT void setCallbackPtrDeviceInfo(DeviceStatusCallbackFuncPtr callback);
 #typedef void (__cdecl *SetCallbackPtrDeviceInfoFuncPtr)(DeviceStatusCallbackFuncPtr callback);
-_setCallbackPtrDeviceInfo = CFUNCTYPE(None, c_void_p)(('setCallbackPtrDeviceInfo', NKTPDLL))
+_setCallbackPtrDeviceInfo = _lazy(CFUNCTYPE(None, c_void_p), 'setCallbackPtrDeviceInfo')
 def setCallbackPtrDeviceInfo(DeviceStatusCallback):
 	_setCallbackPtrDeviceInfo(DeviceStatusCallback)
 
@@ -1496,11 +1766,17 @@ registerStatusCallbackFuncPtr = CFUNCTYPE(None, c_char_p, c_ubyte, c_ubyte, c_ub
 #
 #extern "C" NKTPDLL_EXPORT void setCallbackPtrRegisterInfo(RegisterStatusCallbackFuncPtr callback);
 #typedef void (__cdecl *SetCallbackPtrRegisterInfoFuncPtr)(RegisterStatusCallbackFuncPtr callback);
-_setCallbackPtrRegisterInfo = CFUNCTYPE(None, c_void_p)(('setCallbackPtrRegisterInfo', NKTPDLL))
+_setCallbackPtrRegisterInfo = _lazy(CFUNCTYPE(None, c_void_p), 'setCallbackPtrRegisterInfo')
 def setCallbackPtrRegisterInfo(RegisterStatusCallback):
 	_setCallbackPtrRegisterInfo(RegisterStatusCallback)
 
 
+# Snapshot of the DLL backed public functions, used by setBackend() to restore them.
+_native = dict((name, func) for name, func in globals().items()
+               if type(func) is type(setBackend) and func.__module__ == __name__
+               and name[:1].islower()
+               and name not in ('loadLibrary', 'setBackend', 'getBackend', 'addLayer', 'removeLayer'))
+
 	
 #print("ports = getAllPorts()")
 #ports = getAllPorts()
@@ -0,0 +1,310 @@
+"""
+Background writing of DAQ repetitions while the read loop keeps running.
+
+An AcquisitionPipeline owns a few preallocated buffers of block_rows
+repetitions each. The read loop fills the rows of the current buffer; a full
+buffer is handed to a bounded queue and a writer thread passes it to the
+sink (e.g. CaptureStore.extend or DatasetWriter.write), then returns it to
+the free buffers. With two buffers the DAQ loop fills one while the other is
+written.
+
+If the writer falls behind, all buffers are full and the read loop waits for
+a free one (back-pressure): no repetition is dropped, and the wait is counted
+in the stalls. With a timeout a stall longer than timeout raises
+TimeoutError instead. An error of the sink stops writing and is raised in
+the read loop at its next buffer change or on close(), also when the with
+block is left by another exception (chained to it).
+
+Usage:
+    import acquisition_pipeline
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+    reader = AnalogMultiChannelReader(ai_task.in_stream)
+    with acquisition_pipeline.AcquisitionPipeline(
+            store.extend, (1, num_samples)) as pipeline:
+        for i in range(num_repetitions):
+            pipeline.read(reader.read_many_sample, num_samples)
+    pipeline.report()           # queue depth, writer lag and stalls
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class AcquisitionPipeline:
+    """
+    Double-buffered hand-off of repetitions to a writer thread.
+
+    Parameters
+    ----------
+    sink : callable
+        Called on the writer thread with an array of shape
+        (rows, ) + row_shape for every filled buffer, in order.
+    row_shape : tuple of int
+        Shape of one repetition, e.g. (channels, samples).
+    dtype : str or numpy.dtype
+        Type of the buffers.
+    block_rows : int
+        Repetitions per buffer, i.e. per call of sink.
+    buffers : int
+        Number of buffers; 2 for double buffering.
+    timeout : float, optional
+        Longest wait in seconds for a free buffer before TimeoutError is
+        raised; None waits as long as the writer needs.
+
+    Attributes
+    ----------
+    rows : int
+        Repetitions committed by the read loop.
+    written : int
+        Repetitions the sink wrote without an error.
+    """
+
+    def __init__(self, sink, row_shape, dtype='f8', block_rows=16, buffers=2,
+                 timeout=None):
+        if buffers < 1 or block_rows < 1:
+            raise ValueError('buffers and block_rows must be at least 1')
+        self.sink = sink
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self.block_rows = block_rows
+        self.timeout = timeout
+        self._free = queue.Queue()
+        for _ in range(buffers):
+            self._free.put(np.empty((block_rows,) + self.row_shape, self.dtype))
+        self._filled = queue.Queue(maxsize=buffers)
+        self._current = None
+        self._row = 0
+        self.rows = 0
+        self.written = 0
+        self._blocks = 0
+        self._max_depth = 0
+        self._lag_total = 0.
+        self._lag_max = 0.
+        self._write_total = 0.
+        self._write_max = 0.
+        self._stalls = 0
+        self._stall_time = 0.
+        self._error = None
+        self._thread = None
+
+    def start(self):
+        """Start the writer thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='acquisition-writer')
+        self._thread.start()
+
+    def _run(self):
+        clock = time.perf_counter
+        while True:
+            item = self._filled.get()
+            if item is None:
+                return
+            buffer, rows, submitted = item
+            if self._error is None:
+                started = clock()
+                try:
+                    self.sink(buffer[:rows])
+                except Exception as error:
+                    self._error = error
+                else:
+                    # Only rows the sink accepted count as written
+                    finished = clock()
+                    self.written += rows
+                    self._blocks += 1
+                    self._lag_total += finished - submitted
+                    self._lag_max = max(self._lag_max, finished - submitted)
+                    self._write_total += finished - started
+                    self._write_max = max(self._write_max, finished - started)
+            self._free.put(buffer)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Writing the acquired data failed: %s'
+                               % error) from error
+
+    def _take_buffer(self):
+        """Return a free buffer, waiting for the writer if there is none."""
+        self._raise_error()
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        self._stalls += 1
+        started = time.perf_counter()
+        try:
+            buffer = self._free.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError('The writer did not free a buffer within %g s '
+                               '(%d repetitions not written)'
+                               % (self.timeout, self.rows - self.written))
+        finally:
+            self._stall_time += time.perf_counter() - started
+        self._raise_error()
+        return buffer
+
+    def _submit(self):
+        if self._current is None or not self._row:
+            return
+        if self._thread is None:
+            self.start()
+        self._filled.put((self._current, self._row, time.perf_counter()))
+        self._max_depth = max(self._max_depth, self._filled.qsize())
+        self._current = None
+        self._row = 0
+
+    def next_row(self):
+        """
+        Return the buffer row of the next repetition, to be filled in place.
+
+        The row only counts once commit() is called, so a failed read can
+        simply be retried into the same row.
+        """
+        if self._current is None:
+            self._current = self._take_buffer()
+        return self._current[self._row]
+
+    def commit(self):
+        """Count the row returned by next_row(); hand off a full buffer."""
+        self._row += 1
+        self.rows += 1
+        if self._row == self.block_rows:
+            self._submit()
+
+    def put(self, repetition):
+        """Copy one repetition into the next row and commit it."""
+        self.next_row()[...] = repetition
+        self.commit()
+
+    def read(self, read_many, samples, timeout=10.0):
+        """
+        Read one repetition straight into the next row and commit it.
+
+        Parameters
+        ----------
+        read_many : callable
+            A nidaqmx stream reader method taking (data,
+            number_of_samples_per_channel, timeout), e.g.
+            AnalogMultiChannelReader(ai_task.in_stream).read_many_sample.
+            It fills the row, a C-contiguous (channels, samples) view of
+            the buffer, without allocating an array per repetition.
+        samples : int
+            Samples per channel.
+        timeout : float
+            Seconds to wait for the trigger and samples.
+
+        Returns
+        -------
+        int
+            Samples per channel read. If read_many raises (e.g. a trigger
+            timeout), the row is not committed and is reused by the next
+            read.
+        """
+        count = read_many(self.next_row(), number_of_samples_per_channel=samples,
+                          timeout=timeout)
+        self.commit()
+        return count
+
+    def flush(self):
+        """Hand off the rows of a partly filled buffer."""
+        self._submit()
+
+    def close(self):
+        """Write the remaining rows, stop the writer and raise its error."""
+        self.flush()
+        if self._thread is not None:
+            self._filled.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        try:
+            self.close()
+        except Exception as error:
+            # Both failed: raise the writer error, chained to the original
+            raise error from exc_value
+
+    def metrics(self):
+        """
+        Return the state of the pipeline.
+
+        Returns
+        -------
+        dict
+            'rows' committed and 'written' repetitions, 'pending' (rows not
+            written yet), 'queue_depth' and 'max_queue_depth' (filled
+            buffers waiting for the writer), 'lag_mean' and 'lag_max' (s from
+            hand-off until a buffer was written), 'write_mean' and
+            'write_max' (s in the sink per buffer), and 'stalls' and
+            'stall_time' (waits of the read loop for a free buffer).
+        """
+        blocks = self._blocks
+        return {
+            'rows': self.rows,
+            'written': self.written,
+            'pending': self.rows - self.written,
+            'queue_depth': self._filled.qsize(),
+            'max_queue_depth': self._max_depth,
+            'lag_mean': self._lag_total / blocks if blocks else None,
+            'lag_max': self._lag_max if blocks else None,
+            'write_mean': self._write_total / blocks if blocks else None,
+            'write_max': self._write_max if blocks else None,
+            'stalls': self._stalls,
+            'stall_time': self._stall_time,
+        }
+
+    def report(self):
+        """Print the metrics."""
+        metrics = self.metrics()
+        print('Pipeline: %d repetitions, %d written, max queue depth %d'
+              % (metrics['rows'], metrics['written'],
+                 metrics['max_queue_depth']))
+        if metrics['lag_mean'] is not None:
+            print('Writer lag: mean %.1f ms, max %.1f ms; write: mean %.1f ms,'
+                  ' max %.1f ms' % (metrics['lag_mean'] * 1e3,
+                                    metrics['lag_max'] * 1e3,
+                                    metrics['write_mean'] * 1e3,
+                                    metrics['write_max'] * 1e3))
+        if metrics['stalls']:
+            print('Read loop waited %d times for the writer, %.3f s in total'
+                  % (metrics['stalls'], metrics['stall_time']))
+
+
+if __name__ == "__main__":
+    # A simulated trigger loop with a fast and a too slow writer
+    def acquire(pipeline, repetitions, period):
+        start = time.perf_counter()
+        for index in range(repetitions):
+            delay = start + index * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            row = pipeline.next_row()
+            row[...] = index        # stands in for the DAQ read
+            pipeline.commit()
+        return time.perf_counter() - start
+
+    for label, write_time in (('fast writer', 0.01), ('slow writer', 0.3)):
+        received = []
+
+        def sink(rows):
+            time.sleep(write_time)
+            received.append(rows[:, 0, 0].copy())
+
+        with AcquisitionPipeline(sink, (2, 6000), block_rows=16) as pipeline:
+            duration = acquire(pipeline, 200, 0.005)
+        order = np.concatenate(received)
+        print('%s: 200 triggers in %.3f s, all written in order: %s'
+              % (label, duration, np.array_equal(order, np.arange(200))))
+        pipeline.report()
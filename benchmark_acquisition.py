@@ -0,0 +1,165 @@
+"""
+Benchmark of the per-repetition cost of the triggered acquisition loop and
+the highest trigger rate it sustains.
+
+Host mode (default, no hardware): the driver read (DAQmxReadAnalogF64
+filling an array) is replaced by a copy from a fixed source array, so the
+timings contain only the Python and NumPy work of the loop. "before" is the
+list path of task.read (a new array per read converted to nested lists of
+floats, copied into the pipeline buffer); "after" reads in place with
+AcquisitionPipeline.read into the preallocated buffer. The trigger rate
+bound is 1 / time per repetition, i.e. the rate at which the loop itself
+becomes the limit.
+
+Device mode (--device Dev1, also works with an NI MAX simulated device):
+a second counter generates triggers at increasing rates; a rate is
+sustained if all repetitions are read without a timeout and the backlog in
+the DAQ buffer at the end is below one repetition.
+
+Usage:
+    python benchmark_acquisition.py [--channels 2] [--samples 6000]
+    python benchmark_acquisition.py --device Dev1 --sampling-rate 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+import acquisition_pipeline
+
+
+class HostReader:
+    """Stands in for a nidaqmx reader; a read copies a fixed source array."""
+
+    def __init__(self, channels, samples):
+        self.source = np.random.default_rng(0).normal(size=(channels, samples))
+
+    def read(self, number_of_samples_per_channel, timeout=10.0):
+        """Like task.read: a new array returned as nested lists."""
+        data = np.empty_like(self.source)
+        np.copyto(data, self.source)
+        return data.tolist()
+
+    def read_many_sample(self, data, number_of_samples_per_channel,
+                         timeout=10.0):
+        """Like AnalogMultiChannelReader.read_many_sample: fills data."""
+        np.copyto(data, self.source)
+        return number_of_samples_per_channel
+
+
+def run_host(reader, samples, repetitions, in_place):
+    """Time per repetition (s) and peak bytes allocated by one repetition."""
+    shape = reader.source.shape
+    with acquisition_pipeline.AcquisitionPipeline(lambda rows: None,
+                                                  shape) as pipeline:
+        # Warm up, then measure allocations and time separately
+        for _ in range(32):
+            pipeline.read(reader.read_many_sample, samples)
+        tracemalloc.start()
+        allocated = 0
+        for _ in range(32):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            if in_place:
+                pipeline.read(reader.read_many_sample, samples)
+            else:
+                pipeline.put(reader.read(samples))
+            allocated = max(allocated,
+                            tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            if in_place:
+                pipeline.read(reader.read_many_sample, samples)
+            else:
+                pipeline.put(reader.read(samples))
+        elapsed = (time.perf_counter() - start) / repetitions
+    return elapsed, allocated
+
+
+def run_device(device, channels, samples, sampling_rate, rate, repetitions):
+    """Return (sustained, time per repetition in s) at a trigger rate in Hz."""
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType, Edge
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+
+    with nidaqmx.Task() as ai_task, nidaqmx.Task() as co_task, \
+            nidaqmx.Task() as trigger_task:
+        for channel in range(channels):
+            ai_task.ai_channels.add_ai_voltage_chan(f"{device}/ai{channel}")
+        ai_task.timing.cfg_samp_clk_timing(
+            rate=sampling_rate, source=f"/{device}/Ctr0InternalOutput",
+            active_edge=Edge.RISING, sample_mode=AcquisitionType.CONTINUOUS,
+            samps_per_chan=samples * repetitions)
+        co_task.co_channels.add_co_pulse_chan_freq(
+            f"{device}/ctr0", freq=sampling_rate, duty_cycle=0.5)
+        co_task.timing.cfg_implicit_timing(
+            sample_mode=AcquisitionType.FINITE, samps_per_chan=samples)
+        co_task.triggers.start_trigger.cfg_dig_edge_start_trig(
+            f"/{device}/Ctr1InternalOutput", trigger_edge=Edge.FALLING)
+        co_task.triggers.start_trigger.retriggerable = True
+        trigger_task.co_channels.add_co_pulse_chan_freq(
+            f"{device}/ctr1", freq=rate, duty_cycle=0.5)
+        trigger_task.timing.cfg_implicit_timing(
+            sample_mode=AcquisitionType.FINITE, samps_per_chan=repetitions)
+
+        reader = AnalogMultiChannelReader(ai_task.in_stream)
+        with acquisition_pipeline.AcquisitionPipeline(
+                lambda rows: None, (channels, samples)) as pipeline:
+            ai_task.start()
+            co_task.start()
+            trigger_task.start()
+            start = time.perf_counter()
+            try:
+                for _ in range(repetitions):
+                    pipeline.read(reader.read_many_sample, samples,
+                                  timeout=10 / rate + 1)
+            except nidaqmx.errors.DaqError as error:
+                print(f"  {rate:g} Hz: read failed: {error}")
+                return False, None
+            backlog = ai_task.in_stream.avail_samp_per_chan
+            elapsed = time.perf_counter() - start
+        return backlog < samples, elapsed / repetitions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--samples', type=int, default=6000)
+    parser.add_argument('--repetitions', type=int, default=500)
+    parser.add_argument('--device', help='DAQ device, e.g. Dev1')
+    parser.add_argument('--sampling-rate', type=float, default=100000.0)
+    args = parser.parse_args()
+
+    if args.device is None:
+        reader = HostReader(args.channels, args.samples)
+        print('%d channels x %d samples per repetition'
+              % (args.channels, args.samples))
+        print('%-8s %14s %16s %18s' % ('path', 'us/repetition',
+                                        'peak alloc (B)', 'max trigger (Hz)'))
+        for label, in_place in (('before', False), ('after', True)):
+            elapsed, allocated = run_host(reader, args.samples,
+                                          args.repetitions, in_place)
+            print('%-8s %14.1f %16.0f %18.0f' % (label, elapsed * 1e6,
+                                                 allocated, 1 / elapsed))
+    else:
+        # The acquisition itself bounds the rate to sampling_rate / samples
+        limit = args.sampling_rate / args.samples
+        print(f"Acquisition bound: {limit:.1f} Hz")
+        rate, best = limit / 8, None
+        while rate < limit:
+            sustained, per_repetition = run_device(
+                args.device, args.channels, args.samples, args.sampling_rate,
+                rate, args.repetitions)
+            if not sustained:
+                print(f"  {rate:.2f} Hz: not sustained")
+                break
+            print(f"  {rate:.2f} Hz: sustained, "
+                  f"{per_repetition * 1e3:.2f} ms per repetition")
+            best = rate
+            rate *= 1.25
+        if best is None:
+            print("No trigger rate was sustained")
+        else:
+            print(f"Highest sustained trigger rate: {best:.2f} Hz")
@@ -0,0 +1,100 @@
+"""
+Micro-benchmark of the per-call Python overhead of the NKTP_DLL register
+wrappers.
+
+The DLL exports are bound to a C stub with the same prototype (getpid from
+the C runtime, which ignores its arguments), so the timings contain only the
+ctypes marshalling and the Python work done in the wrappers, not the bus.
+"before" are copies of the original wrappers that allocate new ctypes objects
+and encode the portname on every call; "after" are the current NKTP_DLL
+wrappers with per-thread buffers and cached portnames.
+"""
+import ctypes
+import sys
+import timeit
+from ctypes import *
+
+import NKTP_DLL as nktp
+
+if sys.platform == 'win32':
+    stub_library = ctypes.cdll.msvcrt
+    stub_name = '_getpid'
+else:
+    stub_library = ctypes.CDLL(None)
+    stub_name = 'getpid'
+
+
+def stub(*argtypes):
+    """Bind the C stub with a register function prototype."""
+    return CFUNCTYPE(c_ubyte, *argtypes)((stub_name, stub_library))
+
+
+_registerRead = stub(c_char_p, c_ubyte, c_ubyte, POINTER(c_char),
+                     POINTER(c_ubyte), c_short)
+_registerReadU8 = stub(c_char_p, c_ubyte, c_ubyte, POINTER(c_ubyte), c_short)
+_registerReadU16 = stub(c_char_p, c_ubyte, c_ubyte, POINTER(c_ushort), c_short)
+_registerReadU32 = stub(c_char_p, c_ubyte, c_ubyte, POINTER(c_ulong), c_short)
+_registerWriteU16 = stub(c_char_p, c_ubyte, c_ubyte, c_ushort, c_short)
+
+
+# Original wrappers, as they were before the hot path rework
+def legacy_registerRead(portname, devId, regId, index):
+    _readSize = c_ubyte(255)
+    _readData = create_string_buffer(_readSize.value)
+    result = _registerRead(portname.encode('ascii'), devId, regId, _readData, _readSize, index)
+    if result != 0: _readSize = c_ubyte(0)
+    return result, _readData.raw[:_readSize.value]
+
+
+def legacy_registerReadU8(portname, devId, regId, index):
+    _readValue = c_ubyte(0)
+    result = _registerReadU8(portname.encode('ascii'), devId, regId, _readValue, index)
+    return result, _readValue.value
+
+
+def legacy_registerReadU16(portname, devId, regId, index):
+    _readValue = c_ushort(0)
+    result = _registerReadU16(portname.encode('ascii'), devId, regId, _readValue, index)
+    return result, _readValue.value
+
+
+def legacy_registerReadU32(portname, devId, regId, index):
+    _readValue = c_ulong(0)
+    result = _registerReadU32(portname.encode('ascii'), devId, regId, _readValue, index)
+    return result, _readValue.value
+
+
+def legacy_registerWriteU16(portname, devId, regId, value, index):
+    return _registerWriteU16(portname.encode('ascii'), devId, regId, value, index)
+
+
+def time_call(func, args, number):
+    """Best of 5 runs, in ns per call."""
+    runs = timeit.repeat(lambda: func(*args), number=number, repeat=5)
+    return min(runs) / number * 1e9
+
+
+if __name__ == "__main__":
+    number = 200000
+    # Point the NKTP_DLL wrappers at the same stubs
+    nktp._registerRead = _registerRead
+    nktp._registerReadU8 = _registerReadU8
+    nktp._registerReadU16 = _registerReadU16
+    nktp._registerReadU32 = _registerReadU32
+    nktp._registerWriteU16 = _registerWriteU16
+
+    cases = [
+        ('registerRead', (0x32, -1)),
+        ('registerReadU8', (0x30, -1)),
+        ('registerReadU16', (0x37, -1)),
+        ('registerReadU32', (0x90, -1)),
+        ('registerWriteU16', (0x37, 1000, -1)),
+    ]
+    print('%-18s %12s %12s %8s' % ('function', 'before (ns)', 'after (ns)',
+                                   'saved'))
+    for name, args in cases:
+        args = ('COM5', 15) + args
+        before = time_call(globals()['legacy_' + name], args, number)
+        after = time_call(getattr(nktp, name), args, number)
+        print('%-18s %12.0f %12.0f %7.0f%%' % (name, before, after,
+                                               100 * (before - after) / before))
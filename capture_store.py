@@ -0,0 +1,187 @@
+"""
+Streaming on-disk store for repeated DAQ captures.
+
+A CaptureStore preallocates <path>.npy, a NumPy array of shape
+(repetitions, channels, samples), and maps it into memory. Every repetition
+is written in place as soon as it is read, so a run never holds the whole
+dataset in memory and a crash loses at most the repetitions not yet flushed.
+<path>.json records the progress (number of completed repetitions) and the
+acquisition metadata; both files are valid and readable at any time, also
+after a partial run.
+
+Usage:
+    import capture_store
+    with capture_store.CaptureStore(path, num_repetitions, 1, num_samples,
+                                    metadata={'sampling_rate': 100e3}) as store:
+        for i in range(num_repetitions):
+            store.append(ai_task.read(number_of_samples_per_channel=num_samples))
+    data, header = capture_store.load(path)     # completed repetitions only
+
+For raw int16 captures pass dtype='i2' and the channel scaling in the
+metadata (daq_scaling.metadata_key); load() then returns volts lazily.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+import daq_scaling
+
+
+class CaptureStore:
+    """
+    Preallocated memory-mapped array written one repetition at a time.
+
+    Parameters
+    ----------
+    path : str
+        File name without extension; <path>.npy and <path>.json are created.
+    repetitions : int
+        Maximum number of repetitions.
+    channels : int
+        Number of analog input channels.
+    samples : int
+        Samples per channel and repetition.
+    dtype : str or numpy.dtype
+        Type of the stored samples.
+    metadata : dict, optional
+        JSON-serializable acquisition settings saved in the header.
+    flush_interval : float
+        Seconds between flushes of the data and header to disk.
+    """
+
+    def __init__(self, path, repetitions, channels, samples, dtype='f8',
+                 metadata=None, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._data = np.lib.format.open_memmap(
+            path + '.npy', mode='w+', dtype=dtype,
+            shape=(repetitions, channels, samples))
+        self.completed = 0
+        """Number of repetitions written."""
+        self._header = {
+            'shape': list(self._data.shape),
+            'dtype': self._data.dtype.str,
+            'completed': 0,
+            'finished': False,
+            'started': time.time(),
+            'updated': None,
+            'metadata': dict(metadata or {}),
+        }
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self.flush()
+
+    @property
+    def shape(self):
+        """`tuple`: (repetitions, channels, samples) of the whole store."""
+        return self._data.shape
+
+    @property
+    def data(self):
+        """`numpy.ndarray`: View of the completed repetitions."""
+        return self._data[:self.completed]
+
+    def append(self, repetition):
+        """
+        Store the next repetition.
+
+        Parameters
+        ----------
+        repetition : array_like
+            Samples of shape (channels, samples), or (samples,) for one
+            channel, e.g. the return value of ai_task.read.
+
+        Raises
+        ------
+        IndexError
+            If the store is full.
+        """
+        self.extend([repetition])
+
+    def extend(self, repetitions):
+        """
+        Store several repetitions at once.
+
+        Parameters
+        ----------
+        repetitions : array_like
+            Samples of shape (n, channels, samples), e.g. a block handed
+            over by an acquisition_pipeline.AcquisitionPipeline.
+
+        Raises
+        ------
+        IndexError
+            If the repetitions do not fit into the store.
+        """
+        count = len(repetitions)
+        if self.completed + count > len(self._data):
+            raise IndexError('Capture store %s is full (%d repetitions)'
+                             % (self.path, len(self._data)))
+        self._data[self.completed:self.completed + count] = \
+            np.asarray(repetitions).reshape((count,) + self._data.shape[1:])
+        self.completed += count
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _write_header(self):
+        """Replace <path>.json atomically with the current header."""
+        self._header['completed'] = self.completed
+        self._header['updated'] = time.time()
+        temporary = self.path + '.json.tmp'
+        with open(temporary, 'w') as output:
+            json.dump(self._header, output, indent=1)
+        os.replace(temporary, self.path + '.json')
+
+    def flush(self):
+        """Write the repetitions to disk, then record them in the header."""
+        self._data.flush()
+        self._write_header()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """Flush and mark the capture as finished; data stays readable."""
+        if self._closed:
+            return
+        self._header['finished'] = True
+        self.flush()
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load(path, mmap=True, scaled=True):
+    """
+    Open a capture written by a CaptureStore.
+
+    Parameters
+    ----------
+    path : str
+        File name without extension, as given to the store.
+    mmap : bool
+        Map the file read-only instead of reading it into memory.
+    scaled : bool
+        For raw captures (int16 codes with scaling coefficients in the
+        metadata), return a daq_scaling.ScaledArray that converts the
+        accessed repetitions to volts.
+
+    Returns
+    -------
+    data : numpy.ndarray or daq_scaling.ScaledArray
+        Completed repetitions, shape (completed, channels, samples).
+    header : dict
+        The contents of <path>.json.
+    """
+    with open(path + '.json') as header_file:
+        header = json.load(header_file)
+    data = np.load(path + '.npy', mmap_mode='r' if mmap else None)
+    data = data[:header['completed']]
+    coefficients = header['metadata'].get(daq_scaling.metadata_key)
+    if scaled and coefficients is not None:
+        data = daq_scaling.ScaledArray(data, coefficients)
+    return data, header
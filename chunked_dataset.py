@@ -0,0 +1,328 @@
+"""
+Chunked binary dataset files for acquisition results.
+
+A dataset is a stack of equally shaped arrays (rows), e.g. one
+(channels, samples) array per repetition, stored as raw little-endian
+chunks of rows together with JSON attributes (sample name, wavelength,
+channels, sampling rate, num_samples, trigger channel, timestamps, ...).
+Chunks can be zlib compressed individually. Compared with np.savetxt the
+files are written at disk speed instead of formatting every value as text,
+and keep the full precision.
+
+File layout: the magic b'LSDSET01' followed by records, each a 16 byte
+header (kind, flags, payload length) and its payload:
+
+    b'ATTR'  JSON object; later records update earlier ones
+    b'DATA'  first row (u8), row count (u4), then the chunk bytes; flag 1
+             marks zlib compressed bytes
+
+Records are only appended, so a file cut short by a crash is still
+readable up to its last complete record.
+
+Usage:
+    import chunked_dataset
+    with chunked_dataset.create(path, 'f8', (2, num_samples),
+                                attrs={'sample_name': sample_name}) as output:
+        output.write(block)                     # (rows, 2, num_samples)
+    with chunked_dataset.open_dataset(path) as dataset:
+        dataset.attrs['sampling_rate']
+        first = dataset[0]                      # reads only one chunk
+"""
+import json
+import struct
+import time
+import zlib
+
+import numpy as np
+
+import daq_scaling
+
+magic = b'LSDSET01'
+extension = '.lsd'
+"""File name extension added by create() and open_dataset()."""
+
+_record = struct.Struct('<4sIQ')    # kind, flags, payload length
+_chunk = struct.Struct('<QI')       # first row, row count
+_COMPRESSED = 1
+
+
+def _filename(path):
+    return path if path.endswith(extension) else path + extension
+
+
+class DatasetWriter:
+    """
+    Appends chunks of rows to a dataset file; see create().
+
+    Attributes
+    ----------
+    rows : int
+        Number of rows written.
+    """
+
+    def __init__(self, path, dtype, row_shape, attrs=None, compression=None,
+                 level=1, chunk_rows=None):
+        if compression not in (None, 'zlib'):
+            raise ValueError("compression must be None or 'zlib'")
+        self.path = _filename(path)
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.row_shape = tuple(row_shape)
+        self.compression = compression
+        self.level = level
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._file = open(self.path, 'wb')
+        self._file.write(magic)
+        self.update_attrs(dict(attrs or {}), dtype=self.dtype.str,
+                          row_shape=list(self.row_shape),
+                          compression=compression, created=time.time())
+
+    def _append(self, kind, payload, flags=0, prefix=b''):
+        self._file.write(_record.pack(kind, flags, len(prefix) + len(payload)))
+        if prefix:
+            self._file.write(prefix)
+        self._file.write(payload)
+
+    def update_attrs(self, attrs=None, **more):
+        """Add or replace attributes (JSON-serializable values)."""
+        attrs = dict(attrs or {}, **more)
+        self._append(b'ATTR', json.dumps(attrs).encode('utf-8'))
+
+    def write(self, rows):
+        """
+        Append rows as one chunk, or several if chunk_rows is set.
+
+        Parameters
+        ----------
+        rows : array_like
+            Array of shape (n,) + row_shape, or row_shape for a single row.
+        """
+        rows = np.asarray(rows, self.dtype)
+        if rows.shape == self.row_shape:
+            rows = rows[np.newaxis]
+        if rows.shape[1:] != self.row_shape:
+            raise ValueError('Rows of shape %s do not match the dataset rows '
+                             '%s' % (rows.shape[1:], self.row_shape))
+        step = self.chunk_rows or len(rows) or 1
+        for start in range(0, len(rows), step):
+            self._write_chunk(rows[start:start + step])
+
+    def _write_chunk(self, rows):
+        data = memoryview(np.ascontiguousarray(rows)).cast('B')
+        flags = 0
+        if self.compression == 'zlib':
+            packed = zlib.compress(data, self.level)
+            if len(packed) < len(data):
+                data, flags = packed, _COMPRESSED
+        self._append(b'DATA', data, flags, _chunk.pack(self.rows, len(rows)))
+        self.rows += len(rows)
+
+    def flush(self):
+        """Flush the written records to the operating system."""
+        self._file.flush()
+
+    def close(self):
+        """Record the end time and close the file."""
+        if self._file.closed:
+            return
+        self.update_attrs(finished=time.time(), rows=self.rows)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def create(path, dtype, row_shape, attrs=None, compression=None, level=1,
+           chunk_rows=None):
+    """
+    Create a dataset file.
+
+    Parameters
+    ----------
+    path : str
+        File name; the extension '.lsd' is added if missing.
+    dtype : str or numpy.dtype
+        Type of the stored values.
+    row_shape : tuple of int
+        Shape of one row, e.g. (channels, num_samples).
+    attrs : dict, optional
+        Attributes, e.g. sample_name, wavelength, channels, sampling_rate,
+        num_samples, trigger_channel.
+    compression : None or 'zlib'
+        Compress every chunk (kept uncompressed if that is not smaller).
+    level : int
+        zlib compression level.
+    chunk_rows : int, optional
+        Split writes into chunks of at most this many rows.
+
+    Returns
+    -------
+    DatasetWriter
+    """
+    return DatasetWriter(path, dtype, row_shape, attrs, compression, level,
+                         chunk_rows)
+
+
+class Dataset:
+    """
+    Lazily read dataset file; see open_dataset().
+
+    Only the record headers are read when the file is opened; chunks are
+    read (and decompressed) when rows are accessed. Raw datasets with
+    scaling coefficients in their attributes (daq_scaling.metadata_key) are
+    converted to volts per chunk read unless scaled is False.
+
+    Attributes
+    ----------
+    attrs : dict
+        The merged attributes of the file.
+    dtype : numpy.dtype
+        Type of the returned rows (float64 if scaled).
+    shape : tuple
+        (rows,) + row shape.
+    scaled : bool
+        True if raw codes are returned as volts.
+    """
+
+    def __init__(self, path, scaled=True):
+        self.path = _filename(path)
+        self._file = open(self.path, 'rb')
+        if self._file.read(len(magic)) != magic:
+            self._file.close()
+            raise ValueError('%s is not a chunked dataset file' % self.path)
+        self.attrs = {}
+        self._chunks = []   # [(first row, rows, payload offset, length, flags)]
+        self._index()
+        self.dtype = np.dtype(self.attrs['dtype'])
+        self._coefficients = self.attrs.get(daq_scaling.metadata_key)
+        self.scaled = bool(scaled and self._coefficients is not None)
+        if self.scaled:
+            self._raw_dtype, self.dtype = self.dtype, np.dtype('f8')
+        else:
+            self._raw_dtype = self.dtype
+        self.row_shape = tuple(self.attrs['row_shape'])
+        rows = self._chunks[-1][0] + self._chunks[-1][1] if self._chunks else 0
+        self.shape = (rows,) + self.row_shape
+        self._starts = [chunk[0] for chunk in self._chunks]
+        self._cached = (None, None)     # (chunk index, array)
+
+    def _index(self):
+        """Read the record headers; stop at a truncated record."""
+        read = self._file.read
+        size = self._file.seek(0, 2)
+        position = self._file.seek(len(magic))
+        while position + _record.size <= size:
+            kind, flags, length = _record.unpack(read(_record.size))
+            position += _record.size
+            if position + length > size:
+                break
+            if kind == b'ATTR':
+                self.attrs.update(json.loads(read(length)))
+            elif kind == b'DATA':
+                first, rows = _chunk.unpack(read(_chunk.size))
+                self._chunks.append((first, rows, position + _chunk.size,
+                                     length - _chunk.size, flags))
+                self._file.seek(length - _chunk.size, 1)
+            else:
+                self._file.seek(length, 1)
+            position += length
+
+    def __len__(self):
+        return self.shape[0]
+
+    def chunk(self, index):
+        """Return the rows of chunk index as an array."""
+        if self._cached[0] == index:
+            return self._cached[1]
+        first, rows, offset, length, flags = self._chunks[index]
+        self._file.seek(offset)
+        data = self._file.read(length)
+        if flags & _COMPRESSED:
+            data = zlib.decompress(data)
+        array = np.frombuffer(data, self._raw_dtype).reshape((rows,)
+                                                             + self.row_shape)
+        if self.scaled:
+            array = daq_scaling.to_volts(array, self._coefficients)
+        self._cached = (index, array)
+        return array
+
+    def chunks(self):
+        """Iterate over the chunks, one array of rows each."""
+        for index in range(len(self._chunks)):
+            yield self.chunk(index)
+
+    def __getitem__(self, key):
+        """Rows by index or slice (step 1); further indices apply per row."""
+        rest = ()
+        if isinstance(key, tuple):
+            key, rest = key[0], key[1:]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise IndexError('Dataset slices must have step 1')
+            parts = []
+            row = start
+            while row < stop:
+                index = np.searchsorted(self._starts, row, 'right') - 1
+                first, rows = self._chunks[index][:2]
+                end = min(stop, first + rows)
+                parts.append(self.chunk(index)[row - first:end - first])
+                row = end
+            rows = np.concatenate(parts) if parts else \
+                np.empty((0,) + self.row_shape, self.dtype)
+            return rows[(slice(None),) + rest]
+        row = key + len(self) if key < 0 else key
+        if not 0 <= row < len(self):
+            raise IndexError('Row %d out of range for %d rows' % (key, len(self)))
+        index = np.searchsorted(self._starts, row, 'right') - 1
+        return self.chunk(index)[(row - self._chunks[index][0],) + rest]
+
+    def read(self):
+        """Return all rows as one array."""
+        return self[:]
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_dataset(path, scaled=True):
+    """
+    Open a dataset file for lazy reading.
+
+    Parameters
+    ----------
+    path : str
+        File name; the extension '.lsd' is added if missing.
+    scaled : bool
+        Return raw int16 codes with scaling coefficients as volts.
+
+    Returns
+    -------
+    Dataset
+    """
+    return Dataset(path, scaled)
+
+
+def save(path, array, attrs=None, compression=None, chunk_rows=64):
+    """
+    Write a whole array as a dataset; its first axis becomes the rows.
+
+    Returns
+    -------
+    str
+        The file name written.
+    """
+    array = np.asarray(array)
+    with create(path, array.dtype, array.shape[1:], attrs, compression,
+                chunk_rows=chunk_rows) as output:
+        output.write(array)
+    return output.path
@@ -0,0 +1,156 @@
+"""
+Deferred scaling of raw int16 ADC codes to volts.
+
+In raw mode the acquisition reads unscaled int16 codes with
+AnalogUnscaledReader.read_int16, a quarter of the size of float64 volts,
+and stores the device scaling polynomial of every channel in the metadata.
+The loaders (capture_store.load, chunked_dataset.open_dataset) convert
+only the part that is accessed, vectorized per channel:
+
+    volts = c[0] + c[1] * code + c[2] * code**2 + ...
+
+Usage:
+    import daq_scaling
+    coefficients = daq_scaling.scaling_coefficients(ai_task)
+    volts = daq_scaling.to_volts(codes, coefficients)    # (..., channels, samples)
+    lazy = daq_scaling.ScaledArray(codes, coefficients)  # scales on indexing
+"""
+import numpy as np
+
+metadata_key = 'scaling_coefficients'
+"""Metadata entry holding the coefficients, one list per channel."""
+
+
+def scaling_coefficients(ai_task):
+    """
+    Return the polynomial scaling coefficients of every channel of a task.
+
+    Parameters
+    ----------
+    ai_task : nidaqmx.Task
+        Task with analog input voltage channels.
+
+    Returns
+    -------
+    list of list of float
+        Coefficients per channel, lowest order first (ai_dev_scaling_coeff).
+    """
+    return [list(channel.ai_dev_scaling_coeff)
+            for channel in ai_task.ai_channels]
+
+
+def _terms(coefficients, dtype):
+    """Coefficient arrays of shape (channels, 1) per order, lowest first."""
+    coefficients = [list(channel) for channel in coefficients]
+    order = max(len(channel) for channel in coefficients)
+    table = np.zeros((order, len(coefficients), 1), dtype)
+    for index, channel in enumerate(coefficients):
+        table[:len(channel), index, 0] = channel
+    return table
+
+
+def _polynomial(codes, terms):
+    """Evaluate the polynomial with Horner's scheme; terms broadcast to codes."""
+    shape = np.broadcast_shapes(np.shape(codes), np.shape(terms[-1]))
+    result = np.array(np.broadcast_to(terms[-1], shape))
+    for term in terms[-2::-1]:
+        result *= codes
+        result += term
+    return result
+
+
+def to_volts(codes, coefficients, dtype='f8'):
+    """
+    Scale raw codes to volts.
+
+    Parameters
+    ----------
+    codes : array_like
+        Raw codes of shape (..., channels, samples).
+    coefficients : sequence of sequence of float
+        Scaling polynomial of every channel, see scaling_coefficients().
+    dtype : str or numpy.dtype
+        Type of the result.
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    return _polynomial(np.asarray(codes), _terms(coefficients, dtype))
+
+
+class ScaledArray:
+    """
+    Read-only view of raw codes that returns volts when indexed.
+
+    Only the selected elements are scaled, so indexing a few repetitions of
+    a memory-mapped capture reads and converts only those.
+
+    Parameters
+    ----------
+    codes : numpy.ndarray
+        Raw codes of shape (..., channels, samples), e.g. a memory map.
+    coefficients : sequence of sequence of float
+        Scaling polynomial of every channel.
+    dtype : str or numpy.dtype
+        Type of the scaled values.
+
+    Attributes
+    ----------
+    codes : numpy.ndarray
+        The raw codes.
+    """
+
+    def __init__(self, codes, coefficients, dtype='f8'):
+        self.codes = codes
+        self.coefficients = [list(channel) for channel in coefficients]
+        self.dtype = np.dtype(dtype)
+        self._terms = _terms(self.coefficients, self.dtype)
+        if self._terms.shape[1] != codes.shape[-2]:
+            raise ValueError('%d scaling polynomials for %d channels'
+                             % (self._terms.shape[1], codes.shape[-2]))
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def ndim(self):
+        return self.codes.ndim
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, key):
+        codes = self.codes[key]
+        # Index the per-channel terms like the codes, without copying them
+        terms = [np.broadcast_to(term, self.codes.shape)[key]
+                 for term in self._terms]
+        return _polynomial(codes, terms)
+
+    def __array__(self, dtype=None, copy=None):
+        volts = self[...]
+        return volts if dtype is None else volts.astype(dtype)
+
+    def __repr__(self):
+        return 'ScaledArray(shape=%s, codes=%s)' % (self.shape,
+                                                    self.codes.dtype)
+
+
+if __name__ == "__main__":
+    # Scaling a raw capture: memory of the codes and time of the conversion
+    import time
+
+    coefficients = [[-2.1e-4, 3.2e-4, 1.0e-12, -2.0e-17],
+                    [1.5e-4, 3.1e-4, -2.0e-12, 1.0e-17]]
+    codes = np.random.default_rng(0).integers(-32768, 32767, (600, 2, 6000),
+                                              dtype=np.int16)
+    start = time.perf_counter()
+    volts = to_volts(codes, coefficients)
+    elapsed = time.perf_counter() - start
+    lazy = ScaledArray(codes, coefficients)
+    print('codes %.1f MB, volts %.1f MB, scaled in %.3f s'
+          % (codes.nbytes / 1e6, volts.nbytes / 1e6, elapsed))
+    print('lazy row and channel slice match:',
+          np.array_equal(lazy[10], volts[10]),
+          np.array_equal(lazy[:, 1, ::100], volts[:, 1, ::100]))
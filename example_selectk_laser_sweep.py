@@ -3,6 +3,7 @@ Example code to sweep laser wavelengths using SuperK Select
 Damen Rajkumar
 """
 from nkt_device import *
+import nkt_sweep
 import time
 
 def main():
@@ -32,9 +33,13 @@ def main():
         rfdriver.set_RF_power(False)  # Turn off the RF driver
         aotf.set_switch_settings(1)  # Change to the appropriate crystal
     
-        # # Recheck the range after changing the crystal
-        # current_min_wave = rfdriver.get_min_wavelength()
-        # current_max_wave = rfdriver.get_max_wavelength()
+        # Recheck the range after changing the crystal
+        try:
+            rfdriver.wait_until_crystal_ready(min_wave, max_wave, timeout=5)
+        except TimeoutError as error:
+            print(error)
+        current_min_wave = rfdriver.get_min_wavelength
+        current_max_wave = rfdriver.get_max_wavelength
     
         if current_min_wave <= min_wave and max_wave <= current_max_wave:
             print(f"Select is ready for use.")
@@ -43,30 +48,26 @@ def main():
 
     print(current_min_wave)
     print(current_max_wave)
-    current_wave = min_wave # starting wavelength
-    rfdriver.set_amplitude_channel(1, 100) # sets channel 1 power to 100 percent
     rfdriver.set_RF_power(True) # set rf driver on
+    rfdriver.wait_until_rf_on()
 
     laser.set_power(100) # sets laser power to 50%
     print(f"Fianium laser set to {laser.power_level}%.")
     laser.set_emission(True) # set laser on
+    laser.wait_until_emission_stable()
 
-    # Set wavelength + amplitude to loop uyntil user cancels
+    def show_step(index, wave):
+        print(f"channel 1:{wave} ")
+        print(rfdriver.get_amplitude_channel(1))
+
+    # Precompute the sweep once (min_wave up to, not including, max_wave),
+    # then run it until the user cancels; no delay between steps
+    sweep = nkt_sweep.compile_sweep(rfdriver,
+                                    wavelengths=range(min_wave, max_wave, stepsize),
+                                    amplitude=100, dwell=0)
     while True:
-        # rfdriver.set_wavelength_channel(1, 1550)
-        # print(rfdriver.get_wavelength_channel(1))
-        # Run code normally
-        if current_wave < max_wave:
-            rfdriver.set_wavelength_channel(1, current_wave) # set to current wavelength
-            print(f"channel 1:{current_wave} ")
-            print(rfdriver.get_amplitude_channel(1))
-            # time.sleep(delay_time) # delay depending on time defined
-            current_wave += stepsize # increment by 50nm
-        else: 
-            current_wave = min_wave # start at the beginning
-            rfdriver.set_wavelength_channel(1, current_wave) # set to current wavelength
-            print(rfdriver.get_amplitude_channel(1))
-            # time.sleep(delay_time) # delay depending on time defined
+        stats = sweep.run(hooks=[show_step])
+        stats.report() # requested vs actual step times
 
         # Ask the user if they want to continue or stop
         user_input = input("Do you want to stop? (yes to stop, anything else to continue): ").strip().lower()
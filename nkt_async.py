@@ -0,0 +1,148 @@
+"""
+asyncio front end for the NKT device classes.
+
+The NKTP_DLL calls block, so every blocking call is run on a worker thread.
+Each port has its own single worker thread: calls to modules on the same port
+keep their order (as on the bus), while calls on different ports, and the
+caller's own coroutines (DAQ handling, saving, plotting), run concurrently.
+
+Usage:
+    import asyncio
+    import nkt_async, nkt_device
+
+    async def main():
+        laser = await nkt_async.create(nkt_device.Fianium)
+        rf = await nkt_async.create(nkt_device.RF_driver)
+        await rf.set_wavelength_channel(1, 700)
+        power, status = await asyncio.gather(laser.power_level,
+                                             laser.snapshot())
+
+    asyncio.run(main())
+"""
+import asyncio
+import concurrent.futures
+import functools
+import threading
+
+_workers = {}       # {portname: single-thread executor}
+_workers_lock = threading.Lock()
+
+
+def _worker(portname):
+    """Return the worker thread (executor) of portname."""
+    worker = _workers.get(portname)
+    if worker is None:
+        with _workers_lock:
+            worker = _workers.get(portname)
+            if worker is None:
+                worker = _workers[portname] = \
+                    concurrent.futures.ThreadPoolExecutor(
+                        1, thread_name_prefix='nkt-%s' % portname)
+    return worker
+
+
+def run(portname, func, *args, **kwargs):
+    """
+    Run a blocking call on the worker thread of portname.
+
+    Must be called from a running event loop.
+
+    Returns
+    -------
+    asyncio.Future
+        Resolves to the return value of func(*args, **kwargs).
+    """
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(_worker(portname),
+                                functools.partial(func, *args, **kwargs))
+
+
+def submit(portname, func, *args, **kwargs):
+    """
+    Run a blocking call on the worker thread of portname from any thread.
+
+    Returns
+    -------
+    concurrent.futures.Future
+        Resolves to the return value of func(*args, **kwargs).
+    """
+    return _worker(portname).submit(func, *args, **kwargs)
+
+
+def shutdown(wait=True):
+    """Stop all port workers; they are recreated on the next call."""
+    with _workers_lock:
+        workers = list(_workers.values())
+        _workers.clear()
+    for worker in workers:
+        worker.shutdown(wait)
+
+
+class AsyncDevice:
+    """
+    Awaitable view of a Fianium, Select or RF_driver object.
+
+    Methods of the device become coroutine functions and its properties
+    become awaitables, all executed on the worker thread of the device's
+    port::
+
+        await rf.set_wavelength_channel(1, 700)
+        temperature = await rf.get_crystal_temperature
+
+    portname, module_address and device_type are returned directly.
+
+    Parameters
+    ----------
+    device : nkt_device._NKTModule
+        The blocking device object.
+    """
+    _plain_attributes = ('portname', 'module_address', 'device_type')
+
+    def __init__(self, device):
+        self._device = device
+
+    device = property(lambda self: self._device)
+    """The blocking device object, e.g. for use from a worker thread."""
+
+    def __getattr__(self, name):
+        device = self._device
+        if name in self._plain_attributes:
+            return getattr(device, name)
+        attribute = getattr(type(device), name, None)
+        if isinstance(attribute, property):
+            return run(device.portname, attribute.fget, device)
+        value = getattr(device, name)
+        if not callable(value):
+            return value
+
+        @functools.wraps(value)
+        async def method(*args, **kwargs):
+            return await run(device.portname, value, *args, **kwargs)
+        return method
+
+    def __repr__(self):
+        return 'AsyncDevice(%r)' % (self._device,)
+
+
+async def create(device_class, *args, **kwargs):
+    """
+    Create a device object without blocking the event loop.
+
+    Discovery runs on the default executor; the result is wrapped in an
+    AsyncDevice.
+
+    Parameters
+    ----------
+    device_class : type
+        nkt_device.Fianium, Select or RF_driver.
+    *args, **kwargs
+        Passed on to device_class, e.g. portname.
+
+    Returns
+    -------
+    AsyncDevice
+    """
+    loop = asyncio.get_running_loop()
+    device = await loop.run_in_executor(
+        None, functools.partial(device_class, *args, **kwargs))
+    return AsyncDevice(device)
@@ -1,9 +1,583 @@
+import struct
+import time
+
 import NKTP_DLL as nktp
+import nkt_discovery
+import nkt_live
+import nkt_registers
+import nkt_session
+
+_fsk_values = struct.Struct('<4I')  # RF driver wavelength register, 4 x pm
+
+
+def _decode_emission(value):
+    """Fianium register 0x30: 3 = emission on, 0 = off."""
+    if value == 3:
+        return True
+    elif value == 0:
+        return False
+    return 'Unknown'
+
+
+def _decode_interlock(reading):
+    """Fianium register 0x32 (LSB, MSB) to (LSB, description)."""
+    LSB = reading[0]  # What manual calls first byte
+    MSB = reading[1]  # What manual calls second byte
+    if LSB == 0:
+        import nkt_status   # NumPy is only loaded when it is needed
+        reason = nkt_status.interlock_reason(MSB)
+        return (LSB, 'Interlocked: %s' % reason)
+
+    elif LSB == 1:
+        return (LSB, 'Waiting for interlock reset')
+
+    elif LSB == 2:
+        return (LSB, 'Interlock is OK')
+
+
+def _decode_rf_power(reading):
+    """RF driver register 0x30 to (bit, description)."""
+    if reading == 0:
+        return (reading, 'RF driver is off')
+
+    elif reading == 1:
+        return (reading, 'RF driver is on')
+
+
+def _decode_rf_switch(reading):
+    """Select register 0x34 to (bit, description)."""
+    if reading == 0:
+        return (reading, 'Normal operation')
+
+    elif reading == 1:
+        return (reading, 'Swapped Crystal Connections')
+
+
+class _NKTModule:
+    """
+    Functionality shared by the NKT module classes below.
+
+    Subclasses describe their registers once in _register_map, a tuple of
+    nkt_registers.Register entries (name, address, data type, scale, access,
+    decoder). The table drives read(), read_many(), write() and snapshot(),
+    and every register without a hand-written property gets a generated one
+    (e.g. RF_driver.wavelength_channel_1), writable for 'rw' registers.
+
+    Register access goes through _read_register/_write_register, which serve
+    reads from the live register cache while live mode is enabled and skip
+    writes of values a register is known to hold already. Registers the
+    module can change by itself (emission, RF power, ...) are listed in
+    _volatile_registers; writes to those are only skipped when a fresh live
+    value confirms them.
+    """
+    _register_map = ()
+    _live_max_age = None    # staleness bound in s while live mode is on
+    _module_name = None     # name used in messages, e.g. 'Fianium'
+    _module_type = None     # type reported by the module, e.g. 0x88
+    _session_port = None    # port held open through nkt_session
+    _volatile_registers = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._registers = {register.name: register
+                          for register in cls._register_map}
+        cls._layouts = {(): nkt_registers.Layout(cls._register_map)}
+        for register in cls._register_map:
+            if not hasattr(cls, register.name):
+                setattr(cls, register.name, _register_property(register))
+
+    def _find_module(self, portname=None):
+        """
+        Set portname and device_type of this module and open its port.
+
+        The port is looked up in the bus topology shared by all modules (see
+        nkt_discovery), so creating Fianium, Select and RF_driver objects
+        scans the bus at most once. The port then stays open (see
+        nkt_session) until close() is called or the interpreter exits.
+
+        Parameters
+        ----------
+        portname : str, optional
+            Port of the module, skips the lookup if given.
+
+        Raises
+        ------
+        RuntimeError
+            If the module is found on more than one port; see nkt_registry
+            for setups with several modules of a type.
+        """
+        if portname:  # Allow user to init specific NKT module on portname
+            self._portname = portname
+            self._device_type = self._module_type  # Could put check here
+            found = [portname]
+        else:
+            found = nkt_discovery.find(self.module_address, self._module_type)
+            if len(found) > 1:  # If module found on several ports, error
+                err_msg = ("""Multiple NKT %s modules found on computer.
+                COM ports = %s
+                Please initialize %s class with designated \
+                portname to avoid conflict, or use nkt_registry"""
+                           % (self._module_name, ', '.join(found),
+                              type(self).__name__))
+                raise RuntimeError(err_msg)
+            if found:
+                self._portname = found[0]
+                self._device_type = self._module_type
+
+        if found:
+            nkt_session.acquire(self.portname)
+            self._session_port = self.portname
+            print('NKT %s Found:' % self._module_name)
+            print('Comport: ', self.portname, 'Device type: ', "0x%0.2X"
+                  % self.device_type, 'at address:', self.module_address)
+        else:
+            print('No %s Found' % self._module_name)
+
+    def close(self):
+        """
+        Release the port of this module.
+
+        The port is closed once no other module or live monitor uses it.
+        Register access still works afterwards, through the slower dedicated
+        path of the DLL.
+        """
+        self.disable_live()
+        if self._session_port is not None:
+            portname, self._session_port = self._session_port, None
+            nkt_session.release(portname)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def enable_live(self, max_age=0.5, registers=None, priority=0):
+        """
+        Opt in to live mode: the DLL pushes register updates into memory.
+
+        The port is opened in live mode, the module's registers are created
+        for monitoring and their updates land in nkt_live.cache through the
+        register status callback. Properties such as power_level,
+        emission_state or RF_power_status then read the cached value
+        (a dictionary lookup) whenever it is at most max_age seconds old and
+        only fall back to a bus transaction otherwise.
+
+        Parameters
+        ----------
+        max_age : float
+            Staleness bound in seconds for cached values.
+        registers : list of (int, str), optional
+            (register address, data type) pairs to monitor. Defaults to all
+            registers of the register map.
+        priority : int
+            Monitoring priority, 0 = low, 1 = high.
+        """
+        if registers is None:
+            registers = [(register.address, register.data_type)
+                         for register in self._register_map]
+        nkt_live.start(self.portname, self.module_address, registers, priority)
+        self._live_max_age = max_age
+
+    def disable_live(self):
+        """Leave live mode; every register access goes to the bus again."""
+        if self._live_max_age is not None:
+            self._live_max_age = None
+            nkt_live.stop(self.portname, self.module_address)
+
+    def _cached_reading(self, register, data_type):
+        """(0, value) from the live cache, or None if not fresh."""
+        value = nkt_live.cache.value(self.portname, self.module_address,
+                                     register, data_type, self._live_max_age)
+        if value is None:
+            return None
+        return 0, value
+
+    def _read_register(self, register, data_type):
+        """
+        Read a register of this module.
+
+        Parameters
+        ----------
+        register : int
+            Register address.
+        data_type : str
+            'U8', 'U16', 'S16', 'U32', ... or 'Array' for raw bytes.
+
+        Returns
+        -------
+        (int, value)
+            Result code (RegisterResultTypes) and value, as NKTP_DLL returns.
+        """
+        if self._live_max_age is not None:
+            reading = self._cached_reading(register, data_type)
+            if reading is not None:
+                return reading
+        reading = nktp.registerReadTyped(self.portname, self.module_address,
+                                         register, data_type, -1)
+        written = self.__dict__.get('_written')
+        if written and register in written:
+            # Keep the last confirmed value in step with the device
+            if reading[0] == 0:
+                written[register] = (data_type, reading[1])
+            else:
+                del written[register]
+        return reading
+
+    def _write_register(self, register, data_type, value, force=False):
+        """
+        Write a register of this module, unless it already holds value.
+
+        The last confirmed value of every written register is remembered;
+        writing the same value again is skipped and reported as successful.
+
+        Parameters
+        ----------
+        register : int
+            Register address.
+        data_type : str
+            'U8', 'U16', 'S16', 'U32', ...
+        value : int or float
+            Value to write.
+        force : bool
+            Write even if the register is known to hold value.
+
+        Returns
+        -------
+        int
+            Result code (RegisterResultTypes).
+        """
+        written = self.__dict__.setdefault('_written', {})
+        if not force and self._holds(register, data_type, value, written):
+            return 0
+        if data_type == 'Array':
+            result = nktp.registerWrite(self.portname, self.module_address,
+                                        register, value, len(value), -1)
+        else:
+            result = getattr(nktp, 'registerWrite' + data_type)(
+                self.portname, self.module_address, register, value, -1)
+        if result == 0:
+            written[register] = (data_type, value)
+        else:
+            written.pop(register, None)
+        if self._live_max_age is not None:
+            # Until the DLL pushes the new value, read it from the bus
+            nkt_live.cache.invalidate(self.portname, self.module_address,
+                                      register)
+        return result
+
+    def _holds(self, register, data_type, value, written):
+        """True if register is known to hold value."""
+        if register in self._volatile_registers:
+            if self._live_max_age is None:
+                return False
+            return self._cached_reading(register, data_type) == (0, value)
+        return written.get(register) == (data_type, value)
+
+    def invalidate(self, register=None):
+        """
+        Forget the last written value of one register, or of all registers.
+
+        Call this after the device was changed by other means (front panel,
+        another program, a power cycle) so the next write is not skipped.
+
+        Parameters
+        ----------
+        register : int, optional
+            Register address. All registers if not given.
+        """
+        written = self.__dict__.get('_written')
+        if not written:
+            return
+        if register is None:
+            written.clear()
+        else:
+            written.pop(register, None)
+
+    def _layout(self, names):
+        """Precompiled nkt_registers.Layout of the named registers."""
+        layout = self._layouts.get(names)
+        if layout is None:
+            layout = self._layouts[names] = nkt_registers.Layout(
+                [self._registers[name] for name in names])
+        return layout
+
+    def _request(self, layout):
+        """(portname, module address, registers) for nktp.registerReadMany."""
+        return (self.portname, self.module_address,
+                [(register.address, 'Array') for register in layout.registers])
+
+    def _decode(self, layout, readings, raw=False, sync_written=True):
+        """
+        Decode raw (result, bytes) readings of layout into a dict.
+
+        With sync_written the values also refresh the write-skip record of
+        written registers (see _write_register).
+        """
+        raws = layout.unpack([data if result == 0 else None
+                              for result, data in readings])
+        written = self.__dict__.get('_written') if sync_written else None
+        if written:
+            # Keep the last confirmed values in step with the device
+            for register, value in zip(layout.registers, raws):
+                if register.address in written and value is not None:
+                    written[register.address] = (register.data_type, value)
+        if raw:
+            return dict(zip(layout.names, raws))
+        return {register.name: nkt_registers.convert(register, value)
+                for register, value in zip(layout.registers, raws)}
+
+    def read(self, name):
+        """
+        Read one register of the register map.
+
+        Parameters
+        ----------
+        name : str
+            Register name, e.g. 'power_level'.
+
+        Returns
+        -------
+        value
+            Scaled and decoded value.
+        """
+        register = self._registers[name]
+        comm_result, raw = self._read_register(register.address,
+                                               register.data_type)
+        return nkt_registers.convert(register, raw)
+
+    def read_many(self, *names, raw=False, sync_written=True):
+        """
+        Read several registers of the register map in one batched call.
+
+        The reads go through nktp.registerReadMany, one bus transaction per
+        register in order, and are decoded with one precompiled struct
+        layout. In live mode, fresh cached registers are not read from the
+        bus at all.
+
+        Parameters
+        ----------
+        *names : str
+            Register names. All registers if none are given.
+        raw : bool, optional
+            Return the raw register values, without scaling and decoding
+            ('Array' registers as bytes).
+        sync_written : bool, optional
+            Refresh the last written values with the readings. Background
+            readers (e.g. nkt_telemetry) pass False, so they never change
+            which writes are skipped.
+
+        Returns
+        -------
+        dict
+            {name: value}, None for registers that failed to read.
+        """
+        layout = self._layout(names)
+        portname, module_address, registers = self._request(layout)
+        if self._live_max_age is None:
+            readings = nktp.registerReadMany(portname, module_address,
+                                             registers)
+        else:
+            readings = []
+            missing = []
+            for i, register in enumerate(layout.registers):
+                data = nkt_live.cache.raw(portname, module_address,
+                                          register.address, self._live_max_age)
+                if data is None:
+                    missing.append(i)
+                readings.append((0, data))
+            if missing:
+                fetched = nktp.registerReadMany(
+                    portname, module_address, [registers[i] for i in missing])
+                for i, reading in zip(missing, fetched):
+                    readings[i] = reading
+        return self._decode(layout, readings, raw, sync_written)
+
+    def wait_until(self, name, condition, registers, timeout,
+                   first_interval=0.005, max_interval=0.1):
+        """
+        Poll registers until condition holds, with backoff and a deadline.
+
+        The poll interval starts at first_interval and grows by half each
+        poll up to max_interval, so short waits return within a few ms of
+        the hardware becoming ready while long waits do not flood the bus.
+        The time spent is recorded in wait_times under name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the wait, used in wait_times and error messages.
+        condition : callable
+            Called with the read_many() dict of registers, returns True when
+            the module is ready.
+        registers : tuple of str
+            Register names to poll.
+        timeout : float
+            Deadline in seconds.
+        first_interval, max_interval : float
+            Smallest and largest poll interval in seconds.
+
+        Returns
+        -------
+        float
+            Seconds spent waiting.
+
+        Raises
+        ------
+        TimeoutError
+            If the condition does not hold within timeout seconds.
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        interval = first_interval
+        while True:
+            values = self.read_many(*registers)
+            now = time.monotonic()
+            if condition(values):
+                break
+            if now >= deadline:
+                self._record_wait(name, now - start)
+                raise TimeoutError('%s: %s not ready after %.2f s, last %s'
+                                   % (self._module_name, name, now - start,
+                                      values))
+            time.sleep(min(interval, deadline - now))
+            interval = min(interval * 1.5, max_interval)
+        waited = now - start
+        self._record_wait(name, waited)
+        return waited
+
+    def _record_wait(self, name, waited):
+        self.__dict__.setdefault('_wait_times', {}).setdefault(
+            name, []).append(waited)
+
+    @property
+    def wait_times(self):
+        """
+        `dict`, read-only: Seconds spent in each wait_until_* call.
+
+        {wait name: [seconds, ...]} in call order, including timed out waits.
+        """
+        return self.__dict__.get('_wait_times', {})
+
+    def snapshot(self):
+        """
+        Read all registers of the module in one batched call, see read_many().
+
+        Use snapshot_all() to read modules on several ports in parallel.
+
+        Returns
+        -------
+        dict
+            {name: decoded value}, None for registers that failed to read.
+        """
+        return self.read_many()
+
+    def _write_value(self, name, value, force=False):
+        """Write one register of the register map, value in units."""
+        register = self._registers[name]
+        return self._write_register(register.address, register.data_type,
+                                    nkt_registers.encode(register, value),
+                                    force=force)
+
+    def write(self, force=False, **values):
+        """
+        Write several registers of the register map in one batched call.
+
+        Writes of values a register already holds are skipped (see
+        _write_register) and the rest go through nktp.registerWriteMany, one
+        after the other in the order of values.
+
+        Parameters
+        ----------
+        force : bool, optional
+            Write even if a register is known to hold the value already.
+        **values
+            {register name: value in units}, e.g. amplitude_channel_1=50.
+
+        Returns
+        -------
+        dict
+            {name: result code (RegisterResultTypes)}.
+
+        Raises
+        ------
+        ValueError
+            If a register is read-only.
+        """
+        written = self.__dict__.setdefault('_written', {})
+        results = {}
+        writes = []
+        for name, value in values.items():
+            register = self._registers[name]
+            if register.access != 'rw':
+                raise ValueError('Register %s is read-only' % name)
+            raw = nkt_registers.encode(register, value)
+            if not force and self._holds(register.address, register.data_type,
+                                         raw, written):
+                results[name] = 0
+            else:
+                writes.append((name, register, raw))
+        if len(writes) == 1:
+            name, register, raw = writes[0]
+            results[name] = self._write_register(
+                register.address, register.data_type, raw, force=True)
+            return results
+        outcome = nktp.registerWriteMany(
+            self.portname, self.module_address,
+            [(register.address, register.data_type, raw)
+             for name, register, raw in writes])
+        for (name, register, raw), result in zip(writes, outcome):
+            results[name] = result
+            if result == 0:
+                written[register.address] = (register.data_type, raw)
+            else:
+                written.pop(register.address, None)
+            if self._live_max_age is not None:
+                nkt_live.cache.invalidate(self.portname, self.module_address,
+                                          register.address)
+        return results
+
+
+def _register_property(register):
+    """Generated property of a register without a hand-written one."""
+    def fget(self):
+        return self.read(register.name)
+
+    def fset(self, value):
+        self._write_value(register.name, value)
+
+    doc = 'Register 0x%02X (%s)' % (register.address, register.data_type)
+    if register.scale is not None:
+        doc += ', scaled by 1/%g' % register.scale
+    if register.access == 'rw':
+        return property(fget, fset, doc=doc + ', read/write.')
+    return property(fget, doc=doc + ', read-only.')
+
+
+def snapshot_all(*devices):
+    """
+    Snapshot several NKT modules, the modules on different ports in parallel.
+
+    Parameters
+    ----------
+    *devices : Fianium, Select or RF_driver
+        Modules to read.
+
+    Returns
+    -------
+    list of dict
+        One snapshot per device, see _NKTModule.snapshot.
+    """
+    layouts = [device._layout(()) for device in devices]
+    readings = nktp.registerReadManyPorts(
+        [device._request(layout) for device, layout in zip(devices, layouts)])
+    return [device._decode(layout, reading)
+            for device, layout, reading in zip(devices, layouts, readings)]
 
 """
 NKT Photonics Fianium Class
 """
-class Fianium:
+class Fianium(_NKTModule):
 
     status_messages = {
         0: 'Emission on',
@@ -47,7 +621,26 @@ class Fianium:
         0: 'Internal power control mode',
         4: 'External feedback mode (Power Lock)'
             }
-    def __init__(self, portname=None):
+    _module_name = 'Fianium'
+    _module_type = 0x88
+    _volatile_registers = frozenset({0x30})  # emission can drop (interlock)
+    _register_map = (
+        nkt_registers.register('emission_state', 0x30, 'U8', access='rw',
+                               decoder=_decode_emission),
+        nkt_registers.register('setup_status', 0x31, 'U16', access='rw',
+                               decoder=setup_options.get),
+        nkt_registers.register('interlock_status', 0x32, 'Array',
+                               decoder=_decode_interlock, size=2),
+        # Reads return 1 byte for ratios below 256, 2 bytes otherwise
+        nkt_registers.register('pulse_picker_ratio', 0x34, 'U16', access='rw',
+                               pad=True),
+        nkt_registers.register('watchdog_interval', 0x36, 'U8', access='rw'),
+        nkt_registers.register('power_level', 0x37, 'U16', 10, 'rw'),
+        nkt_registers.register('nim_delay', 0x39, 'U16', 1 / 9e-12, 'rw'),
+        nkt_registers.register('status_bits', 0x66, 'U16'),
+        )
+
+    def __init__(self, portname=None, module_address=None):
         """
         Searches for connected NKT lasers and defines instrument parameters.
 
@@ -60,6 +653,9 @@ class Fianium:
         portname : str, optional
             Enter if portname for laser is known/multiple lasers are connected.
             If not supplied, system searches for laser. None by default.
+        module_address : int, optional
+            Module address, 15 by default. Give it for a second module of
+            the type on the bus (see nkt_registry).
 
         Raises
         ------
@@ -69,7 +665,9 @@ class Fianium:
         """
         print('Searching for connected NKT Laser...')
         self._portname = None  # COM port for laser. Auto found if not given.
-        self._module_address = 15  # module address = 15 for Fianium
+        # module address = 15 for Fianium, unless given
+        self._module_address = (15 if module_address is None
+                                else module_address)
         self._device_type = None  # Should be 0x88 for Fianium
         self._emission_state = None
         self._setup_status = None
@@ -80,50 +678,7 @@ class Fianium:
         self._nim_delay = None
 
 
-        if portname:  # Allow user to init specific NKT Laser on portname
-            self._portname = portname
-            self._device_type = 136  # Could put check here
-
-        else:  # Search for connection w/ laser
-            # Open available ports
-            nktp.openPorts(nktp.getAllPorts(), 1, 1)
-
-            # Get open NKT ports
-            portlist = nktp.getOpenPorts().split(',')
-            nkt_device_found = False
-
-            for portName in portlist:  # Sweep open nkt ports
-                # get binary devList of connected nkt devices
-                comm_result, devList = nktp.deviceGetAllTypes(portName)
-                # Get byte at location 15 (device address for fianium)
-                device_type = devList[self.module_address]
-
-                # Double check device_type matches fianium laser
-                if hex(device_type) == '0x88':  # 136 == 0x88 in hex
-                    if nkt_device_found:  # If fianium found on other port, error
-                        err_msg = ('''Multiple NKT Lasers found on computer.
-                        COM port 1 = %s
-                        COM port 2 = %s
-                        Please initialize Fianium class with designated \
-                        portname to avoid conflict'''
-                                   % (self.portname, portName))
-
-                        raise RuntimeError(err_msg)
-
-                    else:  # If this is first laser found,
-                        nkt_device_found = True
-                        self._portname = portName
-                        self._device_type = device_type
-
-        # Close all ports
-        closeResult = nktp.closePorts('')
-        if nkt_device_found:
-            print('NKT Fianium Found:')
-            print('Comport: ', self.portname, 'Device type: ', "0x%0.2X"
-                  % self.device_type, 'at address:', self.module_address)
-
-        else:
-            print('No Fianium Laser Found')
+        self._find_module(portname)
 
     module_address = property(lambda self: self._module_address)
     """`int`, read-only: Module address = 15 for Fianium."""
@@ -149,11 +704,7 @@ class Fianium:
         str
             Current setup status of laser based on manual values.
         """
-        register_address = 0x31
-        comm_result, setup_key = nktp.registerReadU16(self.portname,
-                                                    self.module_address,
-                                                    register_address, -1)
-        self._setup_status = Fianium.setup_options[setup_key]
+        self._setup_status = self.read('setup_status')
         return self._setup_status
     
     @property
@@ -190,31 +741,7 @@ class Fianium:
         tuple(int, str)
             (LSB, Desription) returns result according to table in manual.
         """
-        register_address = 0x32
-        comm_result, reading = nktp.registerRead(self.portname,
-                                                self.module_address,
-                                                register_address, -1)
-
-        LSB = reading[0]  # What manual calls first byte
-        MSB = reading[1]  # What manual calls second byte
-        # Interlock status message based on manual
-        output_options = ['Interlock off (interlock circuit open)',
-                          'Front panel interlock/key switch off',
-                          'Door switch open',
-                          'External module interlock',
-                          'Application interlock',
-                          'Internal module interlock',
-                          'Interlock power failure',
-                          'Interlock disabled by light source']
-        if LSB == 0:
-            reason = output_options[MSB]
-            self._interlock_status = (LSB, 'Interlocked: %s' % reason)
-
-        elif LSB == 1:
-            self._interlock_status = (LSB, 'Waiting for interlock reset')
-
-        elif LSB == 2:
-            self._interlock_status = (LSB, 'Interlock is OK')
+        self._interlock_status = self.read('interlock_status')
         return self._interlock_status
     
     @property
@@ -234,11 +761,7 @@ class Fianium:
         ratio : int
             Pulse picker divide ratio
         """
-        register_address = 0x34
-        comm_result, ratio = nktp.registerReadU16(self.portname,
-                                                 self.module_address,
-                                                 register_address, -1)
-        self._pulse_picker_ratio = ratio
+        self._pulse_picker_ratio = self.read('pulse_picker_ratio')
         return self._pulse_picker_ratio
 
     @property
@@ -258,11 +781,7 @@ class Fianium:
         ratio : int
             Pulse picker divide ratio
         """
-        register_address = 0x36
-        comm_result, interval = nktp.registerReadU8(self.portname,
-                                                   self.module_address,
-                                                   register_address, -1)
-        self._watchdog_interval = interval
+        self._watchdog_interval = self.read('watchdog_interval')
         return self._watchdog_interval
 
     @property
@@ -277,16 +796,8 @@ class Fianium:
         bool
             True = emission off; False = emission on
         """
-        register_address = 0x30
-        comm_result, value = nktp.registerReadU8(self.portname,
-                                                self.module_address,
-                                                register_address, -1)
-        if value == 3:
-            self._emission_state = True
-        elif value == 0:
-            self._emission_state = False
-        else:
-            self._emission_state = 'Unknown'
+        self._emission_state = self.read('emission_state')
+        if self._emission_state == 'Unknown':
             print('Unknown Emissions State Detected')
 
         return self._emission_state
@@ -303,11 +814,7 @@ class Fianium:
         power_level : float
             Power level setpoint in percent w/ 0.1% precision.
         """
-        register_address = 0x37
-        comm_result, power = nktp.registerReadU16(self.portname,
-                                                 self.module_address,
-                                                 register_address, -1)
-        self._power_level = power / 10
+        self._power_level = self.read('power_level')
         return self._power_level
 
     @property
@@ -328,15 +835,10 @@ class Fianium:
         nim_delay : float
             Delay time given in seconds.
         """
-        register_address = 0x39
-        step = 9e-12  # Step size for delay is 9 ps
-        comm_result, delay = nktp.registerReadU16(self.portname,
-                                                self.module_address,
-                                                register_address, -1)
-        self._nim_delay = delay * step
+        self._nim_delay = self.read('nim_delay')
         return self._nim_delay
 
-    def set_power(self, power):
+    def set_power(self, power, force=False):
         """
         Set power level setpoint with 0.1% precision.
 
@@ -346,19 +848,18 @@ class Fianium:
         ----------
         power : float
             Power level setpoint in percent w/ 0.1% precision. (0 <= P <= 100)
+        force : bool, optional
+            Write even if the register is known to hold the value already.
         """
-        register_address = 0x37
-        setpoint = int(power * 10)
         if (power >= 0) and (power <= 100):
-            nktp.registerWriteU16(self.portname, self.module_address,
-                                 register_address, setpoint, -1)
+            self._write_value('power_level', power, force)
         else:
-            self.set_emission(False)
-            self.set_power(0)
+            self.set_emission(False, force=True)
+            self.set_power(0, force=True)
             raise ValueError("Power must be between 0 and 100%\n"
                              "Setting output to 0.")
     
-    def set_emission(self, state):
+    def set_emission(self, state, force=False):
         """
         Change emission state of laser to on/off
 
@@ -368,20 +869,18 @@ class Fianium:
         ----------
         state : bool
             True turns laser on, false turns emission off
+        force : bool, optional
+            Write even if the register is known to hold the value already.
         """
-        register_address = 0x30
-
         # checks if interlock is on/off
         if state is True:
             print("Ensure Laser Safety Goggles are on")
-            nktp.registerWriteU8(self.portname, self.module_address,
-                                register_address, 0x03, -1)
+            self._write_value('emission_state', 0x03, force)
         elif state is False:
             print("Laser off")
-            nktp.registerWriteU8(self.portname, self.module_address,
-                                register_address, 0x00, -1)
+            self._write_value('emission_state', 0x00, force)
     
-    def set_mode(self, setup_key):
+    def set_mode(self, setup_key, force=False):
         """
         Sets the "setup" of the laser according to options in manual.
 
@@ -402,17 +901,17 @@ class Fianium:
         ----------
         setup_key : int
             Interger corresponding to a key inside Fianium.setup_options
+        force : bool, optional
+            Write even if the register is known to hold the value already.
         """
-        register_address = 0x31
         if setup_key in Fianium.setup_options.keys():
-            nktp.registerWriteU8(self.portname, self.module_address,
-                                register_address, setup_key, -1)
+            self._write_value('setup_status', setup_key, force)
             print('Mode set to: ', self.setup_status)
         else:
             print('Warning: Invalid Key Provided')
             print('Mode remains as: ', self.setup_status)
 
-    def set_pulse_picker_ratio(self, ratio):
+    def set_pulse_picker_ratio(self, ratio, force=False):
         """
         Sets pulse picker ratio by writing register 0x34.
 
@@ -425,15 +924,15 @@ class Fianium:
         ----------
         ratio : int
             Interger corresponding to a key inside Extreme.setup_options
+        force : bool, optional
+            Write even if the register is known to hold the value already.
         """
-        register_address = 0x34
         if type(ratio) is int:
-            nktp.registerWriteU16(self.portname, self.module_address,
-                                 register_address, ratio, -1)
+            self._write_value('pulse_picker_ratio', ratio, force)
         else:
             raise ValueError('ratios needs to be int')
 
-    def set_watchdog_interval(self, timeout):
+    def set_watchdog_interval(self, timeout, force=False):
         """
         Set the watchdog interval by calling registerWriteU8 on 0x36.
 
@@ -448,15 +947,15 @@ class Fianium:
         ----------
         timeout : int
             time (seconds) the system will toleratre for communication loss.
+        force : bool, optional
+            Write even if the register is known to hold the value already.
         """
-        register_address = 0x36
         if type(timeout) is int:
-            nktp.registerWriteU8(self.portname, self.module_address,
-                                register_address, timeout, -1)
+            self._write_value('watchdog_interval', timeout, force)
         else:
             raise ValueError('timeout needs to be int')
 
-    def set_nim_delay(self, nim_delay):
+    def set_nim_delay(self, nim_delay, force=False):
         """
         Set NIM trigger delay time.
 
@@ -473,41 +972,78 @@ class Fianium:
         ----------
         nim_delay : float
             Delay time given in seconds. (0 <= nim_delay <= 9.207e-9)
+        force : bool, optional
+            Write even if the register is known to hold the value already.
         """
-        register_address = 0x39
         step = 9e-12  # Step size for delay is 9 ps
         int_delay = int(nim_delay/step)
         if (int_delay >= 0) and (int_delay <= 1023):
-            nktp.registerWriteU16(self.portname, self.module_address,
-                                 register_address, int_delay, -1)
+            self._write_value('nim_delay', nim_delay, force)
         else:
             print('NIM Delay Value Out of Range (0 <= Delay <= 9.207e-9)')
 
+    def wait_until_emission_stable(self, timeout=10, stable_reads=2):
+        """
+        Wait until the laser reports emission on, instead of a fixed sleep.
+
+        Polls the status bits (register 0x66) and the emission register
+        (0x30). The laser counts as stable once "Emission on" (bit 0) is set,
+        the interlock relays are on (bit 1 clear) and this holds for
+        stable_reads consecutive polls.
+
+        Parameters
+        ----------
+        timeout : float
+            Deadline in seconds.
+        stable_reads : int
+            Consecutive ready polls required.
+
+        Returns
+        -------
+        float
+            Seconds spent waiting, also recorded in wait_times.
+
+        Raises
+        ------
+        TimeoutError
+            If emission is not stable within timeout seconds.
+        """
+        streak = [0]
+
+        def stable(values):
+            bits = values['status_bits']
+            if bits is not None and bits & 0x0003 == 0x0001 \
+                    and values['emission_state'] is True:
+                streak[0] += 1
+            else:
+                streak[0] = 0
+            return streak[0] >= stable_reads
+
+        return self.wait_until('emission', stable,
+                               ('status_bits', 'emission_state'), timeout)
+
     def print_status(self):
         """
         Read system status in bytes, translate to str, print.
 
         Reads system status using registerReadU16 on register 0x66.
         Translates binary into str for of equipment status through
-        Extreme.status_messages.
+        Extreme.status_messages. Use nkt_status to decode many readings,
+        e.g. from telemetry, at once.
 
         Returns
         -------
         str : bits
             binary results of register read in string format.
         """
+        import nkt_status   # NumPy is only loaded when it is needed
         register_address = 0x66
-        result, byte = nktp.registerReadU16(self.portname, self.module_address,
-                                           register_address, -1)
+        result, byte = self._read_register(register_address, 'U16')
         print(nktp.RegisterResultTypes(result))
-        bits = bin(byte)
-        for index, bit in enumerate(reversed(bits)):
-            if bit == 'b':
-                break
-            elif bit == '1':
-                print(Fianium.status_messages[index])
+        for index in nkt_status.status_planes(byte)[0].nonzero()[0]:
+            print(Fianium.status_messages[index])
 
-        return (bits)
+        return bin(byte)
 
     def test_read_funcs(self):
         """
@@ -538,8 +1074,19 @@ Registers that have not been implemented are:
     -   Monitor 1 and 2 gain
     -   Monitor switch
 """
-class Select:
-    def __init__(self, portname=None):
+class Select(_NKTModule):
+    _module_name = 'Select'
+    _module_type = 0x67
+    _register_map = (
+        nkt_registers.register('crystal_1_min', 0x90, 'U32', 1000),
+        nkt_registers.register('crystal_1_max', 0x91, 'U32', 1000),
+        nkt_registers.register('crystal_2_min', 0xA0, 'U32', 1000),
+        nkt_registers.register('crystal_2_max', 0xA1, 'U32', 1000),
+        nkt_registers.register('switch_settings', 0x34, 'U8', access='rw',
+                               decoder=_decode_rf_switch),
+        )
+
+    def __init__(self, portname=None, module_address=None):
         """
         Searches for connected NKT Select and defines instrument parameters.
 
@@ -552,6 +1099,9 @@ class Select:
         portname : str, optional
             Enter if portname for laser is known/multiple Select are connected.
             If not supplied, system searches for laser. None by default.
+        module_address : int, optional
+            Module address, 18 by default. Give it for a second module of
+            the type on the bus (see nkt_registry).
 
         Raises
         ------
@@ -561,54 +1111,14 @@ class Select:
         """
         print('Searching for connected NKT Select...')
         self._portname = None  # COM port for laser. Auto found if not given.
-        self._module_address = 18  # module address = 15 for Select
+        # module address = 18 for Select, unless given
+        self._module_address = (18 if module_address is None
+                                else module_address)
         self._device_type = None  # Should be 0x67 for Select
         self._rf_switch = None # Operation mode of SELECT
+        self._crystal_ranges = None # {crystal: (min, max)}, read once
 
-        if portname:  # Allow user to init specific NKT Laser on portname
-            self._portname = portname
-            self._device_type = 103  # Could put check here
-
-        else:  # Search for connection w/ laser
-            # Open available ports
-            nktp.openPorts(nktp.getAllPorts(), 1, 1)
-
-            # Get open NKT ports
-            portlist = nktp.getOpenPorts().split(',')
-            nkt_device_found = False
-
-            for portName in portlist:  # Sweep open nkt ports
-                # get binary devList of connected nkt devices
-                comm_result, devList = nktp.deviceGetAllTypes(portName)
-                # Get byte at location 15 (device address for select)
-                device_type = devList[self.module_address]
-
-                # Double check device_type matches select laser
-                if hex(device_type) == '0x67':  # 103 == 0x67 in hex
-                    if nkt_device_found:  # If select found on other port, error
-                        err_msg = ('''Multiple NKT Lasers found on computer.
-                        COM port 1 = %s
-                        COM port 2 = %s
-                        Please initialize Select class with designated \
-                        portname to avoid conflict'''
-                                   % (self.portname, portName))
-
-                        raise RuntimeError(err_msg)
-
-                    else:  # If this is first laser found,
-                        nkt_device_found = True
-                        self._portname = portName
-                        self._device_type = device_type
-
-        # Close all ports
-        closeResult = nktp.closePorts('')
-        if nkt_device_found:
-            print('NKT Select Found:')
-            print('Comport: ', self.portname, 'Device type: ', "0x%0.2X"
-                  % self.device_type, 'at address:', self.module_address)
-
-        else:
-            print('No Select Module Found')
+        self._find_module(portname)
 
     module_address = property(lambda self: self._module_address)
     """`int`, read-only: Module address = 18 for Select."""
@@ -633,11 +1143,7 @@ class Select:
         wavelength: float
             Minimum usable wavelength in crystal 1 (Resolution is in 0.1 nm)
         """
-        register_address = 0x90
-        comm_result, reading = nktp.registerReadU32(self.portname,
-                                                    self.module_address,
-                                                    register_address, -1)
-        return reading/1000
+        return self.read('crystal_1_min')
     
     @property
     def crystal_1_max(self):
@@ -650,11 +1156,7 @@ class Select:
         wavelength: float
             Maximum usable wavelength in crystal 1 (Resolution is in 0.1 nm)
         """
-        register_address = 0x91
-        comm_result, reading = nktp.registerReadU32(self.portname,
-                                                    self.module_address,
-                                                    register_address, -1)
-        return reading/1000
+        return self.read('crystal_1_max')
     
     @property
     def crystal_2_min(self):
@@ -667,11 +1169,7 @@ class Select:
         wavelength: float
             Minimum usable wavelength in crystal 2 (Resolution is in 0.1 nm)
         """
-        register_address = 0xA0
-        comm_result, reading = nktp.registerReadU32(self.portname,
-                                                    self.module_address,
-                                                    register_address, -1)
-        return reading/1000
+        return self.read('crystal_2_min')
     
     @property
     def crystal_2_max(self):
@@ -684,11 +1182,7 @@ class Select:
         wavelength: float
             Maximum usable wavelength in crystal 2 (Resolution is in 0.1 nm)
         """
-        register_address = 0xA1
-        comm_result, reading = nktp.registerReadU32(self.portname,
-                                                    self.module_address,
-                                                    register_address, -1)
-        return reading/1000
+        return self.read('crystal_2_max')
     
     @property
     def get_switch_settings(self):
@@ -703,19 +1197,10 @@ class Select:
         -------
         (setting bit, operation mode): (int, str)
         """
-        register_address = 0x34
-        comm_result, reading = nktp.registerReadU8(self.portname,
-                                                    self.module_address,
-                                                    register_address, -1)
-        if reading == 0:
-            self._rf_switch = (reading, 'Normal operation')
-
-        elif reading == 1:
-            self._rf_switch = (reading, 'Swapped Crystal Connections')
-
+        self._rf_switch = self.read('switch_settings')
         return self._rf_switch
     
-    def set_switch_settings(self, switch):
+    def set_switch_settings(self, switch, force=False):
         """
         Sets current operations of AOTF crystals. When activated, the RF switch swaps 
         the two RF connections. Ensure that RF driver is off when setting operation.
@@ -723,29 +1208,210 @@ class Select:
             0:  Normal operation
             1:  Swap crystal connections
 
+        Parameters
+        ----------
+        switch : int
+            0 for normal operation, 1 to swap crystal connections.
+        force : bool, optional
+            Write even if the register is known to hold the value already.
+
         Returns
         -------
         (setting bit, operation mode): (int, str)
         """
-        register_address = 0x34
         if switch is 0:
             print("Setting to normal operation")
-            nktp.registerWriteU8(self.portname, self.module_address, register_address, 0x00, -1)
+            self._write_value('switch_settings', 0x00, force)
         elif switch is 1:
             print("Switching RF connection")
-            nktp.registerWriteU8(self.portname, self.module_address, register_address, 0x01, -1)
+            self._write_value('switch_settings', 0x01, force)
+
+    @property
+    def crystal_ranges(self):
+        """
+        Usable wavelength range of both crystals, read once per session.
+
+        The ranges are fixed properties of the crystals, so the four range
+        registers are read in one batch on first use and cached.
+
+        Returns
+        -------
+        dict
+            {1: (min, max), 2: (min, max)} in nm.
+        """
+        if self._crystal_ranges is None:
+            ranges = self.read_many('crystal_1_min', 'crystal_1_max',
+                                    'crystal_2_min', 'crystal_2_max')
+            if None in ranges.values():
+                raise RuntimeError("Could not read the crystal ranges.")
+            self._crystal_ranges = {
+                1: (ranges['crystal_1_min'], ranges['crystal_1_max']),
+                2: (ranges['crystal_2_min'], ranges['crystal_2_max'])}
+        return self._crystal_ranges
+
+    def crystal_for(self, wavelengths, preferred=None):
+        """
+        Return the crystal whose range covers all wavelengths.
+
+        Parameters
+        ----------
+        wavelengths : float or list of float
+            Wavelength(s) in nm.
+        preferred : int, optional
+            Crystal to return if both crystals cover the wavelengths, e.g.
+            the connected one.
+
+        Returns
+        -------
+        int or None
+            1 or 2, None if no single crystal covers all wavelengths.
+        """
+        if isinstance(wavelengths, (int, float)):
+            wavelengths = [wavelengths]
+        low, high = min(wavelengths), max(wavelengths)
+        candidates = [crystal for crystal, (min_wave, max_wave)
+                      in sorted(self.crystal_ranges.items())
+                      if min_wave <= low and high <= max_wave]
+        if preferred in candidates:
+            return preferred
+        return candidates[0] if candidates else None
+
+    def plan(self, wavelengths, connected=None):
+        """
+        Group a wavelength sweep by crystal to need as few switches as possible.
+
+        Parameters
+        ----------
+        wavelengths : list of float
+            Wavelengths in nm, in any order.
+        connected : int, optional
+            Currently connected crystal; its group comes first.
+
+        Returns
+        -------
+        list of (int, list of float)
+            (crystal, wavelengths) groups, at most one per crystal, keeping
+            the order of wavelengths within a group.
+
+        Raises
+        ------
+        ValueError
+            If a wavelength is outside both crystal ranges.
+        """
+        groups = {}
+        for wave in wavelengths:
+            crystal = self.crystal_for(wave, preferred=connected)
+            if crystal is None:
+                raise ValueError("Wavelength %s nm is outside both crystal "
+                                 "ranges %s." % (wave, self.crystal_ranges))
+            groups.setdefault(crystal, []).append(wave)
+        order = sorted(groups, key=lambda crystal: crystal != connected)
+        return [(crystal, groups[crystal]) for crystal in order]
+
+    def select_crystal(self, rf_driver, wavelengths, timeout=5):
+        """
+        Connect the crystal covering wavelengths, switching only if needed.
+
+        The crystal is computed from the cached ranges, without trial
+        switching. If the RF driver already reports that crystal, nothing is
+        written. Otherwise RF power is turned off, the RF switch is toggled
+        from its current setting (it swaps the two connections, so the
+        setting alone does not tell which crystal is connected), and the call
+        waits until the RF driver reports the new crystal; RF power is turned
+        back on if it was on before.
+
+        Parameters
+        ----------
+        rf_driver : RF_driver
+            RF driver connected to this Select.
+        wavelengths : float or list of float
+            Wavelength(s) in nm that must all be reachable.
+        timeout : float
+            Deadline in seconds for the crystal to be reported.
+
+        Returns
+        -------
+        int
+            The connected crystal, 1 or 2.
+
+        Raises
+        ------
+        ValueError
+            If no single crystal covers the wavelengths.
+        RuntimeError
+            If the RF driver reports no crystal or the switch setting cannot
+            be read, so the setting that connects the crystal is unknown, or
+            if the RF power state cannot be read.
+        TimeoutError
+            If the RF driver does not report the crystal in time.
+        """
+        connected = rf_driver.get_connected_crystal
+        # Crystals are numbered 1, 2 on the first Select, 3, 4 on the next...
+        current = (connected - 1) % 2 + 1 if connected else None
+        target = self.crystal_for(wavelengths, preferred=current)
+        if target is None:
+            raise ValueError("No crystal covers %s nm, ranges are %s."
+                             % (wavelengths, self.crystal_ranges))
+        if target == current:
+            return target
+        if current is None:
+            raise RuntimeError("The RF driver reports no connected crystal, "
+                               "cannot tell how to switch to crystal %d."
+                               % target)
+        setting = self.get_switch_settings
+        if setting is None:
+            raise RuntimeError("Could not read the RF switch setting.")
+
+        status = rf_driver.RF_power_status
+        if status is None:
+            raise RuntimeError("Could not read the RF power state.")
+        rf_on = status[0] == 1
+        rf_driver.set_RF_power(False)
+        self.set_switch_settings(1 - setting[0], force=True)
+        min_wave, max_wave = self.crystal_ranges[target]
+        rf_driver.wait_until_crystal_ready(min_wave, max_wave, timeout)
+        if rf_on:
+            rf_driver.set_RF_power(True)
+            rf_driver.wait_until_rf_on()
+        return target
 
 """
 NKT Photonics RF Driver Class
 This class is supposed to be dependent on the Fianium class
 Registers that have not been implemented are:
     -   Setup bits
-    -   FSK mode
     -   Daughter board enable/disable
     -   Modulation gain settings
 """
-class RF_driver:
-    def __init__(self, portname=None):
+class RF_driver(_NKTModule):
+    _module_name = 'RF driver'
+    _module_type = 0x66
+    _volatile_registers = frozenset({0x30})  # RF power can be switched off by the driver
+    _register_map = (
+        nkt_registers.register('RF_power_status', 0x30, 'U8', access='rw',
+                               decoder=_decode_rf_power),
+        nkt_registers.register('RF_setup_bits', 0x31, 'Array', access='rw',
+                               size=1),
+        nkt_registers.register('min_wavelength', 0x34, 'U32', 1000),
+        nkt_registers.register('max_wavelength', 0x35, 'U32', 1000),
+        nkt_registers.register('crystal_temperature', 0x38, 'S16', 10),
+        nkt_registers.register('connected_crystal', 0x75, 'U8'),
+        nkt_registers.register('fsk_mode', 0x3B, 'U8', access='rw'),
+        ) + tuple(
+        nkt_registers.register('wavelength_channel_%d' % (channel + 1),
+                               0x90 + channel, 'U32', 1000, 'rw')
+        for channel in range(8)) + tuple(
+        nkt_registers.register('amplitude_channel_%d' % (channel + 1),
+                               0xB0 + channel, 'U16', 10, 'rw')
+        for channel in range(8))
+
+    def _channel_register(self, kind, channel):
+        """Name of the wavelength or amplitude register of a channel."""
+        if channel not in range(1, 9):
+            raise ValueError("Invalid channel number. Must be between 1 and 8.")
+        return '%s_channel_%d' % (kind, channel)
+
+    def __init__(self, portname=None, module_address=None):
         """
         Searches for connected NKT RF drivers and defines instrument parameters.
 
@@ -758,6 +1424,9 @@ class RF_driver:
         portname : str, optional
             Enter if portname for laser is known/multiple lasers are connected.
             If not supplied, system searches for laser. None by default.
+        module_address : int, optional
+            Module address, 16 by default. Give it for a second module of
+            the type on the bus (see nkt_registry).
 
         Raises
         ------
@@ -767,76 +1436,18 @@ class RF_driver:
         """
         print('Searching for connected NKT Laser...')
         self._portname = None  # COM port for laser. Auto found if not given.
-        self._module_address = 16  # module address = 16 for RF driver
+        # module address = 16 for RF driver, unless given
+        self._module_address = (16 if module_address is None
+                                else module_address)
         self._device_type = None  # Should be 0x66 for RF driver
         self._RF_power_status = None
-        self._wavelength_registers = { # Wavelength register channels 
-            1: 0x90,
-            2: 0x91,
-            3: 0x92,
-            4: 0x93,
-            5: 0x94,
-            6: 0x95,
-            7: 0x96,
-            8: 0x97
-        }
-        self._amplitude_registers = { # Amplitude register channels
-            1: 0xB0,
-            2: 0xB1,
-            3: 0xB2,
-            4: 0xB3,
-            5: 0xB4,
-            6: 0xB5,
-            7: 0xB6,
-            8: 0xB7
-        }
         self._wavelength_channels = {} # Used to store wavelength settings
         self._amplitude_channels = {} # Used to store amplitude of wavelength
+        self._program = () # Wavelengths preloaded into channels 1..n
+        self._program_amplitude = 100 # Amplitude of the active program channel
+        self._active_channel = None # Channel currently given amplitude
 
-        if portname:  # Allow user to init specific NKT Laser on portname
-            self._portname = portname
-            self._device_type = 102  # Could put check here
-
-        else:  # Search for connection w/ laser
-            # Open available ports
-            nktp.openPorts(nktp.getAllPorts(), 1, 1)
-
-            # Get open NKT ports
-            portlist = nktp.getOpenPorts().split(',')
-            nkt_device_found = False
-
-            for portName in portlist:  # Sweep open nkt ports
-                # get binary devList of connected nkt devices
-                comm_result, devList = nktp.deviceGetAllTypes(portName)
-                # Get byte at location 15 (device address for select)
-                device_type = devList[self.module_address]
-
-                # Double check device_type matches select laser
-                if hex(device_type) == '0x66':  # 102 == 0x66 in hex
-                    if nkt_device_found:  # If select found on other port, error
-                        err_msg = ('''Multiple NKT Lasers found on computer.
-                        COM port 1 = %s
-                        COM port 2 = %s
-                        Please initialize Select class with designated \
-                        portname to avoid conflict'''
-                                   % (self.portname, portName))
-
-                        raise RuntimeError(err_msg)
-
-                    else:  # If this is first laser found,
-                        nkt_device_found = True
-                        self._portname = portName
-                        self._device_type = device_type
-
-        # Close all ports
-        closeResult = nktp.closePorts('')
-        if nkt_device_found:
-            print('NKT Select Found:')
-            print('Comport: ', self.portname, 'Device type: ', "0x%0.2X"
-                  % self.device_type, 'at address:', self.module_address)
-
-        else:
-            print('No Select Module Found')
+        self._find_module(portname)
 
     module_address = property(lambda self: self._module_address)
     """`int`, read-only: Module address = 16 for RF driver."""
@@ -863,17 +1474,7 @@ class RF_driver:
         tuple(int, str)
             (bit, Desription) returns on/off result of RF driver.
         """
-        register_address = 0x30
-        comm_result, reading = nktp.registerReadU8(self.portname,
-                                                self.module_address,
-                                                register_address, -1)
-
-        if reading == 0:
-            self._RF_power_status = (reading, 'RF driver is off')
-
-        elif reading == 1:
-            self._RF_power_status = (reading, 'RF driver is on')
-
+        self._RF_power_status = self.read('RF_power_status')
         return self._RF_power_status
     
     @property
@@ -892,12 +1493,7 @@ class RF_driver:
         int
             (bit) returns setup bit of RF driver.
         """
-        register_address = 0x31
-        comm_result, reading = nktp.registerRead(self.portname,
-                                                self.module_address,
-                                                register_address, -1)
-
-        return reading
+        return self.read('RF_setup_bits')
     
     @property
     def get_min_wavelength(self):
@@ -909,12 +1505,7 @@ class RF_driver:
         int
             (wave) returns minimum usable wavelength of crystal.
         """
-        register_address = 0x34
-        comm_result, reading = nktp.registerReadU32(self.portname,
-                                                self.module_address,
-                                                register_address, -1)
-
-        return reading/1000
+        return self.read('min_wavelength')
     
     @property
     def get_max_wavelength(self):
@@ -926,12 +1517,7 @@ class RF_driver:
         int
             (wave) returns Maximum usable wavelength of crystal.
         """
-        register_address = 0x35
-        comm_result, reading = nktp.registerReadU32(self.portname,
-                                                self.module_address,
-                                                register_address, -1)
-
-        return reading/1000
+        return self.read('max_wavelength')
     
     @property
     def get_crystal_temperature(self):
@@ -943,12 +1529,7 @@ class RF_driver:
         int
             (temperature) returns temperature of crystal.
         """
-        register_address = 0x38
-        comm_result, reading = nktp.registerReadS16(self.portname,
-                                                self.module_address,
-                                                register_address, -1)
-
-        return reading/10
+        return self.read('crystal_temperature')
     
     @property
     def get_connected_crystal(self):
@@ -968,14 +1549,9 @@ class RF_driver:
         int
             (crystal index) returns index of connected crystal.
         """
-        register_address = 0x75
-        comm_result, reading = nktp.registerReadU8(self.portname,
-                                                self.module_address,
-                                                register_address, -1)
+        return self.read('connected_crystal')
 
-        return reading
-
-    def set_RF_power(self, state):
+    def set_RF_power(self, state, force=False):
         """
         Change RF power state to on/off
 
@@ -985,17 +1561,15 @@ class RF_driver:
         ----------
         state : bool
             True turns laser on, false turns emission off
+        force : bool, optional
+            Write even if the register is known to hold the value already.
         """
-        register_address = 0x30
-
         if state is True:
             print("RF driver on")
-            nktp.registerWriteU8(self.portname, self.module_address,
-                                register_address, 0x01, -1)
+            self._write_value('RF_power_status', 0x01, force)
         elif state is False:
             print("RF driver off")
-            nktp.registerWriteU8(self.portname, self.module_address,
-                                register_address, 0x00, -1)
+            self._write_value('RF_power_status', 0x00, force)
             
     def get_wavelength_channel(self, channel):
         """
@@ -1011,42 +1585,82 @@ class RF_driver:
         list of int
             A list of 32-bit unsigned integers representing the wavelengths.
         """
-        if channel not in self._wavelength_registers:
-            raise ValueError("Invalid channel number. Must be between 1 and 8.")
+        return self.read(self._channel_register('wavelength', channel))
 
-        register_address = self._wavelength_registers[channel]
-        comm_result, reading = nktp.registerReadU32(self.portname, self.module_address,
-                                                         register_address, -1)
-        
-        return reading/1000
-
-    def set_wavelength_channel(self, channel, wavelengths):
+    def set_wavelength_channel(self, channel, wavelengths, force=False):
         """
         Set the wavelength settings for the specified channel.
 
+        Each wavelength register holds four values for FSK (frequency shift
+        keying): with FSK enabled (see set_fsk_mode) the RF driver hops
+        between them on its FSK inputs, without any host communication.
+        A single wavelength writes only the first value.
+
         Parameters
         ----------
         channel : int
             The channel number (1 to 8).
-        wavelengths : list of int
-            A list of 32-bit unsigned integers. Only the first element is required if FSK mode is not used.
+        wavelengths : float or list of float
+            Wavelength in nm, or a list of 1 to 4 wavelengths in nm for FSK.
+            Missing FSK values are written as 0.
+        force : bool, optional
+            Write even if the register is known to hold the value already.
         """
-        if channel not in self._wavelength_registers:
-            raise ValueError("Invalid channel number. Must be between 1 and 8.")
+        name = self._channel_register('wavelength', channel)
+
+        print(f"Setting wavelength for channel {channel}")
+        if isinstance(wavelengths, (int, float)):
+            result = self._write_value(name, wavelengths, force)
+        else:
+            wavelengths = list(wavelengths)
+            if not 1 <= len(wavelengths) <= 4:
+                raise ValueError("FSK takes 1 to 4 wavelengths per channel.")
+            wavelengths.extend([0] * (4 - len(wavelengths)))
+            data = _fsk_values.pack(*[int(round(wave * 1000))
+                                      for wave in wavelengths])
+            result = self._write_register(self._registers[name].address,
+                                          'Array', data, force=force)
+        print(result)
+
+    def get_fsk_wavelengths(self, channel):
+        """
+        Reads all four FSK wavelengths of the specified channel.
 
-        register_address = self._wavelength_registers[channel]
+        Parameters
+        ----------
+        channel : int
+            The channel number (1 to 8).
 
-        # This is meant for FSK of wavelengths
-        # if len(wavelengths) == 1:
-        #     wavelengths.extend([0, 0, 0])  # Fill the rest with zeros if only one element is provided
+        Return
+        ------
+        tuple of float or None
+            The four wavelengths in nm, 0 for unused FSK values. None if the
+            read failed.
+        """
+        register = self._registers[self._channel_register('wavelength', channel)]
+        comm_result, data = self._read_register(register.address, 'Array')
+        if comm_result != 0:
+            return None
+        data = data[:_fsk_values.size].ljust(_fsk_values.size, b'\0')
+        return tuple(value / 1000 for value in _fsk_values.unpack(data))
 
-        # if len(wavelengths) != 4:
-        #     raise ValueError("Exactly 4 elements are required in the wavelength list")
+    def set_fsk_mode(self, mode, force=False):
+        """
+        Set the FSK mode of the RF driver by writing register 0x3B.
 
-        print(f"Setting wavelength for channel {channel}")
-        result = nktp.registerWriteU32(self.portname, self.module_address, register_address,
-                                                 int(wavelengths/0.001), -1)
-        print(result)
+        Parameters
+        ----------
+        mode : int
+            0 turns FSK off, so every channel uses its first wavelength.
+            Other values select the FSK source as listed in the RF driver
+            manual.
+        force : bool, optional
+            Write even if the register is known to hold the value already.
+        """
+        if type(mode) is int and 0 <= mode <= 255:
+            self._write_value('fsk_mode', mode, force)
+        else:
+            raise ValueError("FSK mode must be an integer from 0 to 255.")
         
     def get_amplitude_channel(self, channel):
         """
@@ -1062,17 +1676,9 @@ class RF_driver:
         int
             The amplitude in tenths of a percent (permille, ‰).
         """
-        if channel not in self._amplitude_registers:
-            raise ValueError("Invalid channel number. Must be between 1 and 8.")
-
-        register_address = self._amplitude_registers[channel]
-        comm_result, reading = nktp.registerReadU16(self.portname,
-                                                    self.module_address,
-                                                    register_address, -1)
+        return self.read(self._channel_register('amplitude', channel))
 
-        return reading/10
-
-    def set_amplitude_channel(self, channel, amplitude):
+    def set_amplitude_channel(self, channel, amplitude, force=False):
         """
         Set the amplitude setting for the specified channel.
 
@@ -1082,14 +1688,200 @@ class RF_driver:
             The channel number (1 to 8).
         amplitude : int
             The amplitude in tenths of a percent (permille, ‰). Must be between 0 and 1000.
+        force : bool, optional
+            Write even if the register is known to hold the value already.
         """
-        if channel not in self._amplitude_registers:
-            raise ValueError("Invalid channel number. Must be between 1 and 8.")
+        name = self._channel_register('amplitude', channel)
         if not (0 <= amplitude <= 100):
             raise ValueError("Amplitude must be between 0 and 100 (%).")
 
-        register_address = self._amplitude_registers[channel]
-
         print(f"Setting amplitude for channel {channel}")
-        nktp.registerWriteU16(self.portname, self.module_address, register_address,
-                                            int(amplitude/0.1), -1)
\ No newline at end of file
+        self._write_value(name, amplitude, force)
+
+    @property
+    def program(self):
+        """
+        Wavelengths of the loaded spectral program.
+
+        Return
+        ------
+        tuple of float
+            Wavelength in nm per channel, starting at channel 1.
+        """
+        return tuple(self._program)
+
+    @property
+    def active_wavelength(self):
+        """
+        Wavelength of the program channel that currently has amplitude.
+
+        Return
+        ------
+        float or None
+            Wavelength in nm, None if no program wavelength is selected.
+        """
+        if self._active_channel is None:
+            return None
+        return self._program[self._active_channel - 1]
+
+    def load_program(self, wavelengths, amplitude=100, force=False):
+        """
+        Preload a spectral program of up to 8 wavelengths.
+
+        Wavelength i is written to channel i (starting at 1) and all
+        amplitudes are set to 0, in one batched write. Afterwards
+        select_wavelength() switches between the program wavelengths by
+        moving the amplitude from one channel to another, without re-tuning.
+
+        Parameters
+        ----------
+        wavelengths : list of float
+            Wavelengths in nm, at most 8. All must lie inside the range of
+            the connected crystal.
+        amplitude : float
+            Amplitude in percent given to the selected wavelength.
+        force : bool, optional
+            Write even if the registers are known to hold the values already.
+
+        Raises
+        ------
+        ValueError
+            If there are more than 8 wavelengths, the amplitude is out of
+            range or a wavelength is outside the crystal range.
+        RuntimeError
+            If the crystal range cannot be read or a register write fails.
+        """
+        wavelengths = list(wavelengths)
+        if not 1 <= len(wavelengths) <= 8:
+            raise ValueError("A program holds 1 to 8 wavelengths.")
+        if not (0 <= amplitude <= 100):
+            raise ValueError("Amplitude must be between 0 and 100 (%).")
+        limits = self.read_many('min_wavelength', 'max_wavelength')
+        min_wave = limits['min_wavelength']
+        max_wave = limits['max_wavelength']
+        if min_wave is None or max_wave is None:
+            raise RuntimeError("Could not read the crystal range.")
+        outside = [wave for wave in wavelengths
+                   if not min_wave <= wave <= max_wave]
+        if outside:
+            raise ValueError("Wavelengths %s are outside the crystal range "
+                             "%g - %g nm." % (outside, min_wave, max_wave))
+
+        values = {'amplitude_channel_%d' % channel: 0
+                  for channel in range(1, 9)}
+        for channel, wave in enumerate(wavelengths, 1):
+            values['wavelength_channel_%d' % channel] = wave
+        results = self.write(force=force, **values)
+        failed = [name for name, result in results.items() if result != 0]
+        if failed:
+            self._program = ()
+            self._active_channel = None
+            raise RuntimeError("Could not load spectral program, failed: %s"
+                               % ', '.join(sorted(failed)))
+        self._program = wavelengths
+        self._program_amplitude = amplitude
+        self._active_channel = None
+        print(f"Loaded spectral program {wavelengths}")
+
+    def select_wavelength(self, wavelength):
+        """
+        Make one wavelength of the loaded program the active one.
+
+        Only the amplitudes of the previous and the new channel are written:
+        first 0 to the previous channel, then the amplitude to the new one,
+        so two wavelengths are never on at the same time. Nothing is written
+        if the wavelength is already active.
+
+        Parameters
+        ----------
+        wavelength : float
+            Wavelength in nm, one of RF_driver.program.
+
+        Raises
+        ------
+        ValueError
+            If wavelength is not part of the loaded program.
+        RuntimeError
+            If a register write fails. The active channel is then unknown
+            (None) if the previous channel was already switched off.
+        """
+        if wavelength not in self._program:
+            raise ValueError("Wavelength %s is not in the loaded program %s."
+                             % (wavelength, list(self._program)))
+        channel = self._program.index(wavelength) + 1
+        previous = self._active_channel
+        if previous not in (None, channel):
+            name = 'amplitude_channel_%d' % previous
+            if self.write(**{name: 0})[name] != 0:
+                raise RuntimeError("Could not switch off wavelength %s "
+                                   "(channel %d)." % (self._program[previous - 1],
+                                                      previous))
+            self._active_channel = None
+        name = 'amplitude_channel_%d' % channel
+        if self.write(**{name: self._program_amplitude})[name] != 0:
+            raise RuntimeError("Could not select wavelength %s (channel %d)."
+                               % (wavelength, channel))
+        self._active_channel = channel
+
+    def wait_until_crystal_ready(self, min_wave=None, max_wave=None,
+                                 timeout=5):
+        """
+        Wait until the RF driver reports a connected crystal.
+
+        Use after Select.set_switch_settings() instead of a fixed sleep.
+        Polls the connected crystal (register 0x75) and the usable range
+        (0x34, 0x35). While the RF switch settles the driver reports no
+        crystal (0) and an empty range; a failed read counts as not ready.
+
+        Parameters
+        ----------
+        min_wave, max_wave : float, optional
+            If given, also wait until the usable range of the connected
+            crystal covers min_wave to max_wave (nm).
+        timeout : float
+            Deadline in seconds.
+
+        Returns
+        -------
+        float
+            Seconds spent waiting, also recorded in wait_times.
+
+        Raises
+        ------
+        TimeoutError
+            If no suitable crystal is reported within timeout seconds.
+        """
+        def ready(values):
+            low = values['min_wavelength']
+            high = values['max_wavelength']
+            if not values['connected_crystal'] or low is None or not high:
+                return False
+            if min_wave is not None and low > min_wave:
+                return False
+            if max_wave is not None and high < max_wave:
+                return False
+            return True
+
+        return self.wait_until(
+            'crystal', ready,
+            ('connected_crystal', 'min_wavelength', 'max_wavelength'), timeout)
+
+    def wait_until_rf_on(self, timeout=2):
+        """
+        Wait until the RF driver reports RF power on (register 0x30).
+
+        Returns
+        -------
+        float
+            Seconds spent waiting, also recorded in wait_times.
+
+        Raises
+        ------
+        TimeoutError
+            If RF power is not on within timeout seconds.
+        """
+        def on(values):
+            status = values['RF_power_status']
+            return status is not None and status[0] == 1
+
+        return self.wait_until('rf_on', on, ('RF_power_status',), timeout)
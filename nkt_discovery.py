@@ -0,0 +1,177 @@
+"""
+Shared discovery of the NKT modules on all ports.
+
+Scanning a port with openPorts(autoMode=1) takes a noticeable time per port,
+so the bus is scanned once per process and the result is shared by every
+device class in nkt_device. The port/module map (the topology) is also saved
+to disk; on the next run it is verified by reading the module type register
+of each cached module, which is far quicker than a scan, and the bus is only
+rescanned when that check fails.
+
+Usage:
+    import nkt_discovery
+    topology = nkt_discovery.discover()   # {portname: {address: type}}
+    nkt_discovery.find(15, 0x88)          # ports with a Fianium at 15
+"""
+import concurrent.futures
+import json
+import os
+import threading
+
+import NKTP_DLL as nktp
+
+cache_path = os.getenv('NKT_TOPOLOGY_CACHE', os.path.join(
+    os.path.expanduser('~'), '.nkt_topology.json'))
+"""Topology cache file, may be overridden with NKT_TOPOLOGY_CACHE."""
+
+_topology = None
+_lock = threading.Lock()
+
+
+def _scan_port(portname, open_ports):
+    """Return {address: module type} of the modules found on portname."""
+    opened = portname not in open_ports
+    if opened:
+        result = nktp.openPorts(portname, 1, 1)
+        if result != 0:
+            return {}
+    result, types = nktp.deviceGetAllTypes(portname)
+    if opened:
+        nktp.closePorts(portname)
+    if result != 0:
+        return {}
+    return {address: module_type for address, module_type in enumerate(types)
+            if module_type}
+
+
+def scan():
+    """
+    Scan all ports in parallel for NKT modules.
+
+    Ports that were not open before are closed again afterwards; ports opened
+    elsewhere (e.g. in live mode) are left open.
+
+    Returns
+    -------
+    dict
+        {portname: {module address: module type}} for every port, with an
+        empty dict for ports without modules.
+    """
+    portnames = [p for p in nktp.getAllPorts().split(',') if p]
+    if not portnames:
+        return {}
+    open_ports = nktp.getOpenPorts().split(',')
+    with concurrent.futures.ThreadPoolExecutor(len(portnames)) as pool:
+        modules = list(pool.map(lambda p: _scan_port(p, open_ports),
+                                portnames))
+    return dict(zip(portnames, modules))
+
+
+def verify(topology):
+    """
+    Check that the ports are unchanged and every module still answers.
+
+    Reads the module type register (0x61) of all cached modules in one
+    batch, which costs about one bus transaction instead of a port scan.
+    A port that appeared or disappeared since the scan fails the check.
+
+    Returns
+    -------
+    bool
+        True if the topology still matches the bus.
+    """
+    if not topology:
+        return False
+    available = [p for p in nktp.getAllPorts().split(',') if p]
+    if sorted(available) != sorted(topology):
+        return False
+    requests = [(portname, address, [(0x61, 'U8')])
+                for portname, modules in topology.items()
+                for address in modules]
+    readings = nktp.registerReadManyPorts(requests)
+    expected = [module_type for modules in topology.values()
+                for module_type in modules.values()]
+    return all(reading[0] == (0, module_type)
+               for reading, module_type in zip(readings, expected))
+
+
+def load_cache(path=None):
+    """Return the topology saved in path, or None if there is none."""
+    try:
+        with open(path or cache_path) as cache_file:
+            saved = json.load(cache_file)
+        return {portname: {int(address): module_type
+                           for address, module_type in modules.items()}
+                for portname, modules in saved.items()}
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def save_cache(topology, path=None):
+    """Save topology to path; failures only print a warning."""
+    try:
+        with open(path or cache_path, 'w') as cache_file:
+            json.dump(topology, cache_file, indent=1)
+    except OSError as error:
+        print('Could not save NKT topology cache:', error)
+
+
+def discover(refresh=False):
+    """
+    Return the NKT bus topology, scanning the bus only when needed.
+
+    The topology is taken from, in order: this process (unless refresh),
+    the cache file if verify() accepts it, and finally a full scan(), which
+    is then saved to the cache file.
+
+    Parameters
+    ----------
+    refresh : bool
+        Ignore the cached topologies and scan the bus.
+
+    Returns
+    -------
+    dict
+        {portname: {module address: module type}}.
+    """
+    global _topology
+    with _lock:
+        if _topology is not None and not refresh:
+            return _topology
+        topology = None if refresh else load_cache()
+        if topology is None or not verify(topology):
+            topology = scan()
+            save_cache(topology)
+        _topology = topology
+        return topology
+
+
+def find(address, module_type):
+    """
+    Return the ports with a module of module_type at address.
+
+    Parameters
+    ----------
+    address : int
+        Module address, e.g. 15 for a Fianium.
+    module_type : int
+        Module type, e.g. 0x88 for a Fianium.
+
+    Returns
+    -------
+    list of str
+        Matching portnames, empty if the module was not found.
+    """
+    return [portname for portname, modules in discover().items()
+            if modules.get(address) == module_type]
+
+
+def forget():
+    """Drop the in-process topology and delete the cache file."""
+    global _topology
+    with _lock:
+        _topology = None
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
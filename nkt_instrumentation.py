@@ -0,0 +1,228 @@
+"""
+Latency and result code instrumentation of the NKTP_DLL functions.
+
+enable() wraps every DLL entry point of NKTP_DLL (through NKTP_DLL.addLayer)
+with a timer. Each call is recorded per function, port, module address and
+register: call count, latency histogram (power of two buckets) and the count
+of every result code. disable() removes the wrappers again, so nothing is
+measured, and nothing is paid, while instrumentation is off.
+
+Usage:
+    import nkt_instrumentation
+    recorder = nkt_instrumentation.enable()
+    ...                                 # run a sweep
+    nkt_instrumentation.disable()
+    recorder.report()                   # slowest registers first
+    recorder.export_json('nkt_calls.json')
+    recorder.export_csv('nkt_calls.csv')
+"""
+import csv
+import json
+import threading
+import time
+
+import NKTP_DLL as nktp
+
+_csv_fields = ('function', 'portname', 'devId', 'regId', 'count', 'errors',
+               'total_ms', 'mean_us', 'min_us', 'max_us', 'p50_us', 'p90_us',
+               'p99_us', 'results')
+
+
+def _result_name(function, result):
+    """Readable name of a result code returned by function."""
+    if result is None:
+        return 'None'
+    if function.startswith('register'):
+        return nktp.RegisterResultTypes(result)
+    if function.startswith('device'):
+        return nktp.DeviceResultTypes(result)
+    if function in ('openPorts', 'closePorts'):
+        return nktp.PortResultTypes(result)
+    if function.startswith('pointToPoint'):
+        return nktp.P2PPortResultTypes(result)
+    return str(result)
+
+
+class _Entry:
+    """Statistics of one (function, portname, devId, regId) key."""
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets', 'results')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.buckets = {}   # {bit length of latency in ns: count}
+        self.results = {}   # {result code: count}
+
+    def add(self, elapsed, result):
+        self.count += 1
+        self.total += elapsed
+        if self.min is None or elapsed < self.min:
+            self.min = elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        bucket = elapsed.bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.results[result] = self.results.get(result, 0) + 1
+
+    def percentile(self, fraction):
+        """Upper bound in us of the histogram bucket holding the fraction."""
+        threshold = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= threshold:
+                return min(1 << bucket, self.max) / 1e3
+        return self.max / 1e3
+
+
+class Recorder:
+    """
+    Collects call statistics of the NKTP_DLL functions.
+
+    Results are grouped by (function, portname, devId, regId); devId and
+    regId are None for functions without them. A result code of None means
+    the function returns no code.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def reset(self):
+        """Drop all recorded calls."""
+        with self._lock:
+            self._entries = {}
+            self.started = time.time()
+
+    def record(self, function, portname, devId, regId, elapsed, result):
+        """Add one call taking elapsed ns and returning result."""
+        key = (function, portname, devId, regId)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            entry.add(elapsed, result)
+
+    def wrap(self, name, func):
+        """NKTP_DLL layer: return func wrapped with a timer."""
+        record = self.record
+        clock = time.perf_counter_ns
+
+        def instrumented(*args):
+            start = clock()
+            output = func(*args)
+            elapsed = clock() - start
+            result = output[0] if type(output) is tuple else output
+            record(name,
+                   args[0] if args and type(args[0]) is str else None,
+                   args[1] if len(args) > 1 and type(args[1]) is int else None,
+                   args[2] if len(args) > 2 and name.startswith('register')
+                   else None,
+                   elapsed,
+                   result if type(result) is int else None)
+            return output
+        instrumented.__name__ = name
+        instrumented.__wrapped__ = func
+        return instrumented
+
+    def rows(self):
+        """
+        Return the statistics as one dict per key.
+
+        Returns
+        -------
+        list of dict
+            Keys as in _csv_fields plus 'histogram' ({'<= x us': count}).
+            'results' maps result names to counts; 'errors' counts results
+            other than success (0) and None.
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        rows = []
+        for (function, portname, devId, regId), entry in entries:
+            rows.append({
+                'function': function,
+                'portname': portname,
+                'devId': devId,
+                'regId': regId,
+                'count': entry.count,
+                'errors': sum(count for result, count in entry.results.items()
+                              if result not in (0, None)),
+                'total_ms': entry.total / 1e6,
+                'mean_us': entry.total / entry.count / 1e3,
+                'min_us': entry.min / 1e3,
+                'max_us': entry.max / 1e3,
+                'p50_us': entry.percentile(0.5),
+                'p90_us': entry.percentile(0.9),
+                'p99_us': entry.percentile(0.99),
+                'results': {_result_name(function, result): count
+                            for result, count in entry.results.items()},
+                'histogram': {'<= %g us' % ((1 << bucket) / 1e3): count
+                              for bucket, count in sorted(entry.buckets.items())},
+            })
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def export_json(self, path):
+        """Write rows() and the recording start time to a JSON file."""
+        with open(path, 'w') as output:
+            json.dump({'started': self.started, 'calls': self.rows()},
+                      output, indent=1)
+
+    def export_csv(self, path):
+        """Write rows() to a CSV file, results as 'name=count; ...'."""
+        with open(path, 'w', newline='') as output:
+            writer = csv.DictWriter(output, _csv_fields, extrasaction='ignore')
+            writer.writeheader()
+            for row in self.rows():
+                row['results'] = '; '.join('%s=%d' % item
+                                           for item in row['results'].items())
+                writer.writerow(row)
+
+    def report(self, top=10):
+        """Print the calls with the largest total time."""
+        print('%-22s %-8s %5s %5s %7s %6s %9s %9s %9s' % (
+            'function', 'port', 'dev', 'reg', 'count', 'errors', 'mean us',
+            'p99 us', 'total ms'))
+        for row in self.rows()[:top]:
+            print('%-22s %-8s %5s %5s %7d %6d %9.1f %9.1f %9.1f' % (
+                row['function'], row['portname'], row['devId'],
+                '-' if row['regId'] is None else '0x%02X' % row['regId'],
+                row['count'], row['errors'], row['mean_us'], row['p99_us'],
+                row['total_ms']))
+
+
+recorder = None
+"""The Recorder installed by enable(), None while disabled."""
+
+
+def enable(new_recorder=None):
+    """
+    Start recording NKTP_DLL calls.
+
+    Parameters
+    ----------
+    new_recorder : Recorder, optional
+        Recorder to use. A new one is created if not given.
+
+    Returns
+    -------
+    Recorder
+        The active recorder.
+    """
+    global recorder
+    disable()
+    recorder = new_recorder if new_recorder is not None else Recorder()
+    nktp.addLayer(recorder.wrap)
+    return recorder
+
+
+def disable():
+    """Stop recording; the NKTP_DLL functions are unwrapped again."""
+    global recorder
+    if recorder is not None:
+        nktp.removeLayer(recorder.wrap)
+        recorder = None
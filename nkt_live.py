@@ -0,0 +1,189 @@
+"""
+Push-based live register cache for NKT modules.
+
+In live mode the NKTP DLL keeps monitoring the registers created with
+registerCreate and reports every update through the register status
+callback. LiveRegisterCache stores those updates in memory, so reading a
+monitored register is a dictionary lookup instead of a bus transaction.
+
+The device classes in nkt_device opt in with enable_live(); see
+nkt_device._NKTModule.enable_live.
+"""
+import ctypes
+import struct
+import threading
+import time
+
+import NKTP_DLL as nktp
+import nkt_registers
+import nkt_session
+
+# RegisterDataTypes values used by registerCreate
+data_type_codes = {
+    'Array': 1, 'U8': 2, 'S8': 3, 'U16': 4, 'S16': 5, 'U32': 6, 'S32': 7,
+    'F32': 8, 'U64': 9, 'S64': 10, 'F64': 11, 'Ascii': 12,
+}
+
+# Precompiled decoders for the typed registers
+_structs = {data_type: struct.Struct('<' + code)
+            for data_type, code in nkt_registers.formats.items()}
+
+
+def decode(data, data_type, index=-1):
+    """
+    Decode raw register bytes as a registerReadXX function would.
+
+    Parameters
+    ----------
+    data : bytes
+        Raw register contents.
+    data_type : str
+        'U8', 'U16', 'S16', 'U32', ..., 'Array' or 'Ascii'.
+    index : int
+        Byte index into the register, -1 for the start.
+
+    Returns
+    -------
+    int, float or bytes
+        The decoded value, or None if data is too short for the type.
+    """
+    offset = max(index, 0)
+    if data_type == 'Array':
+        return data[offset:]
+    if data_type == 'Ascii':
+        return data[offset:].split(b'\0', 1)[0]
+    layout = _structs[data_type]
+    if offset + layout.size > len(data):
+        return None
+    return layout.unpack_from(data, offset)[0]
+
+
+class LiveRegisterCache:
+    """
+    Thread-safe in-memory copy of the registers pushed by the DLL.
+
+    Entries are written by the register status callback (on a DLL thread)
+    and read by any thread. Both sides only swap complete (timestamp, bytes)
+    tuples in a dict, which is atomic in CPython, so readers never lock.
+    """
+
+    def __init__(self):
+        self._entries = {}      # {(portname, devId, regId): (monotonic time, bytes)}
+        self._portnames = {}    # decoded callback portnames
+        self._callback = None
+        self._lock = threading.Lock()
+        self.updates = 0
+
+    def _on_register_status(self, portname, devId, regId, status, regType,
+                            regDataLen, regData):
+        # Runs inside the DLL; calling back into the DLL here is not allowed.
+        if status != 0:     # RegSuccess
+            return
+        name = self._portnames.get(portname)
+        if name is None:
+            name = self._portnames[portname] = portname.decode('ascii')
+        data = ctypes.string_at(regData, regDataLen) if regDataLen else b''
+        self._entries[(name, devId, regId)] = (time.monotonic(), data)
+        self.updates += 1
+
+    def install(self):
+        """Register this cache as the NKTP_DLL register status callback."""
+        with self._lock:
+            if self._callback is None:
+                self._callback = nktp.registerStatusCallbackFuncPtr(
+                    self._on_register_status)
+                nktp.setCallbackPtrRegisterInfo(self._callback)
+
+    def uninstall(self):
+        """Stop receiving register updates from the DLL."""
+        with self._lock:
+            if self._callback is not None:
+                nktp.setCallbackPtrRegisterInfo(None)
+                self._callback = None
+
+    def store(self, portname, devId, regId, data):
+        """Store register bytes, e.g. right after a confirmed write."""
+        self._entries[(portname, devId, regId)] = (time.monotonic(), bytes(data))
+
+    def invalidate(self, portname, devId, regId=None):
+        """Forget one register, or every register of a module."""
+        if regId is not None:
+            self._entries.pop((portname, devId, regId), None)
+            return
+        for key in list(self._entries):
+            if key[0] == portname and key[1] == devId:
+                self._entries.pop(key, None)
+
+    def raw(self, portname, devId, regId, max_age):
+        """
+        Return cached register bytes if they are at most max_age seconds old.
+
+        Returns
+        -------
+        bytes or None
+            None if the register is not cached or the entry is stale.
+        """
+        entry = self._entries.get((portname, devId, regId))
+        if entry is None or time.monotonic() - entry[0] > max_age:
+            return None
+        return entry[1]
+
+    def value(self, portname, devId, regId, data_type, max_age, index=-1):
+        """
+        Return a decoded register value if the cached entry is fresh.
+
+        Returns
+        -------
+        int, float, bytes or None
+            None if the register is not cached or the entry is stale.
+        """
+        data = self.raw(portname, devId, regId, max_age)
+        if data is None:
+            return None
+        return decode(data, data_type, index)
+
+
+cache = LiveRegisterCache()
+"""LiveRegisterCache shared by all devices; the DLL has one register callback."""
+
+def start(portname, devId, registers, priority=0):
+    """
+    Monitor registers of one module on portname.
+
+    The port is held open through nkt_session until stop() is called.
+
+    Parameters
+    ----------
+    portname : str
+        Port of the module.
+    devId : int
+        Module address.
+    registers : iterable of (int, str)
+        (register address, data type name) pairs to monitor.
+    priority : int
+        RegisterPriorityTypes value, 0 = low, 1 = high.
+
+    Raises
+    ------
+    RuntimeError
+        If the port or device cannot be set up for live monitoring.
+    """
+    cache.install()
+    nkt_session.acquire(portname)
+    result = nktp.deviceCreate(portname, devId, 1)
+    if result != 0:
+        stop(portname, devId)
+        raise RuntimeError('Could not create device %d on %s: %s'
+                           % (devId, portname, nktp.DeviceResultTypes(result)))
+    for register, data_type in registers:
+        nktp.registerCreate(portname, devId, register, priority,
+                            data_type_codes[data_type])
+    nktp.deviceSetLive(portname, devId, 1)
+
+
+def stop(portname, devId):
+    """Stop monitoring a module and release its port."""
+    nktp.deviceSetLive(portname, devId, 0)
+    nktp.registerRemoveAll(portname, devId)
+    cache.invalidate(portname, devId)
+    nkt_session.release(portname)
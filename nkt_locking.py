@@ -0,0 +1,282 @@
+"""
+Thread-safe access to the NKTP_DLL functions with one lock per port.
+
+enable() wraps the DLL entry points of NKTP_DLL (through NKTP_DLL.addLayer):
+
+- Calls on one port are serialized by the lock of that port; calls on
+  different ports run in parallel. openPorts/closePorts with several (or
+  all) ports take the locks of all of them, in a fixed order.
+- Calls made from inside a DLL status callback, which the DLL refuses with
+  "application busy", are queued instead. They run on a helper thread once
+  the callback has returned; the call returns a concurrent.futures.Future of
+  the result. The callback must therefore be installed after enable().
+
+hold() keeps a port for a sequence of calls, e.g. a read-modify-write. Calls
+made by the holder, including the batched reads it issues from the NKTP_DLL
+thread pool, are still serialized among themselves but never wait for other
+threads.
+
+The layer is opt-in: a single-threaded script talks to one port at a time
+anyway and would only pay for the locks. nkt_registry and nkt_telemetry,
+which call the DLL from worker threads, enable it; enable it yourself before
+sharing a port between threads. Running this module stress tests it on the
+simulated bus.
+
+Usage:
+    import nkt_locking
+    nkt_locking.enable()
+    with nkt_locking.hold('COM5'):
+        ...                             # no other thread talks to COM5
+"""
+import concurrent.futures
+import contextlib
+import contextvars
+import inspect
+import threading
+
+import NKTP_DLL as nktp
+
+_locks = {}         # {portname: RLock}
+_locks_lock = threading.Lock()
+
+_held = contextvars.ContextVar('nkt_held_ports', default={})
+"""{portname: Lock} of the ports held with hold() by the current context."""
+
+
+class _CallbackState(threading.local):
+    depth = 0       # nesting of DLL callbacks running on this thread
+
+
+_callback_state = _CallbackState()
+_callbacks = {}     # {setter name: wrapped callback}, kept alive for the DLL
+_deferred = None    # executor of the calls queued from callbacks
+
+deferred_calls = 0
+"""Number of calls queued because they were made inside a callback."""
+
+
+def port_lock(portname):
+    """Return the lock of portname, created on first use."""
+    lock = _locks.get(portname)
+    if lock is None:
+        with _locks_lock:
+            lock = _locks.setdefault(portname, threading.RLock())
+    return lock
+
+
+@contextlib.contextmanager
+def hold(*portnames):
+    """
+    Keep other threads off the given ports for the duration of the block.
+
+    Ports are locked in sorted order; ports already held by the caller are
+    skipped, so hold() nests.
+    """
+    held = _held.get()
+    needed = sorted(set(portnames).difference(held))
+    locks = [port_lock(portname) for portname in needed]
+    for lock in locks:
+        lock.acquire()
+    inner = dict(held)
+    inner.update((portname, threading.Lock()) for portname in needed)
+    token = _held.set(inner)
+    try:
+        yield
+    finally:
+        _held.reset(token)
+        for lock in reversed(locks):
+            lock.release()
+
+
+def in_callback():
+    """True while the current thread runs inside a DLL callback."""
+    return _callback_state.depth > 0
+
+
+def _defer(func, args):
+    """Queue func(*args) to run outside the callback, return its Future."""
+    global _deferred, deferred_calls
+    with _locks_lock:
+        if _deferred is None:
+            _deferred = concurrent.futures.ThreadPoolExecutor(
+                1, thread_name_prefix='nkt-deferred')
+        deferred_calls += 1
+    return _deferred.submit(func, *args)
+
+
+def _wrap_port_call(func):
+    def locked(*args):
+        if _callback_state.depth:
+            return _defer(locked, args)
+        portname = args[0]
+        lock = _held.get().get(portname) or _locks.get(portname) \
+            or port_lock(portname)
+        with lock:
+            return func(*args)
+    return locked
+
+
+def _wrap_ports_call(func):
+    def locked(portnames, *args):
+        if _callback_state.depth:
+            return _defer(locked, (portnames,) + args)
+        names = [p for p in portnames.split(',') if p] or list(_locks)
+        with hold(*names):
+            return func(portnames, *args)
+    return locked
+
+
+def _wrap_plain_call(func):
+    def deferrable(*args):
+        if _callback_state.depth:
+            return _defer(deferrable, args)
+        return func(*args)
+    return deferrable
+
+
+def _wrap_callback_setter(name, func):
+    def set_callback(callback):
+        if not callback:
+            _callbacks.pop(name, None)
+            return func(callback)
+
+        def guarded(*args):
+            _callback_state.depth += 1
+            try:
+                return callback(*args)
+            finally:
+                _callback_state.depth -= 1
+        wrapped = _callbacks[name] = type(callback)(guarded) \
+            if hasattr(callback, '_flags_') else guarded
+        return func(wrapped)
+    return set_callback
+
+
+def _first_parameter(name):
+    """Name of the first parameter of the NKTP_DLL function name."""
+    parameters = list(inspect.signature(nktp._native[name]).parameters)
+    return parameters[0] if parameters else None
+
+
+def layer(name, func):
+    """NKTP_DLL layer: return func wrapped with the port locking."""
+    if name.startswith('setCallbackPtr'):
+        wrapper = _wrap_callback_setter(name, func)
+    elif name not in nktp._native:
+        return func
+    else:
+        first = _first_parameter(name)
+        if first == 'portname':
+            wrapper = _wrap_port_call(func)
+        elif first == 'portnames':
+            wrapper = _wrap_ports_call(func)
+        else:
+            wrapper = _wrap_plain_call(func)
+    wrapper.__name__ = name
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def enable():
+    """Install the locking layer; enabling it twice has no effect."""
+    nktp.addLayer(layer)
+
+
+def disable():
+    """Remove the locking layer."""
+    nktp.removeLayer(layer)
+
+
+def enabled():
+    """True while the locking layer is installed."""
+    return layer in nktp._layers
+
+
+if __name__ == "__main__":
+    # Stress test on the simulated bus: several threads per port mixing
+    # single and batched reads, writes and status polls, while the live
+    # register callback itself reads from the bus.
+    import random
+    import sys
+    import time
+
+    import nkt_simulator
+
+    ports = {'COM_A': (15, 16, 18), 'COM_B': (15, 16, 18)}
+    threads_per_port = 4
+    calls_per_thread = 60
+
+    def worker(portname, seed):
+        choice = random.Random(seed).choice
+        for _ in range(calls_per_thread):
+            action = choice(('read', 'write', 'batch', 'status'))
+            if action == 'read':
+                result, _ = nktp.registerReadU16(portname, 15, 0x37, -1)
+            elif action == 'write':
+                result = nktp.registerWriteU16(portname, 15, 0x37,
+                                               choice(range(1000)), -1)
+            elif action == 'batch':
+                readings = nktp.registerReadMany(
+                    portname, 16, [(0x38, 'S16'), (0x34, 'U32'), (0x75, 'U8')])
+                result = max(reading[0] for reading in readings)
+            else:
+                result, _ = nktp.deviceGetStatusBits(portname, 15)
+            if result != 0:
+                failures.append((portname, action, result))
+
+    def from_callback(portname, devId, regId, status, regType, regDataLen,
+                      regData):
+        # Not allowed by the DLL; must be queued by the locking layer
+        callback_reads.append(nktp.registerReadU8(portname.decode('ascii'),
+                                                  devId, 0x30, -1))
+
+    def run(portnames):
+        threads = [threading.Thread(target=worker, args=(portname, seed))
+                   for portname in portnames
+                   for seed in range(threads_per_port)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    failed = False
+    for locking in (False, True):
+        failures = []
+        callback_reads = []
+        bus = nkt_simulator.install(ports=ports, latency=0.002, jitter=0.0005,
+                                    live_interval=0.01)
+        if locking:
+            enable()
+        else:
+            disable()
+        callback = nktp.registerStatusCallbackFuncPtr(from_callback)
+        nktp.setCallbackPtrRegisterInfo(callback)
+        nktp.openPorts('COM_A,COM_B', 0, 1)
+        for portname in ports:
+            nktp.deviceCreate(portname, 15, 0)
+            nktp.registerCreate(portname, 15, 0x37, 0, 4)
+            nktp.deviceSetLive(portname, 15, 1)
+        one_port = run(['COM_A'])
+        both_ports = run(list(ports))
+        for portname in ports:
+            nktp.deviceSetLive(portname, 15, 0)
+        time.sleep(0.05)
+        nktp.closePorts('')
+        nktp.setCallbackPtrRegisterInfo(None)
+        if _deferred is not None:
+            _deferred.submit(lambda: None).result()  # drain queued calls
+        overlaps = sum(stats['overlaps'] for stats in bus.stats.values())
+        busy = sum(stats['busy'] for stats in bus.stats.values())
+        print('locking %-5s: one port %.2f s, two ports %.2f s, '
+              'overlapping calls %d, busy in callback %d, failed calls %d'
+              % (locking, one_port, both_ports, overlaps, busy, len(failures)))
+        if locking:
+            failed = overlaps or busy or failures \
+                or both_ports > 1.5 * one_port
+            print('deferred from callback: %d' % deferred_calls)
+        nkt_simulator.uninstall()
+    disable()
+    print('FAILED' if failed else 'OK')
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,154 @@
+"""
+Declarative register maps for the NKT module classes.
+
+Each module class in nkt_device lists its registers once, as Register
+entries (name, address, data type, scale, access, decoder). From that table
+the module generates accessors for registers without a hand-written property,
+batches reads and writes, and decodes multi-register snapshots with a single
+precompiled struct layout.
+
+Scaling: value = raw / scale when reading, raw = round(value * scale) when
+writing. The optional decoder is applied to reads only, after scaling.
+"""
+import struct
+from collections import namedtuple
+
+# struct format characters of the RegisterDataTypes
+formats = {
+    'U8': 'B', 'S8': 'b', 'U16': 'H', 'S16': 'h', 'U32': 'I', 'S32': 'i',
+    'U64': 'Q', 'S64': 'q', 'F32': 'f', 'F64': 'd',
+}
+
+Register = namedtuple('Register',
+                      'name address data_type scale access decoder size pad',
+                      defaults=(False,))
+"""
+One module register.
+
+name : str
+    Attribute name of the register, also the key in snapshots.
+address : int
+    Register address.
+data_type : str
+    RegisterDataTypes name, 'U8', 'U16', ..., or 'Array' for raw bytes.
+scale : int or float or None
+    Raw units per unit of the value, e.g. 1000 for pm registers in nm.
+access : str
+    'r' for read-only, 'rw' for writable registers.
+decoder : callable or None
+    Converts the scaled value for display, e.g. into (bit, description).
+size : int
+    Number of bytes decoded from the register.
+pad : bool
+    Accept shorter reads, padded with zero bytes (little-endian), for
+    registers whose width depends on the value.
+"""
+
+
+def register(name, address, data_type, scale=None, access='r', decoder=None,
+             size=None, pad=False):
+    """
+    Create a Register, deriving size from data_type.
+
+    Parameters
+    ----------
+    size : int, optional
+        Required for 'Array' registers, the number of bytes to keep.
+    pad : bool
+        Zero-pad short reads, see Register.
+    """
+    if size is None:
+        if data_type == 'Array':
+            raise ValueError('Array register %s needs a size' % name)
+        size = struct.calcsize('<' + formats[data_type])
+    return Register(name, address, data_type, scale, access, decoder, size,
+                    pad)
+
+
+def encode(register, value):
+    """Return the raw register value to write for a value in units."""
+    if register.scale is not None:
+        return int(round(value * register.scale))
+    return value
+
+
+def convert(register, raw):
+    """Return the value in units of a raw register value (None stays None)."""
+    if raw is None:
+        return None
+    value = raw / register.scale if register.scale is not None else raw
+    if register.decoder is not None:
+        return register.decoder(value)
+    return value
+
+
+class Layout:
+    """
+    Precompiled struct layout of a sequence of registers.
+
+    The leading bytes of every register are joined and unpacked with one
+    struct call. Short reads of registers with pad set are padded with zero
+    bytes first. If a register is missing or too short, the registers are
+    unpacked one by one and the bad ones become None.
+
+    Parameters
+    ----------
+    registers : sequence of Register
+        Registers in the order of the raw data passed to unpack().
+    """
+
+    def __init__(self, registers):
+        self.registers = tuple(registers)
+        self.names = tuple(r.name for r in self.registers)
+        codes = [formats.get(r.data_type) or '%ds' % r.size
+                 for r in self.registers]
+        self.sizes = tuple(r.size for r in self.registers)
+        self._padded = tuple(index for index, r in enumerate(self.registers)
+                             if r.pad)
+        self._struct = struct.Struct('<' + ''.join(codes))
+        self._fields = tuple(struct.Struct('<' + code) for code in codes)
+
+    def unpack(self, chunks):
+        """
+        Unpack raw register bytes.
+
+        Parameters
+        ----------
+        chunks : sequence of bytes or None
+            Raw contents of each register, None for failed reads.
+
+        Returns
+        -------
+        list
+            Raw values, None where a register could not be decoded.
+        """
+        if self._padded:
+            chunks = list(chunks)
+            for index in self._padded:
+                chunk = chunks[index]
+                if chunk:
+                    chunks[index] = chunk.ljust(self.sizes[index], b'\x00')
+        try:
+            return list(self._struct.unpack(b''.join(
+                chunk[:size] for chunk, size in zip(chunks, self.sizes))))
+        except (struct.error, TypeError):
+            pass
+        values = []
+        for chunk, size, field in zip(chunks, self.sizes, self._fields):
+            if chunk is None or len(chunk) < size:
+                values.append(None)
+            else:
+                values.append(field.unpack_from(chunk)[0])
+        return values
+
+    def decode(self, chunks):
+        """
+        Unpack raw register bytes and convert them to values in units.
+
+        Returns
+        -------
+        dict
+            {register name: value}, None for registers that failed.
+        """
+        return {register.name: convert(register, raw)
+                for register, raw in zip(self.registers, self.unpack(chunks))}
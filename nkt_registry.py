@@ -0,0 +1,316 @@
+"""
+Registry of all NKT modules on the host, for setups with several lasers.
+
+Creating Fianium(), Select() or RF_driver() without a portname fails as soon
+as a second module of the same type is found on another port. The registry
+lists every module of the shared bus topology (see nkt_discovery) with its
+serial number and hands out one device object per module, looked up by
+serial number, port and/or class.
+
+Commands run on the worker thread of the module's port (see nkt_async),
+holding the port (see nkt_locking, enabled by the registry), so commands to
+different ports run concurrently and a second laser line does not queue
+behind the first one.
+
+Usage:
+    import nkt_registry, nkt_device
+    registry = nkt_registry.InstrumentRegistry()
+    registry.instruments()                      # every module found
+    laser_a = registry.get(serial='12345678')
+    laser_b = registry.get(nkt_device.Fianium, portname='COM6')
+    registry.run([(laser_a, 'set_power', 40), (laser_b, 'set_power', 60)])
+    with registry.lock(laser_a.portname):       # exclusive use of the port
+        ...
+    registry.close()
+"""
+import concurrent.futures
+import threading
+from collections import namedtuple
+
+import NKTP_DLL as nktp
+import nkt_async
+import nkt_device
+import nkt_discovery
+import nkt_locking
+
+device_classes = {cls._module_type: cls for cls in
+                  (nkt_device.Fianium, nkt_device.Select, nkt_device.RF_driver)}
+"""{module type: nkt_device class} of the modules the registry hands out."""
+
+Instrument = namedtuple('Instrument',
+                        'serial portname address module_type device_class')
+"""
+One NKT module on the bus.
+
+serial : str or None
+    Module serial number (register 0x65), None if it could not be read.
+portname : str
+    Port of the module.
+address : int
+    Module address.
+module_type : int
+    Module type, e.g. 0x88 for a Fianium.
+device_class : type
+    The nkt_device class of the module.
+"""
+
+
+def _read_serial(portname, address):
+    """Return the serial number of a module, or None."""
+    result, serial = nktp.deviceGetModuleSerialNumberStr(portname, address)
+    if result != 0:
+        return None
+    return serial.decode('ascii', 'replace').strip('\x00 ')
+
+
+class InstrumentRegistry:
+    """
+    All NKT modules of the host, with one device object per module.
+
+    Device objects are created on first use with their portname and module
+    address, so they never scan the bus themselves, two modules of a type on
+    one port (e.g. two Selects) get their own objects, and they are shared by
+    every caller of get().
+    """
+
+    def __init__(self):
+        nkt_locking.enable()    # commands run on one worker thread per port
+        self._instruments = None
+        self._devices = {}      # {(portname, address): device object}
+        self._lock = threading.Lock()
+
+    def instruments(self, refresh=False):
+        """
+        Return every known module on the bus.
+
+        The serial numbers are read once, in parallel across ports.
+
+        Parameters
+        ----------
+        refresh : bool
+            Rescan the bus (see nkt_discovery.discover) and reread serials.
+
+        Returns
+        -------
+        list of Instrument
+        """
+        with self._lock:
+            if self._instruments is not None and not refresh:
+                return list(self._instruments)
+            found = [(portname, address, module_type)
+                     for portname, modules
+                     in nkt_discovery.discover(refresh).items()
+                     for address, module_type in sorted(modules.items())
+                     if module_type in device_classes]
+            if found:
+                with concurrent.futures.ThreadPoolExecutor(len(found)) as pool:
+                    serials = list(pool.map(lambda module: _read_serial(
+                        *module[:2]), found))
+            else:
+                serials = []
+            self._instruments = [
+                Instrument(serial, portname, address, module_type,
+                           device_classes[module_type])
+                for serial, (portname, address, module_type)
+                in zip(serials, found)]
+            return list(self._instruments)
+
+    def find(self, device_class=None, serial=None, portname=None):
+        """
+        Return the modules matching all given criteria.
+
+        Parameters
+        ----------
+        device_class : type, optional
+            nkt_device.Fianium, Select or RF_driver.
+        serial : str, optional
+            Module serial number.
+        portname : str, optional
+            Port of the module.
+
+        Returns
+        -------
+        list of Instrument
+        """
+        return [instrument for instrument in self.instruments()
+                if (device_class is None
+                    or instrument.device_class is device_class)
+                and (serial is None or instrument.serial == serial)
+                and (portname is None or instrument.portname == portname)]
+
+    def get(self, device_class=None, serial=None, portname=None):
+        """
+        Return the device object of the one module matching the criteria.
+
+        Parameters
+        ----------
+        device_class, serial, portname
+            See find().
+
+        Returns
+        -------
+        nkt_device.Fianium, Select or RF_driver
+
+        Raises
+        ------
+        LookupError
+            If no module matches.
+        RuntimeError
+            If several modules match; narrow down by serial or portname.
+        """
+        found = self.find(device_class, serial, portname)
+        if not found:
+            raise LookupError('No NKT module found for class=%s serial=%s '
+                              'portname=%s' % (getattr(device_class, '__name__',
+                                                       None), serial, portname))
+        if len(found) > 1:
+            raise RuntimeError('Several NKT modules match, give a serial or '
+                               'portname: %s' % ', '.join(
+                                   '%s %s on %s' % (i.device_class.__name__,
+                                                    i.serial, i.portname)
+                                   for i in found))
+        return self.device(found[0])
+
+    def device(self, instrument):
+        """Return the device object of instrument, creating it once."""
+        key = (instrument.portname, instrument.address)
+        with self._lock:
+            device = self._devices.get(key)
+            if device is None:
+                device = self._devices[key] = instrument.device_class(
+                    instrument.portname, instrument.address)
+            return device
+
+    def devices(self, device_class=None):
+        """Return the device objects of every module of device_class."""
+        return [self.device(instrument)
+                for instrument in self.find(device_class)]
+
+    def lock(self, portname):
+        """
+        Return a context manager holding portname (see nkt_locking.hold),
+        e.g. to use a port's modules directly between registry commands.
+        """
+        return nkt_locking.hold(portname)
+
+    def _locked(self, portname, func, args, kwargs):
+        with nkt_locking.hold(portname):
+            return func(*args, **kwargs)
+
+    def submit(self, device, method, *args, **kwargs):
+        """
+        Call a method of device on the worker thread of its port.
+
+        Parameters
+        ----------
+        device : nkt_device._NKTModule
+            A device object, e.g. from get().
+        method : str
+            Name of the method, or of a property to read.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the return value.
+        """
+        attribute = getattr(type(device), method, None)
+        if isinstance(attribute, property):
+            func, args = attribute.fget, (device,)
+        else:
+            func = getattr(device, method)
+        return nkt_async.submit(device.portname, self._locked,
+                                device.portname, func, args, kwargs)
+
+    def run(self, calls):
+        """
+        Run calls on several devices concurrently and wait for all of them.
+
+        Calls on the same port keep their order; calls on different ports
+        overlap.
+
+        Parameters
+        ----------
+        calls : iterable of (device, method, *args)
+            See submit().
+
+        Returns
+        -------
+        list
+            The return values, in the order of calls. The first exception
+            raised by a call is raised after all calls have finished.
+        """
+        futures = [self.submit(device, method, *args)
+                   for device, method, *args in calls]
+        concurrent.futures.wait(futures)
+        return [future.result() for future in futures]
+
+    def broadcast(self, device_class, method, *args, **kwargs):
+        """
+        Call a method on every module of device_class concurrently.
+
+        Example: registry.broadcast(nkt_device.Fianium, 'set_emission', False)
+
+        Returns
+        -------
+        dict
+            {serial or portname: return value}.
+        """
+        instruments = self.find(device_class)
+        futures = [self.submit(self.device(instrument), method, *args,
+                               **kwargs) for instrument in instruments]
+        concurrent.futures.wait(futures)
+        return {instrument.serial or instrument.portname: future.result()
+                for instrument, future in zip(instruments, futures)}
+
+    def close(self):
+        """Close every device object handed out by the registry."""
+        with self._lock:
+            devices = list(self._devices.values())
+            self._devices.clear()
+        for device in devices:
+            device.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == "__main__":
+    # Command latency on one laser, alone and with a second laser busy
+    import time
+
+    import nkt_simulator
+
+    nkt_simulator.install(ports={'COM_A': (15, 16, 18), 'COM_B': (15, 16, 18)},
+                          scan_time=0.05)
+    with InstrumentRegistry() as registry:
+        for instrument in registry.instruments():
+            print(instrument)
+        laser_a, laser_b = registry.devices(nkt_device.Fianium)
+
+        def latency(busy):
+            if busy:
+                load = [registry.submit(laser_b, 'snapshot') for _ in range(20)]
+            start = time.perf_counter()
+            registry.run([(laser_a, 'power_level')] * 20)
+            elapsed = (time.perf_counter() - start) / 20
+            if busy:
+                concurrent.futures.wait(load)
+            return elapsed
+
+        print('Laser A command: %.1f ms alone, %.1f ms with laser B busy'
+              % (latency(False) * 1e3, latency(True) * 1e3))
+    nkt_simulator.uninstall()
+
+    # Two Selects on one port, told apart by their module address
+    nkt_simulator.install(ports={'COM_A': (15, 16, 18, 19)}, scan_time=0.05)
+    with InstrumentRegistry() as registry:
+        select_a, select_b = registry.devices(nkt_device.Select)
+        select_b.set_switch_settings(1)
+        print('Selects at addresses %d and %d, switch settings %s and %s'
+              % (select_a.module_address, select_b.module_address,
+                 select_a.get_switch_settings[0],
+                 select_b.get_switch_settings[0]))
+    nkt_simulator.uninstall()
@@ -0,0 +1,91 @@
+"""
+Process-wide NKT port session with reference-counted open ports.
+
+Register functions on a port that is not open go through the DLL's dedicated
+path, which opens and closes the port around every transaction. The session
+keeps a port open as long as at least one user (a Fianium, Select or
+RF_driver object, live monitoring, ...) needs it, so every register access
+after the first takes the fast path. Ports still open at interpreter exit are
+closed by an atexit hook.
+
+Usage:
+    import nkt_session
+    nkt_session.acquire('COM5')     # opens COM5
+    nkt_session.acquire('COM5')     # second user, port stays open
+    nkt_session.release('COM5')
+    nkt_session.release('COM5')     # last user, closes COM5
+"""
+import atexit
+import threading
+
+import NKTP_DLL as nktp
+
+
+class PortSession:
+    """
+    Reference counts of the open NKT ports.
+
+    Ports are opened without auto scan (discovery is done by nkt_discovery)
+    and in live mode, so nkt_live can monitor registers on the same port.
+    """
+
+    def __init__(self):
+        self._users = {}        # {portname: number of users}
+        self._lock = threading.Lock()
+
+    def acquire(self, portname):
+        """
+        Open portname, or add a user to it if it is already open.
+
+        Raises
+        ------
+        RuntimeError
+            If the port cannot be opened.
+        """
+        with self._lock:
+            users = self._users.get(portname, 0)
+            if users == 0:
+                result = nktp.openPorts(portname, 0, 1)
+                if result != 0:
+                    raise RuntimeError('Could not open %s: %s'
+                                       % (portname, nktp.PortResultTypes(result)))
+            self._users[portname] = users + 1
+
+    def release(self, portname):
+        """Remove a user from portname; the last user closes the port."""
+        with self._lock:
+            users = self._users.get(portname, 0) - 1
+            if users > 0:
+                self._users[portname] = users
+                return
+            if self._users.pop(portname, None) is not None:
+                nktp.closePorts(portname)
+
+    def users(self, portname):
+        """Return the number of users of portname."""
+        return self._users.get(portname, 0)
+
+    @property
+    def open_ports(self):
+        """`list` of str: Ports held open by this session."""
+        return list(self._users)
+
+    def close_all(self):
+        """Close every port of the session regardless of its users."""
+        with self._lock:
+            portnames = list(self._users)
+            self._users.clear()
+        for portname in portnames:
+            try:
+                nktp.closePorts(portname)
+            except Exception as error:
+                print('Could not close %s: %s' % (portname, error))
+
+
+session = PortSession()
+"""PortSession shared by all NKT modules of the process."""
+
+acquire = session.acquire
+release = session.release
+
+atexit.register(session.close_all)
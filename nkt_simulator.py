@@ -0,0 +1,669 @@
+"""
+Register-level simulator of an NKT Photonics Interbus.
+
+Stands in for NKTPDLL.dll behind the NKTP_DLL function surface so that
+nkt_device.Fianium, Select and RF_driver can be exercised and benchmarked on
+a machine without the lasers (or without Windows). Every transaction pays a
+configurable latency with gaussian jitter, so the relative cost of sweeps and
+status polling matches what is seen on the real serial bus. While installed,
+the nkt_discovery topology cache points at a temporary file, so simulated
+ports never end up in the cache of the real bus.
+
+Usage:
+    import nkt_simulator
+    bus = nkt_simulator.install(latency=0.005, jitter=0.001)
+    laser = nkt_device.Fianium()   # found on the simulated port
+    ...
+    nkt_simulator.uninstall()
+"""
+import ctypes
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+
+import NKTP_DLL as nktp
+import nkt_discovery
+
+# Module types reported by deviceGetAllTypes, as checked in nkt_device
+FIANIUM_TYPE = 0x88
+RF_DRIVER_TYPE = 0x66
+SELECT_TYPE = 0x67
+
+
+def _u8(value):
+    return struct.pack('<B', value)
+
+
+def _u16(value):
+    return struct.pack('<H', value)
+
+
+def _s16(value):
+    return struct.pack('<h', value)
+
+
+def _u32(*values):
+    return struct.pack('<%dI' % len(values), *values)
+
+
+def fianium_registers():
+    """
+    Default register map of a SuperK Fianium (module address 15).
+
+    Returns
+    -------
+    (dict, set)
+        {register address: bytes} and the set of read-only addresses.
+    """
+    registers = {
+        0x30: _u8(0),           # Emission (0 off, 3 on)
+        0x31: _u16(0),          # Setup
+        0x32: bytes([2, 0]),    # Interlock (LSB, MSB): interlock is OK
+        0x34: _u16(1),          # Pulse picker ratio
+        0x36: _u8(0),           # Watchdog interval
+        0x37: _u16(0),          # Power level (permille)
+        0x39: _u16(0),          # NIM delay
+        0x61: _u8(FIANIUM_TYPE),
+        0x66: _u16(0),          # Status bits
+    }
+    return registers, {0x32, 0x61, 0x66}
+
+
+def rf_driver_registers(crystal_min=640000, crystal_max=1100000):
+    """
+    Default register map of a SuperK Select RF driver (module address 16).
+
+    Parameters
+    ----------
+    crystal_min, crystal_max : int
+        Usable range of the initially connected crystal in pm.
+
+    Returns
+    -------
+    (dict, set)
+        {register address: bytes} and the set of read-only addresses.
+    """
+    registers = {
+        0x30: _u8(0),               # RF power
+        0x31: _u8(0),               # Setup bits
+        0x34: _u32(crystal_min),    # Minimum wavelength (pm)
+        0x35: _u32(crystal_max),    # Maximum wavelength (pm)
+        0x38: _s16(245),            # Crystal temperature (0.1 C)
+        0x3B: _u8(0),               # FSK mode
+        0x61: _u8(RF_DRIVER_TYPE),
+        0x66: _u16(0),              # Status bits
+        0x75: _u8(1),               # Connected crystal
+    }
+    for channel in range(8):
+        registers[0x90 + channel] = _u32(0, 0, 0, 0)   # Wavelength (FSK x4)
+        registers[0xB0 + channel] = _u16(0)            # Amplitude (permille)
+    return registers, {0x34, 0x35, 0x38, 0x61, 0x66, 0x75}
+
+
+def select_registers(crystal_1=(640000, 1100000), crystal_2=(1100000, 2000000)):
+    """
+    Default register map of a SuperK Select (module address 18).
+
+    Parameters
+    ----------
+    crystal_1, crystal_2 : (int, int)
+        (minimum, maximum) usable wavelength of each crystal in pm.
+
+    Returns
+    -------
+    (dict, set)
+        {register address: bytes} and the set of read-only addresses.
+    """
+    registers = {
+        0x34: _u8(0),               # RF switch
+        0x61: _u8(SELECT_TYPE),
+        0x66: _u16(0),
+        0x90: _u32(crystal_1[0]),
+        0x91: _u32(crystal_1[1]),
+        0xA0: _u32(crystal_2[0]),
+        0xA1: _u32(crystal_2[1]),
+    }
+    return registers, {0x61, 0x66, 0x90, 0x91, 0xA0, 0xA1}
+
+
+class _Module:
+    """Register storage of one simulated module."""
+
+    def __init__(self, module_type, registers, read_only):
+        self.module_type = module_type
+        self.registers = dict(registers)
+        self.read_only = set(read_only)
+
+
+class SimulatedBus:
+    """
+    Simulated NKT Interbus exposing the NKTP_DLL function surface.
+
+    Each port holds modules at fixed addresses; by default one port carrying
+    a Fianium (15), an RF driver (16) and a Select (18). Transactions on one
+    port are serialized for `wire_time` (the telegram on the wire) and then
+    wait `latency` +/- `jitter` for the module to answer. Accessing a port
+    that has not been opened with openPorts() additionally pays
+    `dedicated_overhead`, like the dedicated read path of the DLL.
+
+    `stats` counts per port the reads and writes, the overlaps (transactions
+    started while another one was in progress on the port) and the busy
+    calls (register access from inside the register status callback, which
+    fails with application busy as on the DLL).
+
+    Parameters
+    ----------
+    ports : dict, optional
+        {portname: iterable of module addresses}. Supported addresses are
+        15 (Fianium), 16 (RF driver) and 18, 19 (first and second Select).
+    latency : float
+        Mean per-transaction response time in seconds.
+    jitter : float
+        Standard deviation of the response time in seconds.
+    wire_time : float
+        Time a transaction occupies the port exclusively, in seconds.
+    dedicated_overhead : float
+        Extra time per transaction on a closed port, in seconds.
+    scan_time : float
+        Time openPorts() spends scanning a port in auto mode, in seconds.
+    switch_delay : float
+        Time the RF driver needs to report a new crystal after the Select
+        RF switch is written, in seconds.
+    emission_delay : float
+        Time between enabling emission and the "Emission on" status bit.
+    live_interval : float
+        Polling period of the live mode monitor, in seconds. Registers
+        created with registerCreate on live devices are pushed through the
+        register status callback whenever their contents change.
+    seed : int, optional
+        Seed for the jitter random generator.
+    """
+
+    def __init__(self, ports=None, latency=0.005, jitter=0.001,
+                 wire_time=0.0005, dedicated_overhead=0.015, scan_time=0.5,
+                 switch_delay=0.5, emission_delay=1.0, live_interval=0.05,
+                 seed=None):
+        if ports is None:
+            ports = {'COM_SIM': (15, 16, 18)}
+        self.latency = latency
+        self.jitter = jitter
+        self.wire_time = wire_time
+        self.dedicated_overhead = dedicated_overhead
+        self.scan_time = scan_time
+        self.switch_delay = switch_delay
+        self.emission_delay = emission_delay
+        self.live_interval = live_interval
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()   # guards register contents and stats
+        self._wire = {}                 # per-port locks modelling the bus
+        self._in_flight = {}            # {portname: transactions in progress}
+        self._callback_thread = threading.local()   # .active inside callbacks
+        self._modules = {}              # {portname: {address: _Module}}
+        self._open_ports = []
+        self._pending = []              # [(due time, portname, devId, regId, data)]
+        self.stats = {}                 # {portname: {'reads': n, ...}}
+        self._created = {}              # {(portname, devId): {regId: dataType}}
+        self._live = set()              # (portname, devId) in live mode
+        self._pushed = {}               # {(portname, devId, regId): bytes}
+        self._callback = None
+        self._monitor = None
+        for portname, addresses in ports.items():
+            self.add_port(portname, addresses)
+
+    def add_port(self, portname, addresses):
+        """
+        Add a port with modules at the given addresses.
+
+        Parameters
+        ----------
+        portname : str
+            Name of the simulated port, e.g. 'COM5'.
+        addresses : iterable of int
+            Module addresses present on the port (15, 16, 18 and/or 19).
+        """
+        modules = {}
+        for address in addresses:
+            if address == 15:
+                modules[address] = _Module(FIANIUM_TYPE, *fianium_registers())
+            elif address == 16:
+                modules[address] = _Module(RF_DRIVER_TYPE, *rf_driver_registers())
+            elif address in (18, 19):
+                modules[address] = _Module(SELECT_TYPE, *select_registers())
+            else:
+                raise ValueError('No register map for module address %d' % address)
+            # Module serial number (0x65), unique per simulated module
+            modules[address].registers[0x65] = ('%s-%d' % (portname, address)).encode('ascii')
+            modules[address].read_only.add(0x65)
+        self._modules[portname] = modules
+        self._wire[portname] = threading.Lock()
+        self._in_flight[portname] = 0
+        self.stats[portname] = {'reads': 0, 'writes': 0, 'overlaps': 0,
+                                'busy': 0}
+
+    def poke(self, portname, devId, regId, data):
+        """Set raw register bytes directly, without bus latency."""
+        with self._lock:
+            self._modules[portname][devId].registers[regId] = bytes(data)
+
+    def peek(self, portname, devId, regId):
+        """Return raw register bytes directly, without bus latency."""
+        with self._lock:
+            self._apply_pending()
+            return self._modules[portname][devId].registers[regId]
+
+    # -- transaction model -------------------------------------------------
+
+    def _transaction(self, portname):
+        """Spend the time of one bus transaction on portname."""
+        with self._lock:
+            if self._in_flight[portname]:
+                self.stats[portname]['overlaps'] += 1
+            self._in_flight[portname] += 1
+        try:
+            with self._wire[portname]:
+                time.sleep(self.wire_time)
+            delay = self.latency
+            if self.jitter:
+                delay += self._random.gauss(0, self.jitter)
+            if portname not in self._open_ports:
+                delay += self.dedicated_overhead
+            if delay > 0:
+                time.sleep(delay)
+        finally:
+            with self._lock:
+                self._in_flight[portname] -= 1
+
+    def _busy(self, portname):
+        """True (and counted) for a call made inside a status callback."""
+        if not getattr(self._callback_thread, 'active', False):
+            return False
+        with self._lock:
+            if portname in self.stats:
+                self.stats[portname]['busy'] += 1
+        return True
+
+    def _apply_pending(self):
+        """Apply scheduled register changes that are due. Requires _lock."""
+        if not self._pending:
+            return
+        now = time.monotonic()
+        remaining = []
+        for due, portname, devId, regId, data in self._pending:
+            if due <= now:
+                self._modules[portname][devId].registers[regId] = data
+            else:
+                remaining.append((due, portname, devId, regId, data))
+        self._pending = remaining
+
+    def _schedule(self, delay, portname, devId, regId, data):
+        """Change a register after delay seconds. Requires _lock."""
+        self._pending.append((time.monotonic() + delay, portname, devId,
+                              regId, bytes(data)))
+
+    def _locate(self, portname, devId, regId):
+        """Return (result, module) for a register access."""
+        if portname not in self._modules:
+            return 13, None     # RegResultPortNotFound
+        module = self._modules[portname].get(devId)
+        if module is None:
+            return 12, None     # RegResultDeviceNotFound
+        if regId not in module.registers:
+            return 11, None     # RegResultRegisterNotFound
+        return 0, module
+
+    def _read(self, portname, devId, regId, index, size=None):
+        """Read size bytes (all if None) from index. Returns (result, bytes)."""
+        if self._busy(portname):
+            return 15, b''      # RegResultApplicationBusy
+        if portname in self._wire:
+            self._transaction(portname)
+        with self._lock:
+            self._apply_pending()
+            result, module = self._locate(portname, devId, regId)
+            if result != 0:
+                return result, b''
+            self.stats[portname]['reads'] += 1
+            data = module.registers[regId]
+            if regId == 0x38 and module.module_type == RF_DRIVER_TYPE:
+                # Crystal temperature drifts slightly between readings
+                temperature = struct.unpack('<h', data)[0]
+                temperature += self._random.choice((-1, 0, 0, 1))
+                data = module.registers[regId] = _s16(temperature)
+        offset = max(index, 0)
+        if size is None:
+            return 0, data[offset:]
+        if offset + size > len(data):
+            return 8, b''       # RegResultTypeError
+        return 0, data[offset:offset + size]
+
+    def _write(self, portname, devId, regId, data, index):
+        """Write bytes at index (0 when index is -1). Returns result."""
+        if self._busy(portname):
+            return 15           # RegResultApplicationBusy
+        if portname in self._wire:
+            self._transaction(portname)
+        with self._lock:
+            self._apply_pending()
+            result, module = self._locate(portname, devId, regId)
+            if result != 0:
+                return result
+            if regId in module.read_only:
+                return 4        # RegResultNacked
+            self.stats[portname]['writes'] += 1
+            offset = max(index, 0)
+            current = module.registers[regId]
+            if offset + len(data) > len(current):
+                current = current + bytes(offset + len(data) - len(current))
+            module.registers[regId] = (current[:offset] + bytes(data)
+                                       + current[offset + len(data):])
+            self._side_effects(portname, devId, regId, module)
+        return 0
+
+    def _side_effects(self, portname, devId, regId, module):
+        """Model register interactions between modules. Requires _lock."""
+        modules = self._modules[portname]
+        if module.module_type == SELECT_TYPE and regId == 0x34:
+            rf_driver = modules.get(16)
+            if rf_driver is None:
+                return
+            swapped = module.registers[0x34][0] == 1
+            low, high = (0xA0, 0xA1) if swapped else (0x90, 0x91)
+            # RF driver reports no crystal while the switch settles
+            rf_driver.registers[0x75] = _u8(0)
+            rf_driver.registers[0x34] = _u32(0)
+            rf_driver.registers[0x35] = _u32(0)
+            self._schedule(self.switch_delay, portname, 16, 0x75,
+                           _u8(2 if swapped else 1))
+            self._schedule(self.switch_delay, portname, 16, 0x34,
+                           module.registers[low])
+            self._schedule(self.switch_delay, portname, 16, 0x35,
+                           module.registers[high])
+        elif module.module_type == FIANIUM_TYPE and regId == 0x30:
+            status = struct.unpack('<H', module.registers[0x66])[0]
+            if module.registers[0x30][0] == 3:
+                self._schedule(self.emission_delay, portname, devId, 0x66,
+                               _u16(status | 0x0001))
+            else:
+                module.registers[0x66] = _u16(status & ~0x0001)
+
+    def _monitor_loop(self):
+        """Push changed registers of live devices to the status callback."""
+        while self._live:
+            time.sleep(self.live_interval)
+            updates = []
+            with self._lock:
+                self._apply_pending()
+                for portname, devId in list(self._live):
+                    if portname not in self._open_ports:
+                        continue
+                    module = self._modules[portname].get(devId)
+                    created = self._created.get((portname, devId), {})
+                    for regId, dataType in created.items():
+                        data = module.registers.get(regId)
+                        key = (portname, devId, regId)
+                        if data is not None and self._pushed.get(key) != data:
+                            self._pushed[key] = data
+                            updates.append((portname, devId, regId,
+                                            dataType, data))
+            callback = self._callback
+            if callback is None:
+                continue
+            # Like the DLL, refuse calls made from inside the callback
+            self._callback_thread.active = True
+            try:
+                for portname, devId, regId, dataType, data in updates:
+                    buffer = ctypes.create_string_buffer(data, len(data))
+                    callback(portname.encode('ascii'), devId, regId, 0,
+                             dataType, len(data), ctypes.addressof(buffer))
+            finally:
+                self._callback_thread.active = False
+
+    # -- NKTP_DLL port functions --------------------------------------------
+
+    def getAllPorts(self):
+        return ','.join(self._modules)
+
+    def getOpenPorts(self):
+        return ','.join(self._open_ports)
+
+    def openPorts(self, portnames, autoMode, liveMode):
+        names = [p for p in portnames.split(',') if p] or list(self._modules)
+        for portname in names:
+            if portname not in self._modules:
+                return 2        # OPPortNotFound
+        for portname in names:
+            if autoMode:
+                time.sleep(self.scan_time)
+            if portname not in self._open_ports:
+                self._open_ports.append(portname)
+        return 0
+
+    def closePorts(self, portnames):
+        names = [p for p in portnames.split(',') if p] or list(self._open_ports)
+        for portname in names:
+            if portname in self._open_ports:
+                self._open_ports.remove(portname)
+        return 0
+
+    # -- NKTP_DLL device functions ------------------------------------------
+
+    def deviceGetAllTypes(self, portname):
+        if portname not in self._open_ports:
+            return 4, b''       # DevResultPortNotFound
+        types = bytearray(255)
+        for address, module in self._modules[portname].items():
+            types[address] = module.module_type
+        return 0, bytes(types)
+
+    def deviceGetType(self, portname, devId):
+        result, data = self._read(portname, devId, 0x61, -1)
+        if result != 0:
+            return 3, 0         # DevResultDeviceNotFound
+        return 0, data[0]
+
+    def deviceGetStatusBits(self, portname, devId):
+        result, data = self._read(portname, devId, 0x66, -1, 2)
+        if result != 0:
+            return 3, 0
+        return 0, struct.unpack('<H', data)[0]
+
+    def deviceGetModuleSerialNumberStr(self, portname, devId):
+        result, data = self._read(portname, devId, 0x65, -1)
+        if result != 0:
+            return 3, b''
+        return 0, data
+
+    def deviceCreate(self, portname, devId, waitReady):
+        if portname not in self._open_ports:
+            return 4            # DevResultPortNotFound
+        if devId not in self._modules[portname]:
+            return 3            # DevResultDeviceNotFound
+        with self._lock:
+            self._created.setdefault((portname, devId), {})
+        return 0
+
+    def deviceSetLive(self, portname, devId, liveMode):
+        with self._lock:
+            if (portname, devId) not in self._created:
+                return 3        # DevResultDeviceNotFound
+            if not liveMode:
+                self._live.discard((portname, devId))
+                return 0
+            self._live.add((portname, devId))
+            if self._monitor is None or not self._monitor.is_alive():
+                self._monitor = threading.Thread(target=self._monitor_loop,
+                                                 daemon=True)
+                self._monitor.start()
+        return 0
+
+    def setCallbackPtrRegisterInfo(self, RegisterStatusCallback):
+        self._callback = RegisterStatusCallback
+
+    # -- NKTP_DLL register functions ----------------------------------------
+
+    def registerCreate(self, portname, devId, regId, priority, dataType):
+        with self._lock:
+            created = self._created.get((portname, devId))
+            if created is None:
+                return 12       # RegResultDeviceNotFound
+            created[regId] = dataType
+            self._pushed.pop((portname, devId, regId), None)
+        return 0
+
+    def registerRemoveAll(self, portname, devId):
+        with self._lock:
+            created = self._created.get((portname, devId), {})
+            for regId in created:
+                self._pushed.pop((portname, devId, regId), None)
+            created.clear()
+        return 0
+
+    def registerRead(self, portname, devId, regId, index):
+        return self._read(portname, devId, regId, index)
+
+    def _read_typed(self, fmt, portname, devId, regId, index):
+        result, data = self._read(portname, devId, regId, index,
+                                  struct.calcsize(fmt))
+        if result != 0:
+            return result, 0
+        return result, struct.unpack(fmt, data)[0]
+
+    def registerReadU8(self, portname, devId, regId, index):
+        return self._read_typed('<B', portname, devId, regId, index)
+
+    def registerReadS8(self, portname, devId, regId, index):
+        return self._read_typed('<b', portname, devId, regId, index)
+
+    def registerReadU16(self, portname, devId, regId, index):
+        return self._read_typed('<H', portname, devId, regId, index)
+
+    def registerReadS16(self, portname, devId, regId, index):
+        return self._read_typed('<h', portname, devId, regId, index)
+
+    def registerReadU32(self, portname, devId, regId, index):
+        return self._read_typed('<I', portname, devId, regId, index)
+
+    def registerReadS32(self, portname, devId, regId, index):
+        return self._read_typed('<i', portname, devId, regId, index)
+
+    def registerReadU64(self, portname, devId, regId, index):
+        return self._read_typed('<Q', portname, devId, regId, index)
+
+    def registerReadS64(self, portname, devId, regId, index):
+        return self._read_typed('<q', portname, devId, regId, index)
+
+    def registerReadF32(self, portname, devId, regId, index):
+        return self._read_typed('<f', portname, devId, regId, index)
+
+    def registerReadF64(self, portname, devId, regId, index):
+        return self._read_typed('<d', portname, devId, regId, index)
+
+    def registerWrite(self, portname, devId, regId, writeData, writeSize, index):
+        return self._write(portname, devId, regId, bytes(writeData[:writeSize]),
+                           index)
+
+    def _write_typed(self, fmt, portname, devId, regId, value, index):
+        try:
+            data = struct.pack(fmt, value)
+        except struct.error:
+            return 8            # RegResultTypeError
+        return self._write(portname, devId, regId, data, index)
+
+    def registerWriteU8(self, portname, devId, regId, value, index):
+        return self._write_typed('<B', portname, devId, regId, value, index)
+
+    def registerWriteS8(self, portname, devId, regId, value, index):
+        return self._write_typed('<b', portname, devId, regId, value, index)
+
+    def registerWriteU16(self, portname, devId, regId, value, index):
+        return self._write_typed('<H', portname, devId, regId, value, index)
+
+    def registerWriteS16(self, portname, devId, regId, value, index):
+        return self._write_typed('<h', portname, devId, regId, value, index)
+
+    def registerWriteU32(self, portname, devId, regId, value, index):
+        return self._write_typed('<I', portname, devId, regId, value, index)
+
+    def registerWriteS32(self, portname, devId, regId, value, index):
+        return self._write_typed('<i', portname, devId, regId, value, index)
+
+    def registerWriteU64(self, portname, devId, regId, value, index):
+        return self._write_typed('<Q', portname, devId, regId, value, index)
+
+    def registerWriteS64(self, portname, devId, regId, value, index):
+        return self._write_typed('<q', portname, devId, regId, value, index)
+
+    def registerWriteF32(self, portname, devId, regId, value, index):
+        return self._write_typed('<f', portname, devId, regId, value, index)
+
+    def registerWriteF64(self, portname, devId, regId, value, index):
+        return self._write_typed('<d', portname, devId, regId, value, index)
+
+
+_real_cache_path = None     # nkt_discovery.cache_path while installed
+
+
+def install(**kwargs):
+    """
+    Create a SimulatedBus and make it the NKTP_DLL backend.
+
+    Parameters
+    ----------
+    **kwargs
+        Passed on to SimulatedBus.
+
+    Returns
+    -------
+    SimulatedBus
+        The installed bus, e.g. for inspecting bus.stats.
+    """
+    global _real_cache_path
+    bus = SimulatedBus(**kwargs)
+    if _real_cache_path is None:
+        _real_cache_path = nkt_discovery.cache_path
+        nkt_discovery.cache_path = os.path.join(
+            tempfile.gettempdir(), 'nkt_simulator_topology_%d.json' % os.getpid())
+    nkt_discovery.forget()      # rediscover on the simulated bus
+    nktp.setBackend(bus)
+    return bus
+
+
+def uninstall():
+    """Restore NKTPDLL.dll as the NKTP_DLL backend and the topology cache."""
+    global _real_cache_path
+    nktp.setBackend(None)
+    if _real_cache_path is not None:
+        nkt_discovery.forget()  # deletes the temporary cache file
+        nkt_discovery.cache_path, _real_cache_path = _real_cache_path, None
+
+
+if __name__ == "__main__":
+    # Baseline timings of a wavelength sweep and a status poll on the simulator
+    import nkt_device
+
+    bus = install(switch_delay=0.1, emission_delay=0.1)
+    laser = nkt_device.Fianium()
+    rfdriver = nkt_device.RF_driver()
+    aotf = nkt_device.Select()
+
+    start = time.perf_counter()
+    for wavelength in range(650, 1100, 50):
+        rfdriver.set_wavelength_channel(1, wavelength)
+    sweep_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(10):
+        status = (laser.emission_state, laser.power_level,
+                  laser.interlock_status, rfdriver.RF_power_status,
+                  rfdriver.get_crystal_temperature)
+    poll_time = (time.perf_counter() - start) / 10
+
+    print('Sweep of 9 wavelengths: %.1f ms' % (sweep_time * 1e3))
+    print('Status poll (5 registers): %.1f ms' % (poll_time * 1e3))
+    print('Bus transactions:', bus.stats)
+    for device in (laser, rfdriver, aotf):
+        device.close()
+    uninstall()
@@ -0,0 +1,258 @@
+"""
+Vectorized decoding of the Fianium status (0x66) and interlock (0x32)
+registers.
+
+Fianium.print_status and Fianium.interlock_status decode one reading at a
+time. The functions here take whole arrays of raw readings, e.g. the
+'Fianium_status_bits' and 'Fianium_interlock_status' columns of a telemetry
+capture, and decode them in a few NumPy passes:
+
+    status_planes(words)        (n, 16) booleans, column i = status bit i
+    interlock_codes(values)     one categorical code per reading,
+                                see interlock_labels
+    time_in_state(codes, times) seconds spent in every code
+    first_occurrence(planes, bit, times)
+                                first sample with a bit set
+
+Usage:
+    import nkt_status, nkt_telemetry
+    samples, header = nkt_telemetry.load(save_location + 'telemetry')
+    summary = nkt_status.summarize(samples)
+"""
+import numpy as np
+
+interlock_reasons = ('Interlock off (interlock circuit open)',
+                     'Front panel interlock/key switch off',
+                     'Door switch open',
+                     'External module interlock',
+                     'Application interlock',
+                     'Internal module interlock',
+                     'Interlock power failure',
+                     'Interlock disabled by light source')
+"""Second byte (MSB) of register 0x32 while the interlock is open."""
+circuit_failure = 'Interlock circuit failure'
+"""Reason of the open interlock for MSB 255."""
+
+CIRCUIT_FAILURE = len(interlock_reasons)
+"""Interlock code of 'Interlock circuit failure' (LSB 0, MSB 255)."""
+WAITING = CIRCUIT_FAILURE + 1
+"""Interlock code of 'Waiting for interlock reset' (LSB 1)."""
+OK = WAITING + 1
+"""Interlock code of 'Interlock is OK' (LSB 2)."""
+UNKNOWN = OK + 1
+"""Interlock code of readings the manual does not describe."""
+
+interlock_labels = tuple('Interlocked: %s' % reason for reason
+                         in interlock_reasons + (circuit_failure,)) + (
+    'Waiting for interlock reset', 'Interlock is OK', 'Unknown')
+"""Description of every interlock code, indexed by code."""
+
+# interlock code of every packed reading MSB << 8 | LSB
+_interlock_table = np.full((256, 256), UNKNOWN, np.uint8)
+_interlock_table[:CIRCUIT_FAILURE, 0] = np.arange(CIRCUIT_FAILURE)
+_interlock_table[255, 0] = CIRCUIT_FAILURE
+_interlock_table[:, 1] = WAITING
+_interlock_table[:, 2] = OK
+_interlock_table = _interlock_table.reshape(-1)
+
+LOG_ERROR = 14
+"""Status bit: log error code present."""
+SYSTEM_ERROR = 15
+"""Status bit: system error code present."""
+
+
+def status_planes(words):
+    """
+    Expand status words into one boolean array per bit.
+
+    Parameters
+    ----------
+    words : array_like of int
+        Raw U16 readings of Fianium register 0x66.
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array of shape (n, 16), column i holds status bit i (see
+        Fianium.status_messages).
+    """
+    words = np.ascontiguousarray(words, dtype='<u2').reshape(-1)
+    return np.unpackbits(words.view(np.uint8).reshape(-1, 2), axis=1,
+                         bitorder='little').view(bool)
+
+
+_word_planes = None     # status_planes() of every U16 word, see _all_planes()
+
+
+def _all_planes():
+    """status_planes() of every U16 word, built on first use."""
+    global _word_planes
+    if _word_planes is None:
+        _word_planes = status_planes(np.arange(1 << 16))
+    return _word_planes
+
+
+def interlock_reason(msb):
+    """
+    Return the reason of an open interlock (LSB 0) for the MSB of 0x32.
+
+    Bounds-safe: MSB 255 is the interlock circuit failure, MSB values the
+    manual does not describe give 'Unknown reason (MSB n)'.
+    """
+    if msb < len(interlock_reasons):
+        return interlock_reasons[msb]
+    if msb == 255:
+        return circuit_failure
+    return 'Unknown reason (MSB %d)' % msb
+
+
+def interlock_codes(values):
+    """
+    Map interlock readings to one categorical code each.
+
+    Codes 0-7 are "Interlocked" with the reason interlock_reasons[code],
+    then follow CIRCUIT_FAILURE (MSB 255), WAITING, OK and UNKNOWN;
+    interlock_labels[code] describes every code.
+
+    Parameters
+    ----------
+    values : array_like
+        Raw readings of Fianium register 0x32, either as (n, 2) bytes
+        (LSB, MSB) or packed little-endian into one integer per reading as
+        stored by nkt_telemetry.
+
+    Returns
+    -------
+    numpy.ndarray of uint8
+    """
+    values = np.asarray(values)
+    if values.ndim == 2:
+        values = values[:, 0].astype(np.uint16) | \
+            values[:, 1].astype(np.uint16) << 8
+    return _interlock_table[values.astype(np.uint16)]
+
+
+def transitions(codes):
+    """
+    Return the indices at which a categorical code changes.
+
+    Parameters
+    ----------
+    codes : array_like
+        E.g. interlock_codes() or a column of status_planes().
+
+    Returns
+    -------
+    numpy.ndarray
+        Indices i with codes[i] != codes[i - 1].
+    """
+    codes = np.asarray(codes)
+    return np.flatnonzero(codes[1:] != codes[:-1]) + 1
+
+
+def time_in_state(codes, times, states=None):
+    """
+    Sum the time spent in every state.
+
+    Every interval between two samples counts towards the state of the
+    sample at its start; the last sample contributes nothing.
+
+    Parameters
+    ----------
+    codes : array_like of int
+        Non-negative state codes, e.g. interlock_codes() or a column of
+        status_planes().
+    times : array_like of float
+        Sample times in seconds.
+    states : int, optional
+        Number of states; default max(codes) + 1.
+
+    Returns
+    -------
+    numpy.ndarray
+        Seconds spent in state i at index i.
+    """
+    codes = np.asarray(codes).astype(np.intp)
+    times = np.asarray(times, dtype=float)
+    if states is None:
+        states = int(codes.max()) + 1 if len(codes) else 0
+    return np.bincount(codes[:-1], weights=np.diff(times), minlength=states)
+
+
+def first_occurrence(planes, bit, times=None):
+    """
+    Return the first sample that has a status bit set.
+
+    Parameters
+    ----------
+    planes : numpy.ndarray
+        Output of status_planes().
+    bit : int
+        Status bit, e.g. LOG_ERROR or SYSTEM_ERROR.
+    times : array_like of float, optional
+        Sample times; if given the time is returned instead of the index.
+
+    Returns
+    -------
+    int or float or None
+        Index (or time) of the first sample with the bit set, None if it is
+        never set.
+    """
+    column = planes[:, bit]
+    if not column.any():
+        return None
+    index = int(np.argmax(column))
+    return index if times is None else float(times[index])
+
+
+def summarize(samples, status='Fianium_status_bits',
+              interlock='Fianium_interlock_status'):
+    """
+    Summarize the status and interlock columns of a telemetry capture.
+
+    Samples whose register failed to read (see the 'missing' column) are
+    decoded as 0.
+
+    Parameters
+    ----------
+    samples : numpy.ndarray
+        Structured array with a 'time' field, e.g. from nkt_telemetry.load().
+    status, interlock : str
+        Names of the status word and interlock columns; a column missing
+        from samples is skipped.
+
+    Returns
+    -------
+    dict
+        'status_time': {bit: seconds the bit was set},
+        'log_error', 'system_error': time of the first sample with bit 14
+        and 15 set, or None,
+        'interlock_time': {label: seconds}, for the labels that occur,
+        'interlock_changes': [(time, label)] at every change of interlock
+        state, starting with the first sample.
+    """
+    times = samples['time']
+    summary = {}
+    if status in samples.dtype.names:
+        planes = status_planes(samples[status])
+        # time per distinct word first, then per bit: 2**16 x 16 instead
+        # of n x 16 multiplications
+        word_time = time_in_state(samples[status], times, 1 << 16)
+        set_time = word_time @ _all_planes()
+        summary['status_time'] = {bit: float(seconds) for bit, seconds
+                                  in enumerate(set_time) if seconds}
+        summary['log_error'] = first_occurrence(planes, LOG_ERROR, times)
+        summary['system_error'] = first_occurrence(planes, SYSTEM_ERROR,
+                                                   times)
+    if interlock in samples.dtype.names:
+        codes = interlock_codes(samples[interlock])
+        spent = time_in_state(codes, times, len(interlock_labels))
+        summary['interlock_time'] = {
+            interlock_labels[code]: float(spent[code])
+            for code in np.unique(codes)}
+        changes = np.concatenate(([0], transitions(codes))) if len(codes) \
+            else np.zeros(0, np.intp)
+        summary['interlock_changes'] = [
+            (float(times[index]), interlock_labels[codes[index]])
+            for index in changes]
+    return summary
@@ -0,0 +1,285 @@
+"""
+Compiled wavelength sweeps of the SuperK Select RF driver.
+
+compile_sweep() turns a wavelength list (or start/stop/step), an amplitude
+and a dwell time into a SweepProgram: the raw register write of every step
+is computed once, and the crystal range is checked once, before the sweep
+starts. SweepProgram.run() then issues the writes in a tight loop paced by
+a monotonic clock, with no scaling, caching or printing per step, and calls
+the user hooks during each dwell. The returned SweepStats compare the
+actual with the requested step times.
+
+Usage:
+    import nkt_sweep
+    sweep = nkt_sweep.compile_sweep(rfdriver, start=600, stop=700, step=20,
+                                    amplitude=100, dwell=0.05)
+    stats = sweep.run(hooks=[lambda index, wavelength: acquire()])
+    stats.report()
+"""
+import time
+
+import numpy as np
+
+import NKTP_DLL as nktp
+import nkt_registers
+
+
+def _wait_until(deadline, spin):
+    """Sleep until spin seconds before deadline, then busy-wait for it."""
+    remaining = deadline - time.perf_counter()
+    if remaining > spin:
+        time.sleep(remaining - spin)
+    while time.perf_counter() < deadline:
+        pass
+
+
+class SweepStats:
+    """
+    Timing of one run of a SweepProgram.
+
+    All times are in seconds, relative to the start of the run.
+
+    Attributes
+    ----------
+    wavelengths : numpy.ndarray
+        Wavelength of every step in nm.
+    planned : numpy.ndarray
+        Requested start time of every step.
+    started : numpy.ndarray
+        Actual start time of every step, just before its write.
+    write_times : numpy.ndarray
+        Duration of the register write of every step.
+    hook_times : numpy.ndarray
+        Time spent in the hooks of every step.
+    results : numpy.ndarray
+        Result code (RegisterResultTypes) of every write.
+    dwell : float
+        Requested time per step.
+    """
+
+    def __init__(self, wavelengths, planned, started, write_times, hook_times,
+                 results, dwell):
+        self.wavelengths = wavelengths
+        self.planned = planned
+        self.started = started
+        self.write_times = write_times
+        self.hook_times = hook_times
+        self.results = results
+        self.dwell = dwell
+
+    def summary(self):
+        """
+        Return the timing statistics of the run.
+
+        Returns
+        -------
+        dict
+            'steps', 'failed' (writes not successful), 'duration' (s),
+            'step_mean', 'step_std' (jitter), 'step_min', 'step_max' of the
+            actual step times, 'late_mean', 'late_max' (actual minus planned
+            start), 'write_mean', 'write_max', and 'overruns': steps whose
+            write and hooks took longer than the dwell.
+        """
+        steps = np.diff(self.started)
+        late = self.started - self.planned
+        busy = self.write_times + self.hook_times
+        return {
+            'steps': len(self.started),
+            'failed': int(np.count_nonzero(self.results)),
+            'duration': float(self.started[-1] + busy[-1]) if len(busy) else 0.,
+            'step_mean': float(steps.mean()) if len(steps) else None,
+            'step_std': float(steps.std()) if len(steps) else None,
+            'step_min': float(steps.min()) if len(steps) else None,
+            'step_max': float(steps.max()) if len(steps) else None,
+            'late_mean': float(late.mean()) if len(late) else None,
+            'late_max': float(late.max()) if len(late) else None,
+            'write_mean': float(self.write_times.mean()) if len(busy) else None,
+            'write_max': float(self.write_times.max()) if len(busy) else None,
+            'overruns': int(np.count_nonzero(busy > self.dwell))
+            if self.dwell else 0,
+        }
+
+    def report(self):
+        """Print the requested and actual step times."""
+        summary = self.summary()
+        print('Sweep of %d steps in %.3f s, %d failed writes'
+              % (summary['steps'], summary['duration'], summary['failed']))
+        if summary['step_mean'] is None:
+            return
+        print('Step time: requested %.3f ms, actual %.3f ms '
+              '(min %.3f, max %.3f, jitter %.3f ms)'
+              % (self.dwell * 1e3, summary['step_mean'] * 1e3,
+                 summary['step_min'] * 1e3, summary['step_max'] * 1e3,
+                 summary['step_std'] * 1e3))
+        print('Start delay: mean %.3f ms, max %.3f ms; write: mean %.3f ms, '
+              'max %.3f ms; overruns: %d'
+              % (summary['late_mean'] * 1e3, summary['late_max'] * 1e3,
+                 summary['write_mean'] * 1e3, summary['write_max'] * 1e3,
+                 summary['overruns']))
+
+
+class SweepProgram:
+    """
+    Precomputed register writes of a wavelength sweep on one RF channel.
+
+    Create with compile_sweep().
+
+    Attributes
+    ----------
+    wavelengths : tuple of float
+        Wavelength of every step in nm.
+    raw : tuple of int
+        Raw value (pm) written for every step.
+    dwell : float
+        Time per step in seconds.
+    amplitude : float
+        Amplitude of the channel in percent, set once before the sweep.
+    channel : int
+        RF driver channel that is retuned.
+    """
+
+    def __init__(self, rf_driver, wavelengths, amplitude, dwell, channel):
+        self.rf_driver = rf_driver
+        self.wavelengths = tuple(wavelengths)
+        self.amplitude = amplitude
+        self.dwell = dwell
+        self.channel = channel
+        name = rf_driver._channel_register('wavelength', channel)
+        self._register = rf_driver._registers[name]
+        self.raw = tuple(nkt_registers.encode(self._register, wavelength)
+                         for wavelength in self.wavelengths)
+
+    def __len__(self):
+        return len(self.wavelengths)
+
+    def run(self, hooks=(), repeat=1, spin=0.002):
+        """
+        Run the sweep.
+
+        Step i starts at i * dwell after the start of the run: its write is
+        issued, then every hook is called as hook(index, wavelength). The
+        loop then waits for the start of the next step; a step whose write
+        and hooks take longer than the dwell delays the next step (counted
+        as an overrun) without shifting the later ones.
+
+        Parameters
+        ----------
+        hooks : sequence of callable
+            Called at each step, e.g. to trigger an acquisition.
+        repeat : int
+            Number of passes through the wavelengths.
+        spin : float
+            The last spin seconds before a step are busy-waited instead of
+            slept, for a precise step start.
+
+        Returns
+        -------
+        SweepStats
+        """
+        rf_driver = self.rf_driver
+        rf_driver.set_amplitude_channel(self.channel, self.amplitude)
+        portname = rf_driver.portname
+        module_address = rf_driver.module_address
+        address = self._register.address
+        write = getattr(nktp, 'registerWrite' + self._register.data_type)
+        clock = time.perf_counter
+        wavelengths = self.wavelengths * repeat
+        raw = self.raw * repeat
+        count = len(raw)
+        planned = np.arange(count) * self.dwell
+        started = np.empty(count)
+        write_times = np.empty(count)
+        hook_times = np.empty(count)
+        results = np.empty(count, np.uint8)
+
+        start = clock()
+        for index in range(count):
+            _wait_until(start + planned[index], spin)
+            step_start = clock()
+            results[index] = write(portname, module_address, address,
+                                   raw[index], -1)
+            written = clock()
+            for hook in hooks:
+                hook(index, wavelengths[index])
+            started[index] = step_start - start
+            write_times[index] = written - step_start
+            hook_times[index] = clock() - written
+        # The writes bypassed the driver's record of written values
+        rf_driver.invalidate(address)
+        return SweepStats(np.array(wavelengths), planned, started,
+                          write_times, hook_times, results, self.dwell)
+
+
+def compile_sweep(rf_driver, wavelengths=None, start=None, stop=None,
+                  step=None, amplitude=100, dwell=0.1, channel=1):
+    """
+    Prepare a wavelength sweep of the RF driver.
+
+    Parameters
+    ----------
+    rf_driver : nkt_device.RF_driver
+        The RF driver to tune.
+    wavelengths : sequence of float, optional
+        Wavelengths in nm, in sweep order.
+    start, stop, step : float, optional
+        Used instead of wavelengths: start to stop (inclusive) in steps of
+        step nm.
+    amplitude : float
+        Amplitude in percent of the swept channel.
+    dwell : float
+        Time per step in seconds; 0 runs the steps back to back.
+    channel : int
+        RF driver channel to retune (1 to 8).
+
+    Returns
+    -------
+    SweepProgram
+
+    Raises
+    ------
+    ValueError
+        If no wavelengths are given, the amplitude or dwell is out of range,
+        or a wavelength is outside the range of the connected crystal.
+    RuntimeError
+        If the crystal range cannot be read.
+    """
+    if wavelengths is None:
+        if None in (start, stop, step) or step <= 0:
+            raise ValueError("Give wavelengths or start, stop and a "
+                             "positive step.")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        wavelengths = [round(start + index * step, 3)
+                       for index in range(max(count, 0))]
+    wavelengths = list(wavelengths)
+    if not wavelengths:
+        raise ValueError("A sweep needs at least one wavelength.")
+    if not (0 <= amplitude <= 100):
+        raise ValueError("Amplitude must be between 0 and 100 (%).")
+    if dwell < 0:
+        raise ValueError("Dwell time must not be negative.")
+
+    limits = rf_driver.read_many('min_wavelength', 'max_wavelength')
+    min_wave = limits['min_wavelength']
+    max_wave = limits['max_wavelength']
+    if min_wave is None or max_wave is None:
+        raise RuntimeError("Could not read the crystal range.")
+    outside = [wave for wave in wavelengths
+               if not min_wave <= wave <= max_wave]
+    if outside:
+        raise ValueError("Wavelengths %s are outside the crystal range "
+                         "%g - %g nm." % (outside, min_wave, max_wave))
+    return SweepProgram(rf_driver, wavelengths, amplitude, dwell, channel)
+
+
+if __name__ == "__main__":
+    # Step time statistics of a sweep on the simulated bus
+    import nkt_device
+    import nkt_simulator
+
+    nkt_simulator.install(latency=0.002, jitter=0.0005)
+    rfdriver = nkt_device.RF_driver()
+    sweep = compile_sweep(rfdriver, start=650, stop=1050, step=25,
+                          amplitude=100, dwell=0.01)
+    sweep.run(repeat=3).report()
+    rfdriver.close()
+    nkt_simulator.uninstall()
@@ -0,0 +1,309 @@
+"""
+Background telemetry of the NKT modules during long scans.
+
+A TelemetryRecorder samples a fixed set of registers (crystal temperature,
+Fianium status bits, interlock, power level, RF power, ...) on its own daemon
+thread at a configurable rate. Every sample is one batched read_many(raw=True)
+per module, stored unscaled in a preallocated NumPy ring buffer of fixed-width
+columns next to its timestamp, so sampling allocates nothing per sample and
+the acquisition thread only shares the bus with it for one transaction per
+sampled register.
+
+The ring buffer is flushed to <path>.tlm, a flat binary file of the buffer's
+records, every flush_interval seconds and on stop(). <path>.json describes
+the record layout and the scale of every column; load() reads both back.
+
+Usage:
+    import nkt_telemetry
+    telemetry = nkt_telemetry.TelemetryRecorder(
+        nkt_telemetry.default_channels(laser, rfdriver), rate=2,
+        path=save_location + 'telemetry')
+    telemetry.start()
+    ...                                 # run the scan
+    telemetry.stop()
+    samples = nkt_telemetry.load(save_location + 'telemetry')
+"""
+import json
+import threading
+import time
+
+import numpy as np
+
+import nkt_locking
+
+# NumPy types of the raw RegisterDataTypes
+dtypes = {
+    'U8': 'u1', 'S8': 'i1', 'U16': 'u2', 'S16': 'i2', 'U32': 'u4', 'S32': 'i4',
+    'U64': 'u8', 'S64': 'i8', 'F32': 'f4', 'F64': 'f8',
+}
+_array_dtypes = {1: 'u1', 2: 'u2', 4: 'u4', 8: 'u8'}
+
+
+def default_channels(laser=None, rf_driver=None):
+    """
+    Return the usual telemetry channels of a Fianium and an RF driver.
+
+    Parameters
+    ----------
+    laser : nkt_device.Fianium, optional
+        Sampled for status bits, interlock, power level and emission.
+    rf_driver : nkt_device.RF_driver, optional
+        Sampled for crystal temperature and RF power.
+
+    Returns
+    -------
+    list of (device, register name)
+    """
+    channels = []
+    if laser is not None:
+        channels += [(laser, name) for name in (
+            'status_bits', 'interlock_status', 'power_level', 'emission_state')]
+    if rf_driver is not None:
+        channels += [(rf_driver, name) for name in (
+            'crystal_temperature', 'RF_power_status')]
+    return channels
+
+
+def _column_dtype(register):
+    """NumPy type of the raw values of register."""
+    if register.data_type == 'Array':
+        try:
+            return _array_dtypes[register.size]
+        except KeyError:
+            raise ValueError('Array register %s of %d bytes cannot be a '
+                             'telemetry column' % (register.name, register.size))
+    return dtypes[register.data_type]
+
+
+class TelemetryRecorder:
+    """
+    Samples module registers into a ring buffer on a background thread.
+
+    Columns hold the raw register values; 'Array' registers are stored as a
+    little-endian unsigned integer of their bytes. A register that fails to
+    read is stored as 0 with its bit set in the 'missing' column. The columns
+    are named <device class>_<register>, e.g. 'Fianium_status_bits'.
+
+    Parameters
+    ----------
+    channels : sequence of (device, register name)
+        Registers to sample, see default_channels().
+    rate : float
+        Samples per second.
+    capacity : int
+        Number of samples kept in memory. Samples not flushed before they
+        are overwritten are counted in dropped.
+    path : str, optional
+        File name without extension; nothing is written to disk if None.
+    flush_interval : float
+        Seconds between writes of new samples to <path>.tlm.
+    """
+
+    def __init__(self, channels, rate=2.0, capacity=4096, path=None,
+                 flush_interval=10.0):
+        if len(channels) > 64:
+            raise ValueError('At most 64 telemetry channels are supported')
+        self.rate = rate
+        self.path = path
+        self.flush_interval = flush_interval
+        self.columns = []       # [(column, device, register)]
+        self._reads = {}        # {device: ([register names], [column indices])}
+        fields = [('time', 'f8'), ('missing', 'u8')]
+        for device, name in channels:
+            register = device._registers[name]
+            column = '%s_%s' % (type(device).__name__, name)
+            names, indices = self._reads.setdefault(device, ([], []))
+            names.append(name)
+            indices.append(len(self.columns))
+            self.columns.append((column, device, register))
+            fields.append((column, _column_dtype(register)))
+        self.dtype = np.dtype(fields)
+        self._buffer = np.zeros(capacity, self.dtype)
+        self._count = 0         # samples taken
+        self._flushed = 0       # samples written to disk
+        self.dropped = 0
+        """Samples overwritten before they were flushed."""
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        """Read every channel once and store the sample."""
+        now = time.time()
+        values = [0] * len(self.columns)
+        missing = 0
+        for device, (names, indices) in self._reads.items():
+            try:
+                readings = device.read_many(*names, raw=True,
+                                            sync_written=False)
+            except Exception as error:
+                print('Telemetry read of %s failed: %s'
+                      % (device._module_name, error))
+                readings = {}
+            for name, index in zip(names, indices):
+                value = readings.get(name)
+                if value is None:
+                    missing |= 1 << index
+                elif type(value) is bytes:
+                    values[index] = int.from_bytes(value, 'little')
+                else:
+                    values[index] = value
+        with self._lock:
+            self._buffer[self._count % len(self._buffer)] = \
+                (now, missing, *values)
+            self._count += 1
+
+    def _pending(self):
+        """Return the samples not flushed yet, oldest first, and mark them."""
+        with self._lock:
+            capacity = len(self._buffer)
+            first = max(self._flushed, self._count - capacity)
+            self.dropped += first - self._flushed
+            indices = np.arange(first, self._count) % capacity
+            samples = self._buffer[indices]
+            self._flushed = self._count
+        return samples
+
+    def _write_header(self):
+        header = {
+            'descr': self.dtype.descr,
+            'rate': self.rate,
+            'started': time.time(),
+            'columns': [{'name': column,
+                         'module': device._module_name,
+                         'portname': device.portname,
+                         'module_address': device.module_address,
+                         'register': register.name,
+                         'address': register.address,
+                         'data_type': register.data_type,
+                         'scale': register.scale}
+                        for column, device, register in self.columns],
+        }
+        with open(self.path + '.json', 'w') as output:
+            json.dump(header, output, indent=1)
+        open(self.path + '.tlm', 'wb').close()
+
+    def flush(self):
+        """Append the samples taken since the last flush to <path>.tlm."""
+        samples = self._pending()
+        if self.path is not None and len(samples):
+            with open(self.path + '.tlm', 'ab') as output:
+                samples.tofile(output)
+
+    def _run(self):
+        interval = 1 / self.rate
+        next_sample = next_flush = time.monotonic()
+        next_flush += self.flush_interval
+        while not self._stop.is_set():
+            self._sample()
+            now = time.monotonic()
+            if now >= next_flush:
+                self.flush()
+                next_flush = now + self.flush_interval
+            next_sample += interval
+            if next_sample < now:
+                next_sample = now   # fell behind, do not burst
+            self._stop.wait(next_sample - now)
+
+    def start(self):
+        """Start sampling on a daemon thread."""
+        if self._thread is not None:
+            return
+        nkt_locking.enable()    # the sampler shares the ports with the scan
+        if self.path is not None:
+            self._write_header()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='nkt-telemetry')
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and flush the remaining samples."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def samples(self):
+        """
+        Return the samples held in memory, oldest first.
+
+        Returns
+        -------
+        numpy.ndarray
+            Structured array with 'time', 'missing' and the raw columns.
+        """
+        with self._lock:
+            capacity = len(self._buffer)
+            first = max(0, self._count - capacity)
+            return self._buffer[np.arange(first, self._count) % capacity]
+
+    def latest(self):
+        """
+        Return the last sample in units, or None before the first sample.
+
+        Returns
+        -------
+        dict
+            {'time': s since the epoch, column: value}, None for channels
+            that failed to read.
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            sample = self._buffer[(self._count - 1) % len(self._buffer)].copy()
+        latest = {'time': float(sample['time'])}
+        for index, (column, device, register) in enumerate(self.columns):
+            if int(sample['missing']) >> index & 1:
+                latest[column] = None
+            elif register.scale is not None:
+                latest[column] = sample[column].item() / register.scale
+            else:
+                latest[column] = sample[column].item()
+        return latest
+
+
+def load(path, scaled=True):
+    """
+    Read a telemetry file written by a TelemetryRecorder.
+
+    Parameters
+    ----------
+    path : str
+        File name without extension, as given to the recorder.
+    scaled : bool
+        Convert the columns with a scale to float values in units.
+
+    Returns
+    -------
+    samples : numpy.ndarray
+        Structured array with 'time', 'missing' and one field per column.
+    header : dict
+        The contents of <path>.json.
+    """
+    with open(path + '.json') as header_file:
+        header = json.load(header_file)
+    dtype = np.dtype([tuple(field) for field in header['descr']])
+    samples = np.fromfile(path + '.tlm', dtype)
+    if scaled:
+        scales = {column['name']: column['scale'] for column in header['columns']
+                  if column['scale'] is not None}
+        scaled_dtype = np.dtype([(name, 'f8' if name in scales else
+                                  dtype.fields[name][0])
+                                 for name in dtype.names])
+        converted = np.empty(len(samples), scaled_dtype)
+        for name in dtype.names:
+            converted[name] = samples[name]
+            if name in scales:
+                converted[name] /= scales[name]
+        samples = converted
+    return samples, header
@@ -5,6 +5,7 @@ from nidaqmx.constants import WAIT_INFINITELY
 import matplotlib.pyplot as plt
 import time
 from datetime import timedelta
+import chunked_dataset
 
 """
 Simple python code to scan a 2D surface using the USB-6259
@@ -149,7 +150,7 @@ if __name__ == "__main__":
     end_time = time.monotonic()
     print(timedelta(seconds=end_time - start_time))
     print(testarray.shape)
-    np.savetxt('yellow_1310_3.txt', testarray, delimiter=',')
+    chunked_dataset.save('yellow_1310_3', testarray, attrs={'sampling_rate': sr, 'duration': duration, 'xmax': xmax, 'ymax': ymax, 'xsteps': xsteps, 'ysteps': ysteps})
     plt.imshow(testarray, extent = [0, 1, 0, 1], aspect = 'auto') # plots 2d measurement of surface
     plt.show()
 
@@ -1,6 +1,8 @@
 from nkt_device import *
 from example_selectk_laser_sweep import *
 import rampscript
+import chunked_dataset
+import nkt_telemetry
 import numpy as np
 import nidaqmx as ni
 from nidaqmx.constants import AcquisitionType, TaskMode
@@ -25,42 +27,15 @@ def get_save_folder():
 
 def switch2right(min_wave,max_wave):
 
-    stepsize = 20 # stepsize in nm
-    delay_time = 2 # delay time in seconds
-
-
-    # Set to normal operation
-    rfdriver.set_RF_power(False)  # Turn off the RF driver
-    aotf.set_switch_settings(0)  # Set to normal operation
-
-    # Check that the right crystal is used through rf driver
-    current_min_wave = rfdriver.get_min_wavelength
-    current_max_wave = rfdriver.get_max_wavelength
-    print(current_min_wave)
-    print(current_max_wave)
-
-    if current_min_wave <= min_wave and max_wave <= current_max_wave:
-        print(f"Selected wavelengths are within the current crystal's range.")
-    else:
-        print(f"Selected wavelengths is not within the current crystal's range. Switching crystals...")
-        rfdriver.set_RF_power(False)  # Turn off the RF driver
-        aotf.set_switch_settings(1)  # Change to the appropriate crystal
-    
-        # # Recheck the range after changing the crystal
-       # current_min_wave = rfdriver.get_min_wavelength()
-      #
-      #   current_max_wave = rfdriver.get_max_wavelength()
-        
-        time.sleep(2)
-        current_min_wave = rfdriver.get_min_wavelength
-        current_max_wave = rfdriver.get_max_wavelength
-        print(current_min_wave)
-        print(current_max_wave)
-        if current_min_wave <= min_wave and max_wave <= current_max_wave:
-            print(f"Select is ready for use.")
-        else:
-            print(f"Still outside crystal range. Check the selection.")
-            
+    # Crystal ranges are read once; the RF switch is only written if the
+    # wavelengths need the other crystal than the connected one
+    print(aotf.crystal_ranges)
+    try:
+        crystal = aotf.select_crystal(rfdriver, [min_wave, max_wave], timeout=5)
+        print(f"Select is ready for use with crystal {crystal}.")
+    except (ValueError, TimeoutError) as error:
+        print(f"Still outside crystal range. Check the selection. ({error})")
+    print(rfdriver.wait_times)
 
        
 
@@ -139,11 +114,13 @@ if __name__ == "__main__":
     print("sampling rate and duration for each ramp:", [sr,duration])
     current_wave = min_wave # starting wavelength
 
-    rfdriver.set_amplitude_channel(1, 100) # sets channel 1 power to 100 percent
+    rfdriver.load_program(wave, amplitude=100) # one channel per wavelength, 100 percent when selected
     rfdriver.set_RF_power(True) # set rf driver on
+    rfdriver.wait_until_rf_on()
     laser.set_power(100) # sets laser power to 50%
     print(f"Fianium laser set to {laser.power_level}.")
     laser.set_emission(True) # set laser on
+    laser.wait_until_emission_stable()
     pause_and_count()
     save_location = get_save_folder()
 
@@ -152,6 +129,12 @@ if __name__ == "__main__":
         print(f"Files will be saved in: {save_location}")
     else:
         print("Operation cancelled or invalid path provided")
+    # sample laser and RF driver state in the background during the scans
+    telemetry = nkt_telemetry.TelemetryRecorder(
+        nkt_telemetry.default_channels(laser, rfdriver), rate=2,
+        path=f"{save_location}telemetry_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if save_location else None)
+    telemetry.start()
               
     while True: 
         sample_name = input("Enter sample name (or type 'exit' to quit): ")
@@ -159,7 +142,6 @@ if __name__ == "__main__":
             print("Exiting...")
             break
         datacube=[]
-        np.savetxt(f"{save_location}sample_wave_{sample_name}.txt", wave, delimiter=',')
 
         # Set wavelength + amplitude to loop uyntil user cancels
         for iwave in wave:
@@ -167,23 +149,29 @@ if __name__ == "__main__":
             # print(rfdriver.get_wavelength_channel(1))
             # Run code normally
           
-            rfdriver.set_wavelength_channel(1, iwave) # set to current wavelength
-            print(f"set channel 1:{iwave}")
-            print(rfdriver.get_amplitude_channel(1))
+            rfdriver.select_wavelength(iwave) # switch to current wavelength
+            print(f"selected wavelength:{iwave}")
+            rfdriver.wait_until_rf_on() # returns at once while RF stays on
             testarray=scan(xsteps,ysteps,xmax,ymax,sr,duration) 
             #  plt.imshow(testarray, extent = [0, 1, 0, 1], aspect = 'auto') # plots 2d measurement of surface
             #   plt.show()
             datacube.append(testarray)
-               
-            time.sleep(2) # delay depending on time defined
             
         datacube=np.stack(datacube,axis=0)
         print(datacube.shape)
-        reshape_datacube=datacube.reshape(datacube.shape[0],-1)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-        np.savetxt(f"{save_location}sample_data_{sample_name}_{timestamp}.txt", reshape_datacube, delimiter=',')
+        # rows: wavelengths, each a (y steps, samples) scan
+        chunked_dataset.save(
+            f"{save_location}sample_data_{sample_name}_{timestamp}", datacube,
+            attrs={'sample_name': sample_name, 'wavelengths_nm': list(wave),
+                   'sampling_rate': sr, 'num_samples': datacube.shape[-1],
+                   'duration': duration, 'xmax': xmax, 'ymax': ymax,
+                   'xsteps': xsteps, 'ysteps': ysteps, 'timestamp': timestamp},
+            chunk_rows=1)
     #print(reshape_dat)
+    telemetry.stop()
+    print(f"Telemetry: {telemetry.latest()}")
     rfdriver.set_RF_power(False) # set rf driver off
     laser.set_emission(False) # set laser off
 
@@ -4,12 +4,16 @@ from nidaqmx.constants import (
     AcquisitionType,
     WAIT_INFINITELY,
 )
+from nidaqmx.stream_readers import AnalogMultiChannelReader, AnalogUnscaledReader
 import numpy as np
 import matplotlib.pyplot as plt
 import time
 from control_laser import control_laser # Assuming this module exists and works
 import os # Import the os module for path manipulation
 from connectStepper import send_serial_command
+import capture_store
+import acquisition_pipeline
+import daq_scaling
 
 # def record_on_low_digital_trigger(
 #     data_channel, trigger_line, samples_per_channel, rate, timeout=10.0
@@ -83,6 +87,7 @@ if __name__ == "__main__":
     #num_samples = 1000
     trigger_timeout = 5.0  # Timeout in seconds to wait for each trigger
     num_repetitions =600  # Number of times to repeat the acquisition
+    raw_mode = False  # True: store int16 ADC codes (4x smaller), scaled to volts when loaded
     repetition_to_plot = 1  # The repetition number to plot (1-based index)
     delaytimer = 0.1
     veticalshift=200
@@ -134,6 +139,14 @@ if __name__ == "__main__":
             )
             co_task.triggers.start_trigger.retriggerable = True
 
+            # Readers fill the (1 channel, num_samples) pipeline rows in place
+            if raw_mode:
+                reader = AnalogUnscaledReader(ai_task.in_stream)
+                read_many, sample_dtype = reader.read_int16, 'i2'
+            else:
+                reader = AnalogMultiChannelReader(ai_task.in_stream)
+                read_many, sample_dtype = reader.read_many_sample, 'f8'
+
         # task.triggers.start_trigger.retriggerable=True
             # Start AI first so it's armed and waiting for the sample clock.
         # ai_task.start()
@@ -145,8 +158,23 @@ if __name__ == "__main__":
             for icurlaser in range(len(lasernumber)):
                 print(f"\n--- Starting acquisition for Laser {lasernumber[icurlaser]} at {laserwave[icurlaser]} nm ---")
                 
-                # Reset data storage for each laser
-                all_recorded_data = [] 
+                # Each repetition is written to disk as soon as it is read
+                from datetime import datetime
+                current_time = datetime.now().strftime("%Y%m%d_%H%M%S") # Format: YYYYMMDD_HHMMSS
+                filename = f"{sample_name}_laser_{laserwave[icurlaser]}nm_{current_time}"
+                filepath = os.path.join(save_directory, filename)
+                metadata = {'sample_name': sample_name,
+                            'wavelength_nm': laserwave[icurlaser],
+                            'channels': [analog_data_channel],
+                            'trigger_channel': digital_trigger_channel,
+                            'sampling_rate': sampling_rate,
+                            'num_samples': num_samples,
+                            'rows': 'repetition', 'columns': 'sample (time increasing)'}
+                if raw_mode:
+                    metadata[daq_scaling.metadata_key] = daq_scaling.scaling_coefficients(ai_task)
+                store = capture_store.CaptureStore(
+                    filepath, num_repetitions, 1, num_samples,
+                    dtype=sample_dtype, metadata=metadata)
 
                 control_laser(lasernumber[icurlaser], turn_on=True)  
                 time.sleep(1) # Wait for laser to stabilize
@@ -159,41 +187,31 @@ if __name__ == "__main__":
                 print("waiting for triggers")
                 n=1
 
-                for i in range(num_repetitions):
-                    print(f"\n--- Repetition {i+1} ---")
-                    #time.sleep(delaytimer)
-                    acquired_data=ai_task.read(number_of_samples_per_channel=num_samples,timeout=trigger_timeout)
-                # time.sleep(delaytimer)
-                # if acquired_data is not None:
-                # if (i + 1) % 2 == 0:
-                    all_recorded_data.append(acquired_data)
-                # else:
-                #     print("skip")
+                # A writer thread stores full buffers while the next ones are read
+                with store, acquisition_pipeline.AcquisitionPipeline(
+                        store.extend, (1, num_samples), sample_dtype) as pipeline:
+                    for i in range(num_repetitions):
+                        print(f"--- Repetition {i+1} ---", end='\r')
+                        #time.sleep(delaytimer)
+                        # read straight into the pipeline buffer, no list per repetition
+                        pipeline.read(read_many, num_samples, timeout=trigger_timeout)
+                    # time.sleep(delaytimer)
+                    # if acquired_data is not None:
+                    # if (i + 1) % 2 == 0:
+                    # else:
+                    #     print("skip")
+                pipeline.report() # queue depth, writer lag and stalls
             # Clean up
                 co_task.stop()
                 ai_task.stop()
 
             # --- Process and Save Data for the current laser ---
-                if all_recorded_data:
-                    output_matrix = np.array(all_recorded_data)
-                # output_matrix=output_matrix.reshape(num_repetitions,num_samples)
-                    # Define filename for saving the output_matrix as CSV with sample name
-                    # Using current date and time for better uniqueness, considering NZST
-                    from datetime import datetime
-                    current_time = datetime.now().strftime("%Y%m%d_%H%M%S") # Format: YYYYMMDD_HHMMSS
-
-                    filename = f"{sample_name}_laser_{laserwave[icurlaser]}nm_{current_time}.csv"
-                    filepath = os.path.join(save_directory, filename)
-                    
-                    # Save the matrix to a CSV file
-                    header = f"Acquired data for Sample: {sample_name}, Laser Wavelength: {laserwave[icurlaser]}nm\n" \
-                            f"Rows: Repetition Number\n" \
-                            f"Columns: Sample Number (time increasing)\n" \
-                            f"Sampling Rate: {sampling_rate} Hz, Samples per Repetition: {num_samples}\n" \
-                            f"Acquisition Date/Time (NZST): {datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z%z')}"
-                    
-                    np.savetxt(filepath, output_matrix, delimiter=',', fmt='%.6f', header=header, comments='')
-                    print(f"Saved data for {sample_name} at {laserwave[icurlaser]}nm to {filepath}")
+                if store.completed:
+                    output_matrix = store.data[:, 0, :] # memory-mapped, rows: repetitions
+                    if raw_mode:
+                        output_matrix = daq_scaling.to_volts(
+                            store.data, metadata[daq_scaling.metadata_key])[:, 0, :]
+                    print(f"Saved {store.completed} repetitions for {sample_name} at {laserwave[icurlaser]}nm to {filepath}.npy")
 
                     # Image Plot
                     plt.figure(figsize=(12, 6))
@@ -216,7 +234,7 @@ if __name__ == "__main__":
                         0, num_samples / sampling_rate, num_samples, endpoint=False
                     )
                     
-                    for i, data in enumerate(all_recorded_data):
+                    for i, data in enumerate(output_matrix):
                         color = colors(i)  # Get a color from the colormap
                         plt.plot(timex, data, label=f"Repetition {i+1}", color=color)
 
@@ -227,7 +245,8 @@ if __name__ == "__main__":
                     plt.legend(title="Repetitions", bbox_to_anchor=(1.05, 1), loc='upper left') # Add legend
                     plt.tight_layout(rect=[0, 0, 0.9, 1]) # Adjust layout to make space for legend
 
-                    plt.show()
+                    plt.show(block=False) # keep acquiring while the plot is open
+                    plt.pause(0.1)
                     
                     control_laser(lasernumber[icurlaser], turn_on=False)
                     time.sleep(1) # Small delay after turning off laser
@@ -4,12 +4,16 @@ from nidaqmx.constants import (
     AcquisitionType,
     WAIT_INFINITELY,
 )
+from nidaqmx.stream_readers import AnalogMultiChannelReader, AnalogUnscaledReader
 import numpy as np
 import matplotlib.pyplot as plt
 import time
 from control_laser import control_laser # Assuming this module exists and works
 import os 
 from connectStepper import send_serial_command
+import chunked_dataset
+import acquisition_pipeline
+import daq_scaling
 from datetime import datetime # Import datetime here for general use
 
 
@@ -28,6 +32,7 @@ if __name__ == "__main__":
     num_samples = int(sampling_rate / scan_freq)
     trigger_timeout = 5.0  # Timeout in seconds to wait for each trigger
     num_repetitions = 500  # Number of times to repeat the acquisition
+    raw_mode = False  # True: store int16 ADC codes (4x smaller), scaled to volts when loaded
     delaytimer = 0.1
     veticalshift = 200
     colors = plt.get_cmap('viridis', num_repetitions)
@@ -87,10 +92,35 @@ if __name__ == "__main__":
                 )
                 co_task.triggers.start_trigger.retriggerable = True
 
+                # Readers fill the (2, num_samples) pipeline rows in place
+                if raw_mode:
+                    reader = AnalogUnscaledReader(ai_task.in_stream)
+                    read_many, sample_dtype = reader.read_int16, 'i2'
+                else:
+                    reader = AnalogMultiChannelReader(ai_task.in_stream)
+                    read_many, sample_dtype = reader.read_many_sample, 'f8'
+
                 
                 print("\n--- Starting acquisition nm ---")
                 
-                all_recorded_data = [] # Stores list of 2D arrays (2, num_samples)
+                # --- Output: one dataset, rows: repetitions of (2, N) ---
+                current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"{sample_name}_laser_{laserwave[0]}_{laserwave[1]}nm_{current_time}"
+                output = chunked_dataset.create(
+                    os.path.join(save_directory, filename), sample_dtype, (2, num_samples),
+                    attrs={
+                        'sample_name': sample_name,
+                        'channels': [analog_data_channel_1, analog_data_channel_2],
+                        'laserwave_nm': laserwave,
+                        'sampling_rate': sampling_rate,
+                        'num_samples': num_samples,
+                        'trigger_channel': digital_trigger_channel,
+                        'repetitions_requested': num_repetitions,
+                        'acquired': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    })
+                if raw_mode:
+                    # open_dataset() scales the codes to volts with these
+                    output.update_attrs({daq_scaling.metadata_key: daq_scaling.scaling_coefficients(ai_task)})
                 
                 # --- Laser and Stepper Control (Pre-Acquisition) ---
                 #control_laser(single_laser_id, turn_on=True)  
@@ -106,25 +136,30 @@ if __name__ == "__main__":
                 successful_reads = 0
                 
                 # --- Repetitive Acquisition Loop with Exception Handling ---
-                for i in range(num_repetitions):
-                    print(f"--- Repetition {i+1}/{num_repetitions} ---", end='\r')
-                    try:
-                        # Read data: returns a 2D array (2 channels x num_samples)
-                        acquired_data = ai_task.read(
-                            number_of_samples_per_channel=num_samples,
-                            timeout=trigger_timeout
-                        )
-                        all_recorded_data.append(acquired_data)
-                        successful_reads += 1
-
-                    except nidaqmx.errors.DaqReadError:
-                        # Catch expected timeout error
-                        print(f"\n[WARNING] Repetition {i+1} failed to acquire within timeout of {trigger_timeout}s. Skipping...")
-
-                    except Exception as e:
-                        # Catch critical errors
-                        print(f"\n[ERROR] An unexpected error occurred on Repetition {i+1}: {e}")
-                        break 
+                # A writer thread saves full buffers while the next ones are read
+                with output, acquisition_pipeline.AcquisitionPipeline(
+                        output.write, (2, num_samples), sample_dtype) as pipeline:
+                    for i in range(num_repetitions):
+                        print(f"--- Repetition {i+1}/{num_repetitions} ---", end='\r')
+                        try:
+                            # Read data straight into the next (2 channels x num_samples) buffer row
+                            pipeline.read(read_many, num_samples,
+                                          timeout=trigger_timeout)
+                            successful_reads += 1
+
+                        except nidaqmx.errors.DaqReadError:
+                            # Catch expected timeout error
+                            print(f"\n[WARNING] Repetition {i+1} failed to acquire within timeout of {trigger_timeout}s. Skipping...")
+
+                        except (RuntimeError, TimeoutError):
+                            # Writer failed or fell behind: the saved data is incomplete
+                            raise
+
+                        except Exception as e:
+                            # Catch critical errors
+                            print(f"\n[ERROR] An unexpected error occurred on Repetition {i+1}: {e}")
+                            break 
+                pipeline.report() # queue depth, writer lag and stalls
                         
                 # Clean up DAQ tasks
                 print("\nStopping DAQ tasks...")
@@ -132,37 +167,14 @@ if __name__ == "__main__":
                 ai_task.stop()
 
                 # --- Process, Save, and Plot Data ---
-                if all_recorded_data:
-                    # Convert list of (2, N) arrays into a single (R, 2, N) array
-                    output_3d_matrix = np.array(all_recorded_data)
+                if successful_reads:
+                    print(f"Saved {successful_reads} repetitions to {output.path}")
+                    with chunked_dataset.open_dataset(output.path) as dataset:
+                        output_3d_matrix = dataset.read() # (R, 2, N)
                     
                     # Separate data into Channel 1 and Channel 2 matrices (R, N)
                     data_ch1 = output_3d_matrix[:, 0, :] 
                     data_ch2 = output_3d_matrix[:, 1, :]
-                    
-                    data_to_save = {
-                        analog_data_channel_1: data_ch1,
-                        analog_data_channel_2: data_ch2,
-                    }
-
-                    # --- Saving Data (One file per channel) ---
-                    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-                    for idx, (channel_name, data_matrix) in enumerate(data_to_save.items()):
-                        channel_suffix = channel_name.replace('/', '_') 
-                        
-                        filename = f"{sample_name}_laser_{laserwave[idx]}nm_{channel_suffix}_{current_time}.csv"
-                        filepath = os.path.join(save_directory, filename)
-                        
-                        header = (
-                            f"Acquired data for Sample: {sample_name}, Laser Wavelength: {laserwave[idx]}nm, Channel: {channel_name}\n"
-                            f"Rows: Repetition Number | Columns: Sample Number (time increasing)\n"
-                            f"Sampling Rate: {sampling_rate} Hz, Samples per Repetition: {num_samples}\n"
-                            f"Acquisition Date/Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                        )
-                        
-                        np.savetxt(filepath, data_matrix, delimiter=',', fmt='%.6f', header=header, comments='')
-                        print(f"Saved data for {channel_name} to {filepath}")
 
 
                     # --- Plotting Data ---
@@ -209,7 +221,8 @@ if __name__ == "__main__":
                     plt.grid(True)
                     plt.legend()
                     plt.tight_layout() 
-                    plt.show()
+                    plt.show(block=False) # keep acquiring while the plot is open
+                    plt.pause(0.1)
                     
                     # --- Laser and Stepper Control (Post-Acquisition) ---
                     #control_laser(single_laser_id, turn_on=False)